@@ -0,0 +1,259 @@
+'''
+    Microbenchmarks for the voxel model (no window, no OpenGL context needed).
+
+    Usage (inside src/):
+        python bench.py raycast [--size 32] [--rays 2000]
+        python bench.py text [--size 64] [--fill 0.5]
+        python bench.py formats [--size 256]
+        python bench.py undo [--size 128] [--voxels 1000000]
+        python bench.py transforms [--max-exp 6]
+'''
+
+import argparse
+import glob
+import os
+import tempfile
+import time
+import numpy as np
+
+from voxel_grid import VoxelGrid
+from object import Object
+from history import EditDelta, EditHistory
+import scene_formats
+
+
+def _timeit(func, repeat=3):
+    ''' Best wall time of a few runs, in seconds '''
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+# ------------------- Raycast ------------------- #
+
+def bench_raycast(size=32, rays=2000, fill=0.3, seed=0):
+    '''
+    Batched picking (VoxelGrid.raycast_batch) against M calls of the single-ray
+    picker used by Cube.raycast_selection, on a random scene.
+    '''
+    rng = np.random.default_rng(seed)
+    grid = VoxelGrid(size)
+    grid.visible[...] = rng.random(grid.visible.shape) < fill
+
+    origins = rng.uniform(-size, 2 * size, (rays, 3))
+    targets = rng.uniform(0, size - 1, (rays, 3))
+    directions = targets - origins
+    max_distance = 4.0 * size
+
+    def single():
+        return [grid.raycast(o, d, max_distance) for o, d in zip(origins, directions)]
+
+    def batch():
+        return grid.raycast_batch(origins, directions, max_distance)
+
+    # Same answers from both paths
+    hits = batch()
+    for i, hit in enumerate(single()):
+        expected = hit.cell if hit is not None else (-1, -1, -1)
+        assert tuple(hits.cells[i]) == expected, f"raio {i}: {hits.cells[i]} != {expected}"
+
+    t_single = _timeit(single)
+    t_batch = _timeit(batch)
+    print(f"raycast  grade {size}³  {rays} raios  acertos {int(hits.hit.sum())}")
+    print(f"  {rays}x raycast      : {t_single * 1e3:9.2f} ms")
+    print(f"  raycast_batch      : {t_batch * 1e3:9.2f} ms")
+    print(f"  speedup            : {t_single / t_batch:9.1f}x")
+
+
+# ------------------- Text Loading ------------------- #
+
+def bench_text(size=64, fill=0.5, seed=0):
+    '''
+    Rows/second of the streaming text parser (scene_formats.read_text) on a
+    random scene written to a temporary .txt file.
+    '''
+    rng = np.random.default_rng(seed)
+    grid = VoxelGrid.random(size, rng)
+    grid.visible[...] = rng.random(grid.visible.shape) < fill
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "bench.txt")
+        scene_formats.write_text(path, grid, 1.0)
+        file_size = os.path.getsize(path)
+
+        stats = {}
+        loaded, _ = scene_formats.read_text(path, stats)
+        assert loaded.count == grid.count
+
+    print(f"texto  grade {size}³  {stats['rows']} linhas  {file_size / 2**20:.1f} MiB")
+    print(f"  leitura            : {stats['seconds'] * 1e3:9.2f} ms")
+    print(f"  linhas/s           : {stats['rows_per_second']:9.0f}")
+
+
+# ------------------- Scene Formats ------------------- #
+
+def terrain_scene(size=256, seed=0):
+    '''
+    Synthetic scene shaped like real saves: a height field filled with a few
+    colored layers (stone, dirt, grass), so colors come in long runs.
+    '''
+    rng = np.random.default_rng(seed)
+    x, z = np.meshgrid(np.arange(size), np.arange(size), indexing='ij')
+    height = size / 3 + size / 8 * np.sin(x / 17.0 + rng.uniform(0, 6)) * np.cos(z / 23.0)
+    height = height.astype(np.int64)
+
+    y = np.arange(size)[None, :, None]
+    layers = np.array([[128, 128, 128, 255], [120, 72, 30, 255], [40, 160, 40, 255]], dtype=np.uint8)
+    grid = VoxelGrid(size)
+    grid.visible[...] = y < height[:, None, :]
+    depth = height[:, None, :] - 1 - y
+    grid.colors[...] = layers[np.select([depth == 0, depth < 4], [2, 1], 0)]
+    return grid
+
+
+def bench_formats(size=256, saves="../saves"):
+    '''
+    File size and load time of every format (text, binary, palette + RLE with each
+    compression) on the bundled saves and on a synthetic size³ terrain.
+    '''
+    scenes = [(os.path.basename(p), scene_formats.read_text(p)[0]) for p in sorted(glob.glob(f"{saves}/*.txt"))]
+    scenes.append((f"terreno {size}³", terrain_scene(size)))
+
+    variants = [(".txt", None), (".vxb", None)] + [(".vxp", c) for c in scene_formats.COMPRESSIONS]
+    header = "  ".join(f"{ext[1:] + (':' + c if c else ''):>16}" for ext, c in variants)
+    print(f"{'cena':<14}{'voxels':>9}  {header}")
+
+    with tempfile.TemporaryDirectory() as folder:
+        for name, grid in scenes:
+            cells = []
+            for ext, compression in variants:
+                path = os.path.join(folder, "scene" + ext)
+                if compression is None:
+                    scene_formats.save_scene(path, grid, 1.0)
+                else:
+                    scene_formats.write_palette(path, grid, 1.0, compression)
+                seconds = _timeit(lambda: scene_formats.load_scene(path), repeat=1 if ext == ".txt" else 3)
+                cells.append(f"{os.path.getsize(path) / 1024:8.1f}K {seconds * 1e3:6.1f}ms")
+            print(f"{name:<14}{grid.count:>9}  " + "  ".join(cells))
+
+
+# ------------------- Undo / Redo ------------------- #
+
+def bench_undo(size=128, voxels=1_000_000, seed=0):
+    '''
+    Recording, undoing and redoing one bulk edit of `voxels` random cells
+    (the same steps as Cube.edit_voxels / undo / redo).
+    '''
+    rng = np.random.default_rng(seed)
+    grid = VoxelGrid.random(size, rng)
+    index = rng.choice(size ** 3, size=min(voxels, size ** 3), replace=False)
+    cells = np.stack(np.unravel_index(index, grid.visible.shape), axis=1)
+    visible = rng.random(len(cells)) < 0.5
+    colors = rng.integers(0, 256, (len(cells), 4), dtype=np.uint8)
+    before = grid.copy()
+
+    history = EditHistory(max_bytes=1 << 30)
+    start = time.perf_counter()
+    delta = EditDelta.capture(grid, cells)
+    grid.write_voxels(cells, visible, colors)
+    history.push(delta.complete(grid))
+    t_edit = time.perf_counter() - start
+    after = grid.copy()
+
+    start = time.perf_counter()
+    history.undo(grid)
+    t_undo = time.perf_counter() - start
+    assert (grid.visible == before.visible).all() and (grid.colors == before.colors).all()
+
+    start = time.perf_counter()
+    history.redo(grid)
+    t_redo = time.perf_counter() - start
+    assert (grid.visible == after.visible).all() and (grid.colors == after.colors).all()
+
+    print(f"undo  grade {size}³  {len(cells)} voxels editados  delta {delta.nbytes / 2**20:.1f} MiB")
+    print(f"  edição + registro  : {t_edit * 1e3:9.2f} ms")
+    print(f"  undo               : {t_undo * 1e3:9.2f} ms")
+    print(f"  redo               : {t_redo * 1e3:9.2f} ms")
+
+
+# ------------------- Transforms ------------------- #
+
+def bench_transforms(max_exp=6, loop_limit=10_000, seed=0):
+    '''
+    Object.transformations (one vectorized pass) against one Object.transformation
+    call per voxel, for N = 10^3 .. 10^max_exp. The per-call loop is timed on at most
+    loop_limit voxels and scaled up linearly beyond that.
+    '''
+    rng = np.random.default_rng(seed)
+    obj = Object()
+    print("transforms  (translação + escala uniforme | com rotação)")
+    for exp in range(3, max_exp + 1):
+        n = 10 ** exp
+        translations = rng.uniform(-100, 100, (n, 3)).astype(np.float32)
+        rotations = rng.uniform(0, 360, (n, 3)).astype(np.float32)
+        sample = min(n, loop_limit)
+
+        def loop(rotate):
+            for t, r in zip(translations[:sample], rotations[:sample] if rotate else np.zeros((sample, 3))):
+                obj.transformation(*t, *r, Sx=0.5, Sy=0.5, Sz=0.5)
+
+        def batch(rotate):
+            Object._transform_cache.clear() # time the computation, not the cache
+            return obj.transformations(translations, rotations if rotate else None, 0.5)
+
+        for rotate in (False, True):
+            t_loop = _timeit(lambda: loop(rotate), repeat=1) * n / sample
+            t_batch = _timeit(lambda: batch(rotate))
+            label = "rotação" if rotate else "T + S  "
+            estimated = " (estimado)" if sample < n else ""
+            print(f"  N=10^{exp} {label}  laço {t_loop * 1e3:10.1f} ms{estimated:11}  "
+                  f"lote {t_batch * 1e3:8.2f} ms  speedup {t_loop / t_batch:8.0f}x")
+
+        batch(True)
+        start = time.perf_counter()
+        obj.transformations(translations, rotations, 0.5)
+        print(f"  N=10^{exp} cache      {(time.perf_counter() - start) * 1e3:8.2f} ms (mesmas entradas)")
+
+
+# ------------------- Entry Point ------------------- #
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks do editor de voxels")
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    p = sub.add_parser("raycast", help="picking em lote vs. um raio por vez")
+    p.add_argument("--size", type=int, default=32)
+    p.add_argument("--rays", type=int, default=2000)
+
+    p = sub.add_parser("text", help="leitura do formato de texto (.txt)")
+    p.add_argument("--size", type=int, default=64)
+    p.add_argument("--fill", type=float, default=0.5)
+
+    p = sub.add_parser("formats", help="tamanho e tempo de leitura de cada formato de cena")
+    p.add_argument("--size", type=int, default=256)
+
+    p = sub.add_parser("undo", help="undo/redo de uma edição em massa")
+    p.add_argument("--size", type=int, default=128)
+    p.add_argument("--voxels", type=int, default=1_000_000)
+
+    p = sub.add_parser("transforms", help="matrizes de transformação em lote vs. uma por voxel")
+    p.add_argument("--max-exp", type=int, default=6)
+
+    args = parser.parse_args()
+    if args.bench == "raycast":
+        bench_raycast(args.size, args.rays)
+    elif args.bench == "text":
+        bench_text(args.size, args.fill)
+    elif args.bench == "formats":
+        bench_formats(args.size)
+    elif args.bench == "undo":
+        bench_undo(args.size, args.voxels)
+    elif args.bench == "transforms":
+        bench_transforms(args.max_exp)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+'''
+    First-person camera with cached matrices, and the uniform buffer that shares
+    them with every shader program.
+
+    The basis vectors and the view matrix are recomputed only after the pose
+    changed, the projection only after a resize; `version` changes with either,
+    so the GPU copy is rewritten only on frames where something moved.
+'''
+
+from OpenGL.GL import (
+    glGenBuffers, glBindBuffer, glBufferData, glBufferSubData, glBindBufferBase,
+    GL_UNIFORM_BUFFER, GL_DYNAMIC_DRAW,
+)
+import numpy as np
+from gl_state import state
+
+# Uniform block declared by the shaders that read the camera (std140, row_major)
+CAMERA_BLOCK = "Camera"
+CAMERA_BINDING = 0
+CAMERA_BLOCK_GLSL = """
+    layout(std140, row_major) uniform Camera {
+        mat4 view;
+        mat4 proj;
+        mat4 view_proj;
+    };
+"""
+
+
+class Camera:
+    '''
+    Position, yaw and pitch (degrees) and the perspective of the window. Mutate it
+    through move(), rotate() and resize(): they mark the cached values stale.
+    '''
+
+    WORLD_UP = np.array([0.0, 1.0, 0.0])
+
+    def __init__(self, position=(0., 0., 2.), yaw=-90., pitch=0., fov=67.0,
+                 width=800, height=600, znear=0.1, zfar=100.0):
+        self.position = np.array(position, dtype=np.float64)
+        self.yaw, self.pitch = float(yaw), float(pitch)
+        self.fov = fov # vertical field of view, in degrees
+        self.width, self.height = width, height
+        self.znear, self.zfar = znear, zfar
+        self.version = 0 # bumped on every change of pose or projection
+
+        self._basis = None # (front, right, up), None when stale
+        self._view = None
+        self._proj = None
+        self._view_proj = None
+
+    # ------------------- Changes ------------------- #
+
+    def move(self, offset):
+        ''' Translate by offset (3,) in world space '''
+        if not np.any(offset):
+            return
+        self.position = self.position + offset # a new array: frame snapshots of it stay valid
+        self._view = self._view_proj = None
+        self.version += 1
+
+    def rotate(self, yaw, pitch):
+        ''' Add yaw and pitch (degrees) '''
+        if yaw == 0 and pitch == 0:
+            return
+        self.yaw += yaw
+        self.pitch += pitch
+        self._basis = self._view = self._view_proj = None
+        self.version += 1
+
+    def resize(self, width, height):
+        if (width, height) == (self.width, self.height):
+            return
+        self.width, self.height = width, height
+        self._proj = self._view_proj = None
+        self.version += 1
+
+    # ------------------- Cached Values ------------------- #
+
+    def _compute_basis(self):
+        yaw, pitch = np.radians(self.yaw), np.radians(self.pitch)
+        front = np.array([
+            np.cos(yaw) * np.cos(pitch),
+            np.sin(pitch),
+            np.sin(yaw) * np.cos(pitch),
+        ])
+        front /= np.linalg.norm(front + 1e-8)
+        right = np.cross(front, self.WORLD_UP)
+        right /= np.linalg.norm(right)
+        up = np.cross(right, front)
+        return front, right, up
+
+    @property
+    def front(self):
+        if self._basis is None:
+            self._basis = self._compute_basis()
+        return self._basis[0]
+
+    @property
+    def right(self):
+        if self._basis is None:
+            self._basis = self._compute_basis()
+        return self._basis[1]
+
+    @property
+    def up(self):
+        if self._basis is None:
+            self._basis = self._compute_basis()
+        return self._basis[2]
+
+    @property
+    def view(self):
+        ''' Row-major look-at matrix (4, 4) float32 '''
+        if self._view is None:
+            f, s, u = self.front, self.right, self.up
+            view = np.identity(4, dtype=np.float32)
+            view[0, :3] = s
+            view[1, :3] = u
+            view[2, :3] = -f
+            view[0, 3] = -np.dot(s, self.position)
+            view[1, 3] = -np.dot(u, self.position)
+            view[2, 3] = np.dot(f, self.position)
+            self._view = view
+        return self._view
+
+    @property
+    def proj(self):
+        ''' Row-major perspective matrix (4, 4) float32 '''
+        if self._proj is None:
+            znear, zfar = self.znear, self.zfar
+            fov = np.radians(self.fov)
+            aspect = self.width / max(self.height, 1) # a minimized window reports height 0
+            a = 1 / (np.tan(fov / 2) * aspect)
+            b = 1 / np.tan(fov / 2)
+            c = (zfar + znear) / (znear - zfar)
+            d = (2 * znear * zfar) / (znear - zfar)
+            self._proj = np.array([
+                [a,   0.0, 0.0,  0.0],
+                [0.0, b,   0.0,  0.0],
+                [0.0, 0.0, c,    d],
+                [0.0, 0.0, -1.0, 1.0]
+            ], dtype=np.float32)
+        return self._proj
+
+    @property
+    def view_proj(self):
+        ''' proj @ view (frustum culling and the shaders) '''
+        if self._view_proj is None:
+            self._view_proj = self.proj @ self.view
+        return self._view_proj
+
+    @property
+    def pixel_scale(self):
+        ''' Pixels covered by one world unit at distance 1 (LOD) '''
+        return self.height / (2 * np.tan(np.radians(self.fov) / 2))
+
+
+class CameraBuffer:
+    '''
+    The Camera uniform block on the GPU, bound to CAMERA_BINDING once, so every program
+    linking the block to that binding point reads the same matrices. update() rewrites
+    it only when the camera version changed since the last upload.
+    '''
+
+    def __init__(self):
+        self.ubo = glGenBuffers(1)
+        self.version = None
+        self.bytes_uploaded = 0
+        glBindBuffer(GL_UNIFORM_BUFFER, self.ubo)
+        glBufferData(GL_UNIFORM_BUFFER, 3 * 64, None, GL_DYNAMIC_DRAW)
+        glBindBufferBase(GL_UNIFORM_BUFFER, CAMERA_BINDING, self.ubo)
+
+    def update(self, camera):
+        if camera.version == self.version:
+            self.bytes_uploaded = 0
+            state.stats['gl_elided'] += 1
+            return
+        block = np.concatenate([camera.view, camera.proj, camera.view_proj]).astype(np.float32)
+        glBindBuffer(GL_UNIFORM_BUFFER, self.ubo)
+        glBufferSubData(GL_UNIFORM_BUFFER, 0, block.nbytes, block)
+        self.version = camera.version
+        self.bytes_uploaded = block.nbytes
+        state.stats['gl_calls'] += 1
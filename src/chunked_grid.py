@@ -0,0 +1,213 @@
+import numpy as np
+from numpy.typing import NDArray
+from voxel_grid import VoxelStorage, VoxelGrid
+
+# Worlds larger than this are stored in chunks instead of one dense array
+DENSE_LIMIT = 256
+
+
+def create_storage(size: int) -> VoxelStorage:
+    ''' Empty storage for a size³ world: dense when small, chunked when large '''
+    if size > DENSE_LIMIT:
+        return ChunkedGrid(size)
+    return VoxelGrid(size)
+
+
+class ChunkedGrid(VoxelStorage):
+    '''
+    Sparse storage for large worlds: a hash map from chunk coordinate (cx, cy, cz)
+    to a dense VoxelGrid of chunk_size³ cells. Only chunks holding at least one
+    voxel are allocated; a chunk is freed as soon as its last voxel is removed.
+
+    Cell (x, y, z) lives in chunk (x, y, z) // chunk_size, at local (x, y, z) % chunk_size.
+    '''
+
+    sparse = True
+
+    def __init__(self, size: int, chunk_size: int = 16):
+        super().__init__(size)
+        self.chunk_size = int(chunk_size)
+        self.chunks = {}  # chunk key -> VoxelGrid
+        self.counts = {}  # chunk key -> number of visible voxels
+
+    # ------------------- Chunk Helpers ------------------- #
+
+    def _split(self, cell):
+        cs = self.chunk_size
+        x, y, z = (int(c) for c in cell)
+        return (x // cs, y // cs, z // cs), (x % cs, y % cs, z % cs)
+
+    def chunk_origin(self, key):
+        return np.asarray(key, dtype=np.int64) * self.chunk_size
+
+    def _chunk(self, key, create=False):
+        chunk = self.chunks.get(key)
+        if chunk is None and create:
+            chunk = VoxelGrid(self.chunk_size)
+            self.chunks[key] = chunk
+            self.counts[key] = 0
+        return chunk
+
+    def _stored(self, key):
+        ''' Chunk holding the voxels of key, or None (hook for storages that page chunks out) '''
+        return self.chunks.get(key)
+
+    def _stored_keys(self):
+        ''' Sorted keys of every non-empty chunk '''
+        return sorted(self.chunks)
+
+    def _free_if_empty(self, key):
+        if self.counts.get(key) == 0:
+            del self.chunks[key]
+            del self.counts[key]
+
+    def _group(self, cells):
+        '''
+        Split cells (N, 3) by chunk.
+        Yields (key, row indices, local coordinates) for every chunk touched.
+        '''
+        cells = np.asarray(cells, dtype=np.int64).reshape(-1, 3)
+        keys = cells // self.chunk_size
+        unique, inverse = np.unique(keys, axis=0, return_inverse=True)
+        order = np.argsort(inverse.ravel(), kind='stable')
+        bounds = np.searchsorted(inverse.ravel()[order], np.arange(len(unique) + 1))
+        local = cells - keys * self.chunk_size
+        for i, key in enumerate(map(tuple, unique.tolist())):
+            rows = order[bounds[i]:bounds[i + 1]]
+            yield key, rows, local[rows]
+
+    # ------------------- Cell Queries ------------------- #
+
+    def is_visible(self, cell) -> bool:
+        key, local = self._split(cell)
+        chunk = self.chunks.get(key)
+        return chunk is not None and bool(chunk.visible[local])
+
+    def packed_color(self, cell) -> NDArray[np.uint8]:
+        key, local = self._split(cell)
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            return np.zeros(4, dtype=np.uint8)
+        return chunk.colors[local]
+
+    def occupied(self, cells) -> NDArray[np.bool_]:
+        cells = np.asarray(cells, dtype=np.int64).reshape(-1, 3)
+        result = np.zeros(len(cells), dtype=bool)
+        for key, rows, local in self._group(cells):
+            chunk = self.chunks.get(key)
+            if chunk is not None:
+                result[rows] = chunk.occupied(local)
+        return result
+
+    def colors_at(self, cells) -> NDArray[np.uint8]:
+        cells = np.asarray(cells, dtype=np.int64).reshape(-1, 3)
+        result = np.zeros((len(cells), 4), dtype=np.uint8)
+        for key, rows, local in self._group(cells):
+            chunk = self.chunks.get(key)
+            if chunk is not None:
+                result[rows] = chunk.colors_at(local)
+        return result
+
+    def visible_cells(self):
+        ''' Coordinates (N, 3) and packed colors (N, 4) of every visible voxel, chunk by chunk '''
+        coords, colors = [np.zeros((0, 3), dtype=np.int64)], [np.zeros((0, 4), dtype=np.uint8)]
+        for key in self._stored_keys():
+            local, chunk_colors = self._stored(key).visible_cells()
+            coords.append(local + self.chunk_origin(key))
+            colors.append(chunk_colors)
+        return np.concatenate(coords), np.concatenate(colors)
+
+    def region(self, lo, shape):
+        lo = np.asarray(lo, dtype=np.int64)
+        shape = np.asarray(shape, dtype=np.int64)
+        visible = np.zeros(tuple(shape), dtype=bool)
+        colors = np.zeros(tuple(shape) + (4,), dtype=np.uint8)
+
+        cs = self.chunk_size
+        first, last = lo // cs, (lo + shape - 1) // cs
+        for cx in range(first[0], last[0] + 1):
+            for cy in range(first[1], last[1] + 1):
+                for cz in range(first[2], last[2] + 1):
+                    chunk = self._stored((cx, cy, cz))
+                    if chunk is None:
+                        continue
+                    part_visible, part_colors = chunk.region(lo - (cx * cs, cy * cs, cz * cs), shape)
+                    visible |= part_visible
+                    colors[part_visible] = part_colors[part_visible]
+        return visible, colors
+
+    @property
+    def count(self) -> int:
+        return int(sum(self.counts.values()))
+
+    @property
+    def nbytes(self) -> int:
+        return sum(chunk.nbytes for chunk in self.chunks.values())
+
+    # ------------------- Cell Edits ------------------- #
+
+    def set_voxel(self, cell, rgba):
+        key, local = self._split(cell)
+        chunk = self._chunk(key, create=True)
+        if not chunk.visible[local]:
+            self.counts[key] += 1
+        chunk.visible[local] = True
+        chunk.colors[local] = self.pack_color(rgba)
+        self._changed(np.array([cell]))
+
+    def paint_voxel(self, cell, rgba):
+        key, local = self._split(cell)
+        chunk = self._chunk(key)
+        if chunk is None:
+            return
+        chunk.colors[local] = self.pack_color(rgba)
+        self._changed(np.array([cell]))
+
+    def clear_voxel(self, cell):
+        key, local = self._split(cell)
+        chunk = self._chunk(key)
+        if chunk is None or not chunk.visible[local]:
+            return
+        chunk.visible[local] = False
+        self.counts[key] -= 1
+        self._free_if_empty(key)
+        self._changed(np.array([cell]))
+
+    def set_voxels(self, coords, colors):
+        ''' Bulk write, scattered chunk by chunk '''
+        coords = np.asarray(coords, dtype=np.int64).reshape(-1, 3)
+        colors = np.asarray(colors)
+        if colors.dtype != np.uint8:
+            colors = self.pack_color(colors)
+        colors = colors.reshape(-1, 4)
+
+        for key, rows, local in self._group(coords):
+            chunk = self._chunk(key, create=True)
+            x, y, z = local.T
+            chunk.visible[x, y, z] = True
+            chunk.colors[x, y, z] = colors[rows]
+            self.counts[key] = chunk.count
+        self._changed(coords)
+
+    def write_voxels(self, coords, visible, colors):
+        ''' Bulk write of visibility and packed colors, chunk by chunk (see VoxelGrid.write_voxels) '''
+        coords = np.asarray(coords, dtype=np.int64).reshape(-1, 3)
+        visible = np.broadcast_to(np.asarray(visible, dtype=bool), len(coords))
+        colors = np.asarray(colors, dtype=np.uint8).reshape(-1, 4)
+
+        for key, rows, local in self._group(coords):
+            chunk = self._chunk(key, create=bool(visible[rows].any()))
+            if chunk is None:
+                continue # only clears, in a chunk that does not exist
+            x, y, z = local.T
+            chunk.visible[x, y, z] = visible[rows]
+            chunk.colors[x, y, z] = colors[rows]
+            self.counts[key] = chunk.count
+            self._free_if_empty(key)
+        self._changed(coords)
+
+    def copy(self):
+        grid = ChunkedGrid(self.size, self.chunk_size)
+        grid.chunks = {key: chunk.copy() for key, chunk in self.chunks.items()}
+        grid.counts = dict(self.counts)
+        return grid
@@ -1,28 +1,38 @@
-
-from dataclasses import dataclass
 from typing import override
 from object import Object
-from OpenGL.GL import (
-    glBindVertexArray, glGetUniformLocation, glDrawArrays, glPolygonMode, glLineWidth,
-    glUniformMatrix4fv,
-    GL_TRIANGLES, GL_TRUE, GL_FRONT_AND_BACK, GL_LINE, GL_FILL,
-)
+from OpenGL.GL import glDrawArrays, GL_TRIANGLES, GL_LINE, GL_FILL
+from gl_state import state
 import numpy as np
-from numpy.typing import NDArray
 from random import random
 from sound_manager import SoundManager
-
-@dataclass
-class Voxel:
-    pos: np.ndarray
-    scale: float
-    color: np.ndarray
-    is_visible: bool = True
-    is_selected: bool = False
+from voxel_grid import VoxelGrid, VoxelStorage
+from chunked_grid import ChunkedGrid
+from instance_buffer import InstanceBuffer, RegionInstances
+from mesher import VoxelMesh, mesh_storage, mesh_mip_level, occupied_regions, CUBE_TRIANGLES
+from culling import REGION_SIZE, frustum_planes, boxes_in_frustum, region_bounds
+from lod import VoxelMips, LEVEL_COLORS, level_positions, select_levels
+from occlusion import OFFSETS
+from translucency import DepthSorter, is_opaque
+from journal import EditJournal, OP_SET, OP_PAINT, OP_CLEAR
+from history import EditDelta, EditHistory
 
 
 class Cube(Object):
-    def __init__(self, grid_size=3):
+    # Edits touching more cells than this re-upload the whole instance buffer
+    FULL_UPLOAD_THRESHOLD = 4096
+    # Regions left to re-mesh after paging past which the whole mesh is rebuilt
+    FULL_MESH_THRESHOLD = 256
+
+    # Render modes
+    RENDER_INSTANCED = "instanced" # one cube instance per visible voxel
+    RENDER_GREEDY = "greedy"       # exposed faces only, merged into quads
+
+    def __init__(self, grid_size=3, world_size=None):
+        '''
+        grid_size  -> side of the initial block of random voxels
+        world_size -> when given, the block is placed in a sparse chunked world of
+                      world_size³ cells instead of a dense grid_size³ grid
+        '''
         super().__init__()
         
         # Sound manager for voxel actions
@@ -31,118 +41,268 @@ class Cube(Object):
         self.sound.load_sound('place', 'place_block.mp3')
 
         # Grid and Voxel Management
-        self.size = grid_size # handle of the grid size
-        self.grid = np.empty((self.size, self.size, self.size), dtype=Voxel) # grid to hold the voxels
-        self.selection_x, self.selection_y, self.selection_z = 0,0,self.size-1 # current selected voxel coordinates      
         self.grid_space = 1.
+        self.render_mode = self.RENDER_INSTANCED
+        self.use_octree = False # sparse voxel octree index for picking (see toggle_octree)
+        self.use_occlusion = True # skip voxels enclosed by 6 solid neighbors (see toggle_occlusion)
+        self.mesh_stats = {'triangles_before': 0, 'triangles_after': 0, 'translucent_triangles': 0}
+        
+        # Picking cache: the ray is only cast again when the camera or the scene changed
+        self._pick_key = None
+        self._pick_result = None
+        self.pick_stats = {'pick_hits': 0, 'pick_misses': 0}
+        
+        # Frustum culling: regions outside the camera view are not drawn
+        self.view_proj = None # proj @ view of the current frame (see set_view_projection)
+        self.cull_stats = {'regions_tested': 0, 'regions_culled': 0, 'regions_drawn': 0}
+        
+        # Level of detail: far regions are drawn from a downsampled copy (see lod.py)
+        self.use_lod = True
+        self.lod_debug = False   # tint regions by level (F4)
+        self.lod_error = 8.0     # largest screen-space error allowed, in pixels
+        self.mips: VoxelMips | None = None
+        self.cam_pos = None      # camera of the current frame, with the pixels per unit at distance 1
+        self.pixel_scale = None
+        self.lod_stats = {'lod_regions': ''}
+        
+        # Edit journal for crash recovery (see attach_journal)
+        self.journal: EditJournal | None = None
+        
+        # Undo/redo of voxel edits
+        self.history = EditHistory()
         
         # Grid initialization with random colors
-        for x in range(self.size):
-            for y in range(self.size):
-                for z in range(self.size):
-                    r, g, b, a = random(), random(), random(), random()
-                    self.grid[x, y, z] = Voxel(
-                        pos=np.array([x, y, z], dtype=float),
-                        scale=self.grid_space,
-                        color=np.array([r, g, b, a]),
-                        is_visible=True
-                    )
+        grid = VoxelGrid.random(grid_size)
+        if world_size is not None:
+            world = ChunkedGrid(world_size)
+            world.set_voxels(*grid.visible_cells())
+            grid = world
+        self.set_grid(grid)
+
+    @property
+    def size(self):
+        ''' Handle of the grid size '''
+        return self.grid.size
+
+    def set_grid(self, grid: VoxelStorage, grid_space=None):
+        ''' Replace the voxel storage (used on load) and reset the selection '''
+        if getattr(self, 'grid', None) is not None:
+            self.grid.remove_listener(self._on_grid_change)
+        self.grid = grid
+        self.grid.add_listener(self._on_grid_change)
+        if self.use_octree:
+            self.grid.build_octree()
+        if self.use_occlusion:
+            self.grid.build_occlusion()
+        if self.mips is not None:
+            self.mips.detach()
+        self.mips = VoxelMips(grid, self._region_size()) if self.use_lod else None
+        self._dirty_cells = set()
+        self._dirty_regions = set()      # instance regions rebuilt whole (paged chunks)
+        self._mesh_dirty_regions = set() # mesh regions to re-mesh (paged chunks and their neighbors)
+        self._dirty_all = True
+        if grid_space is not None:
+            self.grid_space = grid_space
+        self.selection_x, self.selection_y, self.selection_z = 0, 0, self.size-1 # current selected voxel coordinates
+        if grid.sparse: # nothing selected until the camera looks at a voxel
+            self.clear_selection()
+        self.selection_normal, self.selection_adjacent = (0, 0, 0), None           # entry face of the last pick
+        self.history.clear() # edits made so far do not apply to the new grid
+        if self.journal is not None:
+            self.journal.reset(self.grid, self.grid_space)
+
+    def attach_journal(self, journal: EditJournal):
+        '''
+        Restore the scene left by the previous session, if the journal holds one,
+        and record every edit from now on.
+        '''
+        recovered = journal.recover()
+        if recovered is not None:
+            self.set_grid(*recovered)
+            print("Cena recuperada do journal.")
+        self.journal = journal
+        journal.reset(self.grid, self.grid_space)
+
+    def toggle_octree(self):
+        '''
+        Build (or drop) the sparse voxel octree index of the grid. Only sparse worlds
+        pick through it: see raycast_selection.
+        '''
+        self.use_octree = not self.use_octree
+        if self.use_octree:
+            self.grid.build_octree()
+        else:
+            self.grid.drop_octree()
+
+    def toggle_occlusion(self):
+        ''' Track (or stop tracking) enclosed voxels, which are then drawn again '''
+        self.use_occlusion = not self.use_occlusion
+        if self.use_occlusion:
+            self.grid.build_occlusion()
+        else:
+            self.grid.drop_occlusion()
+        self._dirty_all = True
+
+    def toggle_lod(self):
+        ''' Build (or drop) the mip pyramid used for distant regions '''
+        self.use_lod = not self.use_lod
+        if self.use_lod:
+            self.mips = VoxelMips(self.grid, self._region_size())
+        else:
+            self.mips.detach()
+            self.mips = None
+        self._mesh_key = None
+
+    def toggle_lod_debug(self):
+        self.lod_debug = not self.lod_debug
+
+    def _on_grid_change(self, cells):
+        ''' Collect edited cells so only their instance records get re-uploaded '''
+        if self.grid.paged and self.grid.paging is not None:
+            self._on_chunk_paged(self.grid.paging)
+        elif cells is None or len(cells) > self.FULL_UPLOAD_THRESHOLD:
+            self._dirty_all = True
+        elif not self._dirty_all:
+            if self.grid.occlusion is not None: # neighbors may have become (un)enclosed
+                cells = np.concatenate([cells, (cells[:, None, :] + OFFSETS[None]).reshape(-1, 3)])
+            self._dirty_cells.update(map(tuple, cells.tolist()))
+
+    def _on_chunk_paged(self, key):
+        '''
+        A chunk of a paged grid was paged in or out: its region (a chunked grid's regions
+        are its chunks) is rebuilt as a whole rather than cell by cell. The mesh of the
+        6 neighbors depends on the chunk through their borders, and so do their enclosed
+        voxels when occlusion is on.
+        '''
+        neighbors = set(map(tuple, (OFFSETS + key).tolist()))
+        if not self._dirty_all:
+            self._dirty_regions.add(key)
+            if self.grid.occlusion is not None:
+                self._dirty_regions |= neighbors
+        if self._mesh_key is not None:
+            self._mesh_dirty_regions |= neighbors | {key}
+            if len(self._mesh_dirty_regions) > self.FULL_MESH_THRESHOLD:
+                self._mesh_key = None
 
     # ------------------- Voxel Management Methods ------------------- #
     def get_selected_voxel(self):
-        return self.grid[self.selection_x, self.selection_y, self.selection_z]
+        return (self.selection_x, self.selection_y, self.selection_z)
+
+    def clear_selection(self):
+        ''' Move the selection out of the grid (nothing selected) '''
+        self.selection_x, self.selection_y, self.selection_z = -1, -1, -1
+        self.selection_normal, self.selection_adjacent = (0, 0, 0), None
     
     def add_voxel(self): 
-        voxel: Voxel = self.get_selected_voxel()
+        cell = self.get_selected_voxel()
+        if not self.grid.in_bounds(cell):
+            return
+
+        # A visible selection places the new voxel against the face being looked at
+        if self.grid.is_visible(cell):
+            cell = self.selection_adjacent
 
         # Place only if not already visible
-        if not voxel.is_visible:
-            voxel.is_visible = True
-            
+        if cell is not None and not self.grid.is_visible(cell):
             r, g, b, a = random(), random(), random(), random()
-            voxel.color = np.array([r, g, b, a])
+            delta = EditDelta.capture(self.grid, [cell])
+            self.grid.set_voxel(cell, (r, g, b, a))
+            self.history.push(delta.complete(self.grid))
+            if self.journal is not None:
+                self.journal.record_voxel(OP_SET, cell, self.grid.packed_color(cell))
             
             self.sound.play_sound('place', volume=0.5)
 
     def remove_voxel(self):
-        voxel: Voxel = self.get_selected_voxel()
-
-        if voxel.is_visible:
-            voxel.is_visible = False
+        cell = self.get_selected_voxel()
+
+        if self.grid.in_bounds(cell) and self.grid.is_visible(cell):
+            delta = EditDelta.capture(self.grid, [cell])
+            self.grid.clear_voxel(cell)
+            self.history.push(delta.complete(self.grid))
+            if self.journal is not None:
+                self.journal.record_voxel(OP_CLEAR, cell, (0, 0, 0, 0))
             
             self.sound.play_sound('broke', volume=0.5)
 
     def paint_selected_voxel(self, r, g, b):
-        # Check if selection is within bounds
-        if (0 <= self.selection_x < self.size and 
-            0 <= self.selection_y < self.size and 
-            0 <= self.selection_z < self.size):
-            
-            voxel: Voxel = self.grid[self.selection_x, self.selection_y, self.selection_z]
-            
-            # Only paint if the voxel is visible
-            if voxel and voxel.is_visible:
-                voxel.color = np.array([r, g, b, 1.0])
+        cell = self.get_selected_voxel()
+
+        # Only paint if the selection is within bounds and the voxel is visible
+        if self.grid.in_bounds(cell) and self.grid.is_visible(cell):
+            delta = EditDelta.capture(self.grid, [cell])
+            self.grid.paint_voxel(cell, (r, g, b, 1.0))
+            self.history.push(delta.complete(self.grid))
+            if self.journal is not None:
+                self.journal.record_voxel(OP_PAINT, cell, self.grid.packed_color(cell))
+
+    def edit_voxels(self, cells, visible, colors):
+        '''
+        Bulk edit: write visibility (N,) and packed colors (N, 4) of cells (N, 3)
+        as one undoable step.
+        '''
+        delta = EditDelta.capture(self.grid, cells)
+        self.grid.write_voxels(cells, visible, colors)
+        self.history.push(delta.complete(self.grid))
+        if self.journal is not None:
+            self.journal.record_cells(delta.cells(self.grid), delta.after_visible, delta.after_colors)
+
+    def undo(self):
+        delta = self.history.undo(self.grid)
+        if delta is not None and self.journal is not None:
+            self.journal.record_cells(delta.cells(self.grid), delta.before_visible, delta.before_colors)
+
+    def redo(self):
+        delta = self.history.redo(self.grid)
+        if delta is not None and self.journal is not None:
+            self.journal.record_cells(delta.cells(self.grid), delta.after_visible, delta.after_colors)
+
+    def update_streaming(self, cam_pos):
+        ''' Page in the chunks of a lazily loaded scene nearest to the camera '''
+        if self.grid.paged:
+            self.grid.update_residency(cam_pos)
 
     def raycast_selection(self, cam_pos, cam_front, max_distance=20.0):
         """
         Performs ray casting from the camera and returns the nearest intersected voxel.
         Updates self.selection_x, self.selection_y, and self.selection_z.
+
+        Only the cells along the ray are visited (voxel traversal). In a dense grid every
+        cell is selectable, visible or not, so empty cells can be filled. In a sparse
+        world the first visible voxel is selected and new voxels go against its face.
+
+        The octree index only speeds up the sparse case. In a dense grid the pick is
+        the first cell the ray enters, empty or not, so the traversal stops at its
+        first step and there is no empty space for the octree to skip.
         """
-        best_t = float('inf')
-        best_voxel = None
-
-        # Normalize camera front direction
-        direction = cam_front / np.linalg.norm(cam_front)
-
-        for x in range(self.size):
-            for y in range(self.size):
-                for z in range(self.size):
-                    voxel: Voxel = self.grid[x, y, z]
-                    '''if not voxel.is_visible and not hasattr(voxel, 'is_visible'):
-                        continue  # pula se ainda não foi criado'''
-
-                    # Center of the voxel in world space (considering scale 0.75 and offset)
-                    center = np.array([x, y, z], dtype=float)
-                    half_size = voxel.scale / 2.0  # 0.375
-
-                    # AABB (Axis-Aligned Bounding Box) do voxel
-                    min_bound = center - half_size
-                    max_bound = center + half_size
-
-                    # Ray-AABB intersection (slab method)
-                    tmin = 0.0
-                    tmax = max_distance
-
-                    for i in range(3):
-                        if abs(direction[i]) < 1e-6:
-                            # Ray is parallel to slab
-                            if cam_pos[i] < min_bound[i] or cam_pos[i] > max_bound[i]:
-                                tmin = float('inf')
-                                break
-                        else:
-                            t1 = (min_bound[i] - cam_pos[i]) / direction[i]
-                            t2 = (max_bound[i] - cam_pos[i]) / direction[i]
-                            tmin = max(tmin, min(t1, t2))
-                            tmax = min(tmax, max(t1, t2))
-
-                    if tmin <= tmax and tmin < best_t and tmax >= 0:
-                        best_t = tmin
-                        best_voxel = (x, y, z)
-
-        if best_voxel is not None: # Unmark previous selection
-            if hasattr(self, 'selection_x'):
-                old = self.grid[self.selection_x, self.selection_y, self.selection_z]
-                if old is not None:
-                    old.is_selected = False
-
-            # Mark new selection
-            self.selection_x, self.selection_y, self.selection_z = best_voxel
-            voxel = self.grid[best_voxel]
-            voxel.is_selected = True
-
-            return voxel.pos # to debug if needed
-        return None
+        key = (
+            tuple(map(float, cam_pos)), tuple(map(float, cam_front)), float(max_distance),
+            id(self.grid), self.grid.generation, self.grid_space,
+            self.grid.residency if self.grid.paged else 0, # paged chunks appear and vanish
+        )
+        if key == self._pick_key:
+            self.pick_stats['pick_hits'] += 1
+            return self._pick_result
+        self.pick_stats['pick_misses'] += 1
+        self._pick_key = key
+        self._pick_result = None
+
+        hit = self.grid.raycast(
+            cam_pos, cam_front, max_distance,
+            half_size=self.grid_space / 2.0,
+            solid_only=self.grid.sparse
+        )
+        if hit is None:
+            if self.grid.sparse:
+                self.clear_selection()
+            return None
+
+        # Mark new selection
+        self.selection_x, self.selection_y, self.selection_z = hit.cell
+        self.selection_normal = hit.normal
+        self.selection_adjacent = hit.adjacent
+        self._pick_result = self.grid.position(hit.cell) # to debug if needed
+        return self._pick_result
 
     def updateGridSpace(self, new_space):
         """Update the spacing of the voxel grid."""
@@ -150,65 +310,381 @@ class Cube(Object):
             self.grid_space = min(1.0, self.grid_space + 0.1)
         else:
             self.grid_space = max(0.1, self.grid_space - 0.1)
-            
-        for x in range(self.size):
-            for y in range(self.size):
-                for z in range(self.size):
-                    self.grid[x, y, z].scale = self.grid_space
+        if self.journal is not None:
+            self.journal.record_space(self.grid_space)
 
     @override
     def draw(self):
         self.cube_vao = self.cubeInit(size=[1.,1.,1.]) 
-        self.grid[
-            self.selection_x,
-            self.selection_y,
-            self.selection_z].is_selected = True
+        cube_vbo = self.vertex_buffers[self.cube_vao]
+        self.instances = RegionInstances(cube_vbo, self._region_size())
+        self.lod_instances = {} # level -> RegionInstances of the downsampled cells
+        self._lod_key = None
+        self._instances_space = None
+        self.mesh = VoxelMesh()
+        self._mesh_key = None
+        self._region_meshes = {}  # region -> ([(vertices, colors) per level], translucent (vertices, colors))
+        self._mesh_regions = None # (regions (K, 3), firsts, counts) of the mesh vertex ranges
+        
+        # Translucent voxels: drawn after the opaque ones, back to front
+        self.translucent = InstanceBuffer(cube_vbo)
+        self.translucent_mesh = VoxelMesh()
+        # (vertices, colors, centers) of the translucent quads, centers sorted by the camera distance
+        self._translucent_quads = (np.zeros((0, 6, 3), dtype=np.float32), np.zeros((0, 6, 4), dtype=np.uint8),
+                                   np.zeros((0, 3), dtype=np.float32))
+        self.sorter = DepthSorter()
+        self._translucent_greedy = False
+
+    def toggle_render_mode(self):
+        if self.render_mode == self.RENDER_INSTANCED:
+            self.render_mode = self.RENDER_GREEDY
+        else:
+            self.render_mode = self.RENDER_INSTANCED
+
+    def _use_greedy_mesh(self):
+        # Merged faces only make sense while voxels touch each other
+        return self.render_mode == self.RENDER_GREEDY and np.isclose(self.grid_space, 1.0)
+
+    def _update_mesh(self):
+        '''
+        Rebuild the greedy mesh when the grid changed since the last build: every region
+        after an edit, only the regions around paged chunks otherwise. The mip levels are
+        meshed into the same buffer, after the full-detail vertices.
+        '''
+        key = (id(self.grid), self.grid.generation, self.mips is not None)
+        if key != self._mesh_key:
+            self._region_meshes = {}
+            regions = occupied_regions(self.grid, self._region_size())
+        elif self._mesh_dirty_regions:
+            for region in self._mesh_dirty_regions:
+                self._region_meshes.pop(region, None)
+            # Only chunked grids page, and their regions are their chunks
+            regions = np.array(sorted(r for r in self._mesh_dirty_regions if r in self.grid.chunks),
+                               dtype=np.int64).reshape(-1, 3)
+        else:
+            return
+
+        self._mesh_dirty_regions = set()
+        self._region_meshes.update(self._mesh_of_regions(regions))
+        self._upload_mesh()
+        self._mesh_key = key
+
+    def _mesh_of_regions(self, regions):
+        ''' Opaque mesh of every level and translucent mesh of each region in regions (K, 3) '''
+        rs = self._region_size()
+        vertices, colors, _, firsts, counts = mesh_storage(self.grid, rs, regions=regions)
+        levels = [(vertices, colors, firsts, counts)]
+        if self.mips is not None:
+            for level in range(1, self.mips.max_level + 1):
+                levels.append(mesh_mip_level(self.mips, regions, level))
+        t_vertices, t_colors, _, t_firsts, t_counts = mesh_storage(self.grid, rs, translucent=True, regions=regions)
+
+        meshes = {}
+        for k, region in enumerate(map(tuple, regions.tolist())):
+            parts = [(v[f[k]:f[k] + c[k]], vc[f[k]:f[k] + c[k]]) for v, vc, f, c in levels]
+            t = slice(t_firsts[k], t_firsts[k] + t_counts[k])
+            meshes[region] = parts, (t_vertices[t], t_colors[t])
+        return meshes
+
+    def _upload_mesh(self):
+        ''' Join the region meshes, level after level, and upload them '''
+        regions = sorted(self._region_meshes)
+        meshes = [self._region_meshes[region] for region in regions]
+        empty = np.zeros((0, 3), dtype=np.float32), np.zeros((0, 4), dtype=np.uint8)
+
+        parts, firsts, counts = [empty], [], []
+        start = 0
+        for level in range(1 + (self.mips.max_level if self.mips is not None else 0)):
+            level_parts = [parts_of_region[level] for parts_of_region, _ in meshes]
+            level_counts = np.array([len(p[0]) for p in level_parts], dtype=np.int64)
+            firsts.append(start + np.cumsum(level_counts) - level_counts)
+            counts.append(level_counts)
+            parts.extend(level_parts)
+            start += int(level_counts.sum())
+        self.mesh.upload(np.concatenate([p[0] for p in parts]), np.concatenate([p[1] for p in parts]))
+
+        translucent = [empty] + [t for _, t in meshes]
+        t_vertices = np.concatenate([p[0] for p in translucent])
+        t_colors = np.concatenate([p[1] for p in translucent])
+        quads = t_vertices.reshape(-1, 6, 3)
+        self._translucent_quads = quads, t_colors.reshape(-1, 6, 4), quads.mean(axis=1)
+        self.sorter.invalidate()
+        self._mesh_regions = (np.array(regions, dtype=np.int64).reshape(-1, 3), firsts, counts) # by level
+        self.mesh_stats = {
+            'triangles_before': self.grid.count * CUBE_TRIANGLES,
+            'triangles_after': int(counts[0].sum()) // 3,
+            'translucent_triangles': len(t_vertices) // 3,
+        }
+
+    def _update_instances(self):
+        '''
+        Bring the instance buffers up to date: a full rebuild after a load, a bulk edit
+        or a scale change, otherwise only the records of the edited cells. Opaque voxels
+        go to the region buffers, translucent ones to the buffer sorted by depth.
+        '''
+        if self._dirty_all or self._instances_space != self.grid_space:
+            coords, colors = self.grid.visible_cells()
+            if self.grid.occlusion is not None:
+                shown = ~self.grid.occlusion.hidden(coords)
+                coords, colors = coords[shown], colors[shown]
+            opaque = is_opaque(colors)
+            data = InstanceBuffer.build(coords, colors, self.grid_space)
+            keys = self.grid.flat_index(coords)
+            self.instances.region_size = self._region_size() # the grid may have changed kind
+            self.instances.upload(coords[opaque], data[opaque], keys[opaque])
+            self.translucent.upload(data[~opaque], keys[~opaque])
+            self.sorter.invalidate()
+            self._instances_space = self.grid_space
+
+        else:
+            for region in self._dirty_regions:
+                self._upload_region(region)
+            for cell in self._dirty_cells:
+                if not self.grid.in_bounds(cell):
+                    continue
+                key = int(self.grid.flat_index(cell)[0])
+                if self.grid.is_visible(cell) and not self.grid.is_enclosed(cell):
+                    color = self.grid.packed_color(cell)
+                    record = InstanceBuffer.build([cell], [color], self.grid_space)
+                    if is_opaque(color):
+                        self.instances.put(cell, key, record[0])
+                        self.translucent.remove(key)
+                    else:
+                        self.translucent.put(key, record[0])
+                        self.instances.remove(cell, key)
+                else:
+                    self.instances.remove(cell, key)
+                    self.translucent.remove(key)
+            if self._dirty_cells or self._dirty_regions:
+                self.sorter.invalidate()
+
+        self._dirty_cells.clear()
+        self._dirty_regions.clear()
+        self._dirty_all = False
+        self.instances.flush()
+
+    def _upload_region(self, region):
+        ''' Replace the opaque and translucent records of one region with the grid's '''
+        size = self.instances.region_size
+        origin = np.asarray(region, dtype=np.int64) * size
+        visible, colors = self.grid.region(origin, (size,) * 3)
+        coords, colors = np.argwhere(visible) + origin, colors[visible]
+        if self.grid.occlusion is not None:
+            shown = ~self.grid.occlusion.hidden(coords)
+            coords, colors = coords[shown], colors[shown]
+        opaque = is_opaque(colors)
+        data = InstanceBuffer.build(coords, colors, self.grid_space)
+        keys = self.grid.flat_index(coords)
+        self.instances.upload_region(region, data[opaque], keys[opaque])
+
+        # Translucent records share one buffer: drop the ones of the region, then add
+        old = self.translucent.keys[:self.translucent.count].copy()
+        old_cells = np.stack(np.unravel_index(old, (self.size,) * 3), axis=1)
+        for key in old[(old_cells // size == region).all(axis=1)].tolist():
+            self.translucent.remove(key)
+        for key, record in zip(keys[~opaque].tolist(), data[~opaque]):
+            self.translucent.put(key, record)
+
+    def _update_lod_instances(self):
+        '''
+        Bring the instance buffers of the mip levels up to date: every region after a
+        rebuild or a scale change, otherwise only the regions whose levels changed.
+        '''
+        if self.mips is None:
+            return
+        dirty = self.mips.take_dirty()
+        key = (id(self.mips), self.grid_space)
+        if key != self._lod_key:
+            dirty = None
+            self._lod_key = key
+
+        for level in range(1, self.mips.max_level + 1):
+            factor = 1 << level
+            instances = self.lod_instances.get(level)
+            if instances is None:
+                instances = self.lod_instances[level] = RegionInstances(self.vertex_buffers[self.cube_vao], 1)
+            instances.region_size = self.mips.region_size >> level
+            n = -(-self.size // factor)
+
+            regions = list(self.mips.levels) if dirty is None else dirty
+            if dirty is None: # regions gone from the pyramid are dropped too
+                for region in set(instances.buffers) - set(regions):
+                    instances.upload_region(region, [], [])
+            for region in regions:
+                coords, colors = self.mips.cells(region, level)
+                data = InstanceBuffer.build(level_positions(coords, level), colors, self.grid_space * factor)
+                instances.upload_region(region, data, (coords[:, 0] * n + coords[:, 1]) * n + coords[:, 2])
+            instances.flush()
+
+    # ------------------- Translucency ------------------- #
+
+    def _draw_translucent(self):
+        '''
+        Second pass: translucent voxels back to front, blended over the opaque ones
+        without writing depth. They are sorted again only when the camera moved past
+        the sorter threshold or they changed.
+        '''
+        greedy = self._use_greedy_mesh()
+        if greedy != self._translucent_greedy: # the other mode keeps them in another buffer
+            self._translucent_greedy = greedy
+            self.sorter.invalidate()
+        if greedy:
+            vertices, colors, centers = self._translucent_quads
+            order = self.sorter.sort(centers, self.cam_pos)
+            if order is not None:
+                self.translucent_mesh.upload(vertices[order].reshape(-1, 3), colors[order].reshape(-1, 4))
+            draw = self.translucent_mesh.draw
+        else:
+            buffer = self.translucent
+            order = self.sorter.sort(buffer.data['offset'][:buffer.count], self.cam_pos)
+            if order is not None:
+                buffer.reorder(order)
+            buffer.flush()
+            draw = lambda: buffer.draw(self.vertex_count[self.cube_vao])
+
+        state.set_depth_mask(False)
+        draw()
+        state.set_depth_mask(True)
+
+    # ------------------- Level of Detail ------------------- #
+
+    def _region_levels(self, regions, region_size):
+        ''' (K,) level to draw each region (K, 3) at; all 0 without LOD or camera '''
+        levels = np.zeros(len(regions), dtype=np.int64)
+        if self.mips is not None and self.cam_pos is not None and len(regions):
+            lo, hi = region_bounds(regions, region_size)
+            levels = select_levels(lo, hi, self.cam_pos, self.pixel_scale, self.lod_error, self.mips.max_level)
+        return levels
+
+    def _set_lod_tint(self, shader_program, level):
+        ''' Debug tint of the regions drawn at level (alpha 0: no tint) '''
+        r, g, b = LEVEL_COLORS[level]
+        alpha = 0.6 if self.lod_debug else 0.0
+        shader_program.set("lodTint", (r, g, b, alpha))
+
+    def _draw_levels(self, shader_program, regions, region_size, draw):
+        '''
+        Cull regions (K, 3), pick a level for the ones left and call draw(level, mask)
+        once per level in use, with the mask of the regions drawn at that level.
+        '''
+        inside = self._visible_regions(regions, region_size)
+        levels = self._region_levels(regions, region_size)
+        used = []
+        for level in range(len(LEVEL_COLORS)):
+            mask = inside & (levels == level)
+            used.append(int(np.count_nonzero(mask)))
+            if used[-1]:
+                self._set_lod_tint(shader_program, level)
+                draw(level, mask)
+        self._set_lod_tint(shader_program, 0)
+        self.lod_stats = {'lod_regions': "/".join(map(str, used))}
+
+    # ------------------- Frustum Culling ------------------- #
+
+    def _region_size(self):
+        return self.grid.chunk_size if self.grid.sparse else REGION_SIZE
+
+    def set_view_projection(self, view_proj, cam_pos=None, pixel_scale=None):
+        '''
+        Called every frame by the window with the combined proj @ view matrix, the
+        camera position and the pixels covered by one unit at distance 1 (for LOD).
+        '''
+        self.view_proj = view_proj
+        self.cam_pos, self.pixel_scale = cam_pos, pixel_scale
+
+    def _visible_regions(self, regions, region_size):
+        '''
+        Mask of the regions (K, 3) of region_size³ cells whose bounds intersect the view frustum, and update
+        the culling counters. Everything is kept until the window sent a matrix.
+        '''
+        if self.view_proj is None:
+            inside = np.ones(len(regions), dtype=bool)
+        else:
+            lo, hi = region_bounds(regions, region_size)
+            inside = boxes_in_frustum(frustum_planes(self.view_proj), lo, hi)
+        drawn = int(np.count_nonzero(inside))
+        self.cull_stats = {
+            'regions_tested': len(regions),
+            'regions_culled': len(regions) - drawn,
+            'regions_drawn': drawn,
+        }
+        return inside
+
+    def frame_stats(self):
+        ''' Counters of the last rendered frame '''
+        if self._use_greedy_mesh():
+            stats = {'mode': self.render_mode, **self.mesh_stats, **self.pick_stats}
+        else:
+            stats = {
+                'mode': self.render_mode,
+                'voxels': self.instances.count,
+                'upload_bytes': self.instances.bytes_uploaded,
+                **self.pick_stats,
+            }
+        stats.update(self.cull_stats)
+        stats.update(self.sorter.stats)
+        if self.mips is not None:
+            stats.update(self.lod_stats)
+        if self.grid.octree is not None:
+            stats.update(self.grid.octree.stats(self.grid))
+        if self.grid.occlusion is not None:
+            stats.update(self.grid.occlusion.stats())
+        if self.journal is not None:
+            stats.update(self.journal.stats)
+        stats.update(self.history.stats)
+        if self.grid.paged:
+            stats.update(self.grid.stats)
+        return stats
     
     @override
     def render(self, shader_program):
-        cube_count = self.vertex_count[self.cube_vao]
-        
-        glBindVertexArray(self.cube_vao)
+        selected = self.get_selected_voxel()
+        state.set_polygon_mode(GL_FILL) # the selection wireframe of the last frame left GL_LINE
         
-        for x in range(self.size):
-            for y in range(self.size):
-                for z in range(self.size):
-                    voxel: Voxel = self.grid[x, y, z]
-                    visible = voxel.is_visible
-
-                    if visible:
-                        Tx, Ty, Tz = voxel.pos
-                        S = voxel.scale
-
-                        r, g, b, a = voxel.color
-
-                        if voxel.is_selected:
-                            r = min(r + 0.5, 1.0)
-                            g = min(g + 0.5, 1.0)
-                            b = min(b + 0.5, 1.0)
-
-                        self.defineColor(shader_program, r, g, b, a)
-                        
-                        transform = self.transformation(Tx, Ty, Tz, Sx=S, Sy=S, Sz=S)
-                        transform_loc = glGetUniformLocation(shader_program, "transform")
-                        glUniformMatrix4fv(transform_loc, 1, GL_TRUE, transform)
-
-                        glDrawArrays(GL_TRIANGLES, 0, cube_count)
-
-                    else: # --- Draw wireframe when the voxel is selected and not visible ---
-                        if voxel.is_selected:
-                            Tx, Ty, Tz = voxel.pos
-                            S = voxel.scale
-
-                            self.defineColor(shader_program, 1.0, 1.0, 1.0, 1.0)
-
-                            transform = self.transformation(Tx, Ty, Tz, Sx=S, Sy=S, Sz=S)
-                            transform_loc = glGetUniformLocation(shader_program, "transform")
-                            glUniformMatrix4fv(transform_loc, 1, GL_TRUE, transform)
-
-                            glPolygonMode(GL_FRONT_AND_BACK, GL_LINE)
-                            glLineWidth(2.5)
-                            glDrawArrays(GL_TRIANGLES, 0, cube_count)
-                            glPolygonMode(GL_FRONT_AND_BACK, GL_FILL)
+        if self._use_greedy_mesh():
+            # --- Draw the merged exposed faces, selection shown as a wireframe ---
+            self._update_mesh()
+            self.setRenderMode(shader_program, self.MODE_VERTEX_COLOR)
+            regions, firsts, counts = self._mesh_regions
+            self._draw_levels(shader_program, regions, self._region_size(),
+                              lambda level, mask: self.mesh.draw(firsts[level][mask], counts[level][mask]))
+            self._draw_translucent()
+
+            if self.grid.in_bounds(selected):
+                self._draw_wireframe(shader_program, selected)
+            return shader_program
+
+        # --- Draw every visible voxel in one instanced call (highlight done in the shader) ---
+        self._update_instances()
+        self.setRenderMode(shader_program, self.MODE_INSTANCED)
+        shader_program.set("selectedCell", selected)
+        self._update_lod_instances()
+        regions, keys = self.instances.region_keys()
+
+        def draw(level, mask):
+            chosen = [region for region, keep in zip(regions, mask.tolist()) if keep]
+            instances = self.instances if level == 0 else self.lod_instances[level]
+            instances.draw(self.vertex_count[self.cube_vao], [r for r in chosen if r in instances.buffers])
+        self._draw_levels(shader_program, keys, self.instances.region_size, draw)
+        self._draw_translucent()
+
+        # --- Draw wireframe when the voxel is selected and not visible ---
+        if self.grid.in_bounds(selected) and not self.grid.is_visible(selected):
+            self._draw_wireframe(shader_program, selected)
         
-        return shader_program
\ No newline at end of file
+        return shader_program
+
+    def _draw_wireframe(self, shader_program, cell):
+        Tx, Ty, Tz = cell
+        S = self.grid_space
+
+        self.setRenderMode(shader_program, self.MODE_UNIFORM)
+        self.defineColor(shader_program, 1.0, 1.0, 1.0, 1.0)
+
+        transform = self.transformations([(Tx, Ty, Tz)], scales=S)[0] # cached while the selection stays
+        shader_program.set("transform", transform)
+
+        state.bind_vertex_array(self.cube_vao)
+        state.set_polygon_mode(GL_LINE) # left set: whoever draws filled next sets GL_FILL
+        state.set_line_width(2.5)
+        glDrawArrays(GL_TRIANGLES, 0, self.vertex_count[self.cube_vao])
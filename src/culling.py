@@ -0,0 +1,48 @@
+'''
+    View-frustum culling of voxel regions (axis-aligned boxes), vectorized over all
+    regions at once.
+'''
+
+import numpy as np
+
+# Side, in cells, of the regions a dense grid is split into for culling
+# (chunked grids use their chunk size)
+REGION_SIZE = 16
+
+
+def frustum_planes(view_proj):
+    '''
+    The 6 planes (a, b, c, d) of the frustum of a combined proj @ view matrix
+    (column vectors, as sent with GL_TRUE). A point p is inside a plane when
+    a*x + b*y + c*z + d >= 0. Planes are normalized.
+    '''
+    m = np.asarray(view_proj, dtype=np.float64)
+    planes = np.array([
+        m[3] + m[0], m[3] - m[0], # left, right
+        m[3] + m[1], m[3] - m[1], # bottom, top
+        m[3] + m[2], m[3] - m[2], # near, far
+    ])
+    return planes / np.linalg.norm(planes[:, :3], axis=1, keepdims=True)
+
+
+def boxes_in_frustum(planes, lo, hi):
+    '''
+    (N,) bool: boxes lo..hi (N, 3) that intersect the frustum (or may: boxes near a
+    frustum corner can be kept although they are outside, never the opposite).
+
+    For every plane only the box corner furthest along its normal is tested: if
+    even that corner is behind the plane, the whole box is.
+    '''
+    lo, hi = np.asarray(lo, dtype=np.float64), np.asarray(hi, dtype=np.float64)
+    normals = planes[:, :3]
+    # (N, 6, 3) furthest corner of every box for every plane
+    corner = np.where(normals[None] >= 0, hi[:, None], lo[:, None])
+    distance = (corner * normals[None]).sum(axis=2) + planes[None, :, 3]
+    return (distance >= 0).all(axis=1)
+
+
+def region_bounds(keys, region_size):
+    ''' World boxes (lo, hi) of regions (K, 3): voxels are unit cubes centered on their cell '''
+    keys = np.asarray(keys, dtype=np.float64).reshape(-1, 3)
+    lo = keys * region_size - 0.5
+    return lo, lo + region_size
@@ -0,0 +1,147 @@
+'''
+    Shadow copy of the GL state the renderer changes every frame: bound program,
+    VAO, polygon mode, line width, depth mask and the uniform values of every
+    program. A change equal to the current value is not sent to the driver.
+
+    Every state change of the renderer goes through here (a direct glBindVertexArray
+    or glUseProgram would make the shadow copy wrong), and the calls issued and
+    elided in the current frame are counted for the frame statistics (F3).
+'''
+
+from OpenGL.GL import (
+    glUseProgram, glBindVertexArray, glPolygonMode, glLineWidth, glDepthMask,
+    glGetProgramiv, glGetActiveUniform, glGetUniformLocation,
+    glGetUniformBlockIndex, glUniformBlockBinding, GL_INVALID_INDEX,
+    glUniform1i, glUniform1f, glUniform3f, glUniform4f, glUniformMatrix4fv,
+    GL_ACTIVE_UNIFORMS, GL_FRONT_AND_BACK, GL_TRUE, GL_FALSE,
+    GL_INT, GL_BOOL, GL_FLOAT, GL_FLOAT_VEC3, GL_FLOAT_VEC4, GL_FLOAT_MAT4,
+)
+import numpy as np
+
+
+class GLState:
+    ''' Current value of each tracked state and the issued/elided counters of the frame '''
+
+    def __init__(self):
+        self.program = None
+        self.vao = None
+        self.polygon_mode = None
+        self.line_width = None
+        self.depth_mask = None
+        self.stats = {'gl_calls': 0, 'gl_elided': 0}
+
+    def begin_frame(self):
+        ''' Reset the counters (called by the window before drawing) '''
+        self.stats = {'gl_calls': 0, 'gl_elided': 0}
+
+    def _changed(self, attribute, value):
+        ''' True (and record value) when it differs from the current one '''
+        if getattr(self, attribute) == value:
+            self.stats['gl_elided'] += 1
+            return False
+        setattr(self, attribute, value)
+        self.stats['gl_calls'] += 1
+        return True
+
+    def use_program(self, program):
+        ''' program -> ShaderProgram or raw program id (0 unbinds) '''
+        program_id = int(program)
+        if self._changed('program', program_id):
+            glUseProgram(program_id)
+
+    def bind_vertex_array(self, vao):
+        vao = int(vao)
+        if self._changed('vao', vao):
+            glBindVertexArray(vao)
+
+    def set_polygon_mode(self, mode):
+        if self._changed('polygon_mode', int(mode)):
+            glPolygonMode(GL_FRONT_AND_BACK, mode)
+
+    def set_line_width(self, width):
+        if self._changed('line_width', float(width)):
+            glLineWidth(width)
+
+    def set_depth_mask(self, enabled):
+        if self._changed('depth_mask', bool(enabled)):
+            glDepthMask(GL_TRUE if enabled else GL_FALSE)
+
+
+# The renderer has a single GL context, so the tracked state is global
+state = GLState()
+
+
+def _upload_matrix4(location, value):
+    # Matrices are row-major numpy arrays, as everywhere in the project (hence GL_TRUE)
+    glUniformMatrix4fv(location, 1, GL_TRUE, value)
+
+
+# Uniform type -> (normalize value to a comparable key, upload(location, key))
+_UNIFORM_SETTERS = {
+    GL_INT: (int, glUniform1i),
+    GL_BOOL: (int, glUniform1i),
+    GL_FLOAT: (float, glUniform1f),
+    GL_FLOAT_VEC3: (lambda v: tuple(map(float, v)), lambda loc, v: glUniform3f(loc, *v)),
+    GL_FLOAT_VEC4: (lambda v: tuple(map(float, v)), lambda loc, v: glUniform4f(loc, *v)),
+    GL_FLOAT_MAT4: (lambda v: np.array(v, dtype=np.float32).reshape(4, 4), _upload_matrix4),
+}
+
+
+class ShaderProgram:
+    '''
+    A linked program with the locations of its active uniforms, resolved once after
+    linking, and the last value uploaded to each. set() makes the program current
+    (uniform uploads go to the bound program) and skips values already there.
+
+    Uniforms the compiler removed (or misspelled names) are ignored, like a
+    glUniform* call on location -1 would be.
+
+    blocks -> {uniform block name: binding point} linked here too; blocks the
+    program does not use are skipped (see camera.CameraBuffer)
+    '''
+
+    def __init__(self, program_id, blocks=None):
+        self.id = int(program_id)
+        self.uniforms = {} # name -> (location, GL type)
+        for index in range(glGetProgramiv(self.id, GL_ACTIVE_UNIFORMS)):
+            name, _size, kind = glGetActiveUniform(self.id, index)
+            name = name.decode() if isinstance(name, bytes) else name
+            location = glGetUniformLocation(self.id, name)
+            if location >= 0: # uniform block members have no location
+                self.uniforms[name] = (location, kind)
+        self.values = {} # name -> last uploaded value (normalized)
+        for name, binding in (blocks or {}).items():
+            index = glGetUniformBlockIndex(self.id, name)
+            if index != GL_INVALID_INDEX:
+                glUniformBlockBinding(self.id, index, binding)
+
+    def __int__(self):
+        return self.id
+
+    def use(self):
+        state.use_program(self.id)
+
+    def location(self, name) -> int:
+        ''' Location of an active uniform, -1 if the program has none by that name '''
+        entry = self.uniforms.get(name)
+        return -1 if entry is None else entry[0]
+
+    def set(self, name, value):
+        ''' Upload value (scalar, sequence or 4x4 row-major matrix) unless it is already set '''
+        entry = self.uniforms.get(name)
+        if entry is None:
+            return
+        location, kind = entry
+        normalize, upload = _UNIFORM_SETTERS[kind]
+        value = normalize(value)
+
+        previous = self.values.get(name)
+        same = (np.array_equal(previous, value) if isinstance(value, np.ndarray)
+                else previous == value)
+        if previous is not None and same:
+            state.stats['gl_elided'] += 1
+            return
+        self.use()
+        upload(location, value)
+        self.values[name] = value
+        state.stats['gl_calls'] += 1
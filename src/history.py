@@ -0,0 +1,103 @@
+'''
+    Undo/redo history made of compact deltas.
+
+    A delta keeps, for every cell an edit touched, its flat index and its visibility
+    and packed RGBA before and after the edit (18 bytes per cell), so undoing or
+    redoing an edit of any size is a single vectorized write.
+'''
+
+from collections import deque
+import numpy as np
+
+from voxel_grid import VoxelStorage
+
+
+class EditDelta:
+    def __init__(self, index, before_visible, before_colors):
+        self.index = index                   # (N,) int64 flat cell indices (unique)
+        self.before_visible = before_visible # (N,) bool
+        self.before_colors = before_colors   # (N, 4) uint8
+        self.after_visible = None
+        self.after_colors = None
+
+    @classmethod
+    def capture(cls, grid: VoxelStorage, cells):
+        ''' State of cells (N, 3) before an edit; duplicated cells are kept once '''
+        index = np.sort(grid.flat_index(cells))
+        index = index[np.diff(index, prepend=-1) != 0]
+        cells = np.stack(np.unravel_index(index, (grid.size,) * 3), axis=1)
+        return cls(index, grid.occupied(cells), grid.colors_at(cells))
+
+    def complete(self, grid: VoxelStorage):
+        ''' State of the same cells after the edit; returns self '''
+        cells = self.cells(grid)
+        self.after_visible = grid.occupied(cells)
+        self.after_colors = grid.colors_at(cells)
+        return self
+
+    def cells(self, grid: VoxelStorage):
+        return np.stack(np.unravel_index(self.index, (grid.size,) * 3), axis=1)
+
+    @property
+    def changed(self) -> bool:
+        ''' False when the edit left every cell as it was '''
+        return bool((self.before_visible != self.after_visible).any() or
+                    (self.before_colors != self.after_colors).any())
+
+    @property
+    def nbytes(self) -> int:
+        arrays = (self.index, self.before_visible, self.before_colors, self.after_visible, self.after_colors)
+        return sum(a.nbytes for a in arrays if a is not None)
+
+
+class EditHistory:
+    '''
+    Undo and redo stacks of EditDelta. The deltas held by both stacks are capped at
+    max_bytes; past it the oldest undo steps are dropped first.
+    '''
+
+    def __init__(self, max_bytes=64 << 20):
+        self.max_bytes = max_bytes
+        self.undo_stack = deque()
+        self.redo_stack = []
+        self.nbytes = 0
+
+    def clear(self):
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        self.nbytes = 0
+
+    def push(self, delta: EditDelta):
+        ''' Record a completed edit; a new edit discards the redo steps '''
+        if not delta.changed:
+            return
+        for undone in self.redo_stack:
+            self.nbytes -= undone.nbytes
+        self.redo_stack.clear()
+
+        self.undo_stack.append(delta)
+        self.nbytes += delta.nbytes
+        while self.nbytes > self.max_bytes and self.undo_stack:
+            self.nbytes -= self.undo_stack.popleft().nbytes
+
+    def undo(self, grid: VoxelStorage):
+        ''' Restore the cells of the last edit; returns the delta, or None if there is nothing to undo '''
+        if not self.undo_stack:
+            return None
+        delta = self.undo_stack.pop()
+        grid.write_voxels(delta.cells(grid), delta.before_visible, delta.before_colors)
+        self.redo_stack.append(delta)
+        return delta
+
+    def redo(self, grid: VoxelStorage):
+        if not self.redo_stack:
+            return None
+        delta = self.redo_stack.pop()
+        grid.write_voxels(delta.cells(grid), delta.after_visible, delta.after_colors)
+        self.undo_stack.append(delta)
+        return delta
+
+    @property
+    def stats(self):
+        return {'undo_steps': len(self.undo_stack), 'redo_steps': len(self.redo_stack),
+                'history_bytes': self.nbytes}
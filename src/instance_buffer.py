@@ -0,0 +1,281 @@
+from OpenGL.GL import (
+    glGenVertexArrays, glDeleteVertexArrays, glGenBuffers, glBindBuffer, glBufferData, glBufferSubData,
+    glEnableVertexAttribArray, glVertexAttribPointer, glVertexAttribDivisor,
+    glDrawArraysInstanced, glDeleteBuffers,
+    GL_ARRAY_BUFFER, GL_DYNAMIC_DRAW, GL_FLOAT, GL_UNSIGNED_BYTE, GL_FALSE, GL_TRUE,
+    GL_TRIANGLES,
+)
+import ctypes
+import numpy as np
+from gl_state import state
+
+# Per-instance layout, interleaved: offset (vec3) | scale (float) | color (4 x ubyte, normalized)
+INSTANCE_DTYPE = np.dtype([
+    ('offset', np.float32, 3),
+    ('scale', np.float32),
+    ('color', np.uint8, 4),
+])
+
+# Attribute locations read by the voxel vertex shader (see Window.shaderInit)
+POSITION_LOCATION = 0 # per-vertex, from the instanced mesh
+OFFSET_LOCATION = 2
+SCALE_LOCATION = 3
+COLOR_LOCATION = 4
+
+
+class InstanceBuffer:
+    '''
+    GPU buffer holding one INSTANCE_DTYPE record per voxel, with its own VAO reading
+    the mesh positions from mesh_vbo and the records with divisor 1, so the whole set
+    is drawn with a single glDrawArraysInstanced. The attribute pointers are set once,
+    here: drawing only binds the VAO.
+
+    Records are addressed by an integer key (the flat cell index). A CPU mirror keeps
+    the records packed in [0, count): removing a key moves the last record into the
+    freed slot, so every edit touches at most two slots. Touched slots are merged
+    into contiguous ranges and sent with glBufferSubData on flush().
+    '''
+
+    def __init__(self, mesh_vbo, capacity=1024):
+        self.count = 0
+        self.vbo = glGenBuffers(1)
+        self.vao = glGenVertexArrays(1)
+
+        # CPU mirror and slot bookkeeping
+        self.data = np.zeros(capacity, dtype=INSTANCE_DTYPE)
+        self.keys = np.full(capacity, -1, dtype=np.int64) # slot -> key
+        self.slots = {}                                   # key -> slot
+        self.dirty_slots = set()
+        self.needs_realloc = True
+
+        # Upload counters
+        self.bytes_uploaded = 0       # during the last flush (one per frame)
+        self.total_bytes_uploaded = 0
+
+        state.bind_vertex_array(self.vao)
+        glBindBuffer(GL_ARRAY_BUFFER, mesh_vbo)
+        glEnableVertexAttribArray(POSITION_LOCATION)
+        glVertexAttribPointer(POSITION_LOCATION, 3, GL_FLOAT, GL_FALSE, 0, None)
+        self._point_attributes()
+        state.bind_vertex_array(0)
+
+    def _point_attributes(self):
+        ''' Point the instance attributes of the bound VAO at this buffer '''
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        stride = INSTANCE_DTYPE.itemsize
+        attributes = (
+            (OFFSET_LOCATION, 3, GL_FLOAT, GL_FALSE, 'offset'),
+            (SCALE_LOCATION, 1, GL_FLOAT, GL_FALSE, 'scale'),
+            (COLOR_LOCATION, 4, GL_UNSIGNED_BYTE, GL_TRUE, 'color'),
+        )
+        for location, size, gl_type, normalized, field in attributes:
+            glEnableVertexAttribArray(location)
+            glVertexAttribPointer(location, size, gl_type, normalized, stride,
+                                  ctypes.c_void_p(INSTANCE_DTYPE.fields[field][1]))
+            glVertexAttribDivisor(location, 1)
+
+    @staticmethod
+    def build(coords, colors, scale):
+        ''' Pack voxel coordinates (N, 3) and uint8 colors (N, 4) into instance records '''
+        data = np.empty(len(coords), dtype=INSTANCE_DTYPE)
+        data['offset'] = coords
+        data['scale'] = scale
+        data['color'] = colors
+        return data
+
+    # ------------------- Full Upload ------------------- #
+
+    def upload(self, data, keys):
+        ''' Replace the whole buffer contents; keys (N,) identify each record for later edits '''
+        self.count = len(data)
+        self._reserve(self.count)
+        self.data[:self.count] = data
+        self.keys[:self.count] = keys
+        self.keys[self.count:] = -1
+        self.slots = {int(k): i for i, k in enumerate(keys)}
+        self.dirty_slots.clear()
+        self.needs_realloc = True
+
+    # ------------------- Incremental Edits ------------------- #
+
+    def put(self, key, record):
+        ''' Insert or overwrite the record of a key '''
+        slot = self.slots.get(key)
+        if slot is None:
+            self._reserve(self.count + 1)
+            slot = self.count
+            self.count += 1
+            self.slots[key] = slot
+            self.keys[slot] = key
+        self.data[slot] = record
+        self.dirty_slots.add(slot)
+
+    def remove(self, key):
+        ''' Drop the record of a key, filling the hole with the last record '''
+        slot = self.slots.pop(key, None)
+        if slot is None:
+            return
+
+        last = self.count - 1
+        if slot != last:
+            moved = int(self.keys[last])
+            self.data[slot] = self.data[last]
+            self.keys[slot] = moved
+            self.slots[moved] = slot
+            self.dirty_slots.add(slot)
+        self.keys[last] = -1
+        self.count = last
+
+    def reorder(self, order):
+        ''' Permute the records in [0, count): slot i receives the record of slot order[i] '''
+        n = self.count
+        self.data[:n] = self.data[:n][order]
+        self.keys[:n] = self.keys[:n][order]
+        self.slots = {int(k): i for i, k in enumerate(self.keys[:n].tolist())}
+        self.dirty_slots.update(range(n))
+
+    def _reserve(self, needed):
+        ''' Grow the CPU mirror (doubling); the GPU buffer is reallocated on the next flush '''
+        capacity = len(self.data)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        data = np.zeros(capacity, dtype=INSTANCE_DTYPE)
+        data[:len(self.data)] = self.data
+        keys = np.full(capacity, -1, dtype=np.int64)
+        keys[:len(self.keys)] = self.keys
+        self.data, self.keys = data, keys
+        self.needs_realloc = True
+
+    # ------------------- GPU Sync ------------------- #
+
+    def dirty_ranges(self):
+        ''' Merge the dirty slots (inside [0, count)) into sorted (start, stop) ranges '''
+        slots = np.fromiter((s for s in self.dirty_slots if s < self.count), dtype=np.int64)
+        if len(slots) == 0:
+            return []
+        slots.sort()
+        breaks = np.flatnonzero(np.diff(slots) > 1) + 1
+        starts = slots[np.r_[0, breaks]]
+        stops = slots[np.r_[breaks - 1, len(slots) - 1]] + 1
+        return list(zip(starts.tolist(), stops.tolist()))
+
+    def flush(self):
+        ''' Send pending changes to the GPU and record how many bytes it took '''
+        self.bytes_uploaded = 0
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+
+        if self.needs_realloc:
+            # Allocate the full capacity so future appends fit without reallocating
+            glBufferData(GL_ARRAY_BUFFER, self.data.nbytes, self.data, GL_DYNAMIC_DRAW)
+            self.bytes_uploaded = self.data.nbytes
+            self.needs_realloc = False
+        else:
+            itemsize = INSTANCE_DTYPE.itemsize
+            for start, stop in self.dirty_ranges():
+                chunk = self.data[start:stop]
+                glBufferSubData(GL_ARRAY_BUFFER, start * itemsize, chunk.nbytes, chunk)
+                self.bytes_uploaded += chunk.nbytes
+
+        self.dirty_slots.clear()
+        self.total_bytes_uploaded += self.bytes_uploaded
+
+    def draw(self, vertex_count):
+        if self.count == 0:
+            return
+        state.bind_vertex_array(self.vao)
+        glDrawArraysInstanced(GL_TRIANGLES, 0, vertex_count, self.count)
+
+    def delete(self):
+        glDeleteVertexArrays(1, [self.vao])
+        glDeleteBuffers(1, [self.vbo])
+
+
+class RegionInstances:
+    '''
+    One InstanceBuffer per region of region_size³ cells, all instancing the same mesh
+    (mesh_vbo), so whole regions can be skipped (frustum culling). Cell (x, y, z) belongs
+    to region (x, y, z) // region_size; records keep the flat cell index as key.
+    '''
+
+    def __init__(self, mesh_vbo, region_size):
+        self.mesh_vbo = mesh_vbo
+        self.region_size = int(region_size)
+        self.buffers = {} # region key -> InstanceBuffer
+        self.total_bytes_uploaded = 0
+
+    def region_of(self, cell):
+        return tuple(int(c) // self.region_size for c in cell)
+
+    def _buffer(self, region):
+        buffer = self.buffers.get(region)
+        if buffer is None:
+            buffer = InstanceBuffer(self.mesh_vbo)
+            self.buffers[region] = buffer
+        return buffer
+
+    @property
+    def count(self):
+        return sum(buffer.count for buffer in self.buffers.values())
+
+    @property
+    def bytes_uploaded(self):
+        return sum(buffer.bytes_uploaded for buffer in self.buffers.values())
+
+    def region_keys(self):
+        ''' (regions list, (K, 3) int array) of the regions holding at least one record '''
+        regions = [region for region, buffer in self.buffers.items() if buffer.count]
+        return regions, np.array(regions, dtype=np.int64).reshape(-1, 3)
+
+    # ------------------- Full Upload ------------------- #
+
+    def upload(self, coords, data, keys):
+        ''' Replace every region; coords (N, 3) are the cells of the records in data '''
+        coords = np.asarray(coords, dtype=np.int64).reshape(-1, 3)
+        regions = coords // self.region_size
+        unique, inverse = np.unique(regions, axis=0, return_inverse=True)
+        order = np.argsort(inverse.ravel(), kind='stable')
+        bounds = np.searchsorted(inverse.ravel()[order], np.arange(len(unique) + 1))
+
+        present = set()
+        for i, region in enumerate(map(tuple, unique.tolist())):
+            rows = order[bounds[i]:bounds[i + 1]]
+            self._buffer(region).upload(data[rows], keys[rows])
+            present.add(region)
+
+        # Regions left empty free their GPU buffer
+        for region in list(self.buffers):
+            if region not in present:
+                self.buffers.pop(region).delete()
+
+    def upload_region(self, region, data, keys):
+        ''' Replace the records of one region only '''
+        if len(data):
+            self._buffer(region).upload(data, keys)
+        elif region in self.buffers:
+            self.buffers.pop(region).delete()
+
+    # ------------------- Incremental Edits ------------------- #
+
+    def put(self, cell, key, record):
+        self._buffer(self.region_of(cell)).put(key, record)
+
+    def remove(self, cell, key):
+        buffer = self.buffers.get(self.region_of(cell))
+        if buffer is not None:
+            buffer.remove(key)
+
+    # ------------------- GPU Sync ------------------- #
+
+    def flush(self):
+        for buffer in self.buffers.values():
+            buffer.flush()
+        self.total_bytes_uploaded += self.bytes_uploaded
+
+    def draw(self, vertex_count, regions=None):
+        ''' Draw the given regions (all of them by default) '''
+        if regions is None:
+            regions = self.buffers
+        for region in regions:
+            self.buffers[region].draw(vertex_count)
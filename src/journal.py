@@ -0,0 +1,274 @@
+'''
+    Append-only edit journal for crash recovery.
+
+    The journal folder holds a full snapshot of the scene plus the edits made after it:
+
+    snapshot-<id>.vxp -> the scene when snapshot <id> was taken (palette + RLE format,
+                         or .vxc chunks for paged worlds, copied without decoding)
+    edits-<id>.vxj    -> fixed-size records of the edits made on top of snapshot <id>
+
+    Every edit costs one 20-byte record. Records are buffered and appended in small
+    batches; when the edits file grows past a threshold a new snapshot is written
+    by a worker thread (compaction) and the old files are deleted. On start the
+    scene is rebuilt from the newest snapshot plus the edits that follow it.
+'''
+
+import os
+import re
+import struct
+import threading
+import time
+import numpy as np
+
+import scene_formats
+from paged_grid import open_paged
+from voxel_grid import VoxelStorage
+
+# Operations
+OP_SET = 1   # voxel made visible with a color
+OP_PAINT = 2 # color of a visible voxel changed
+OP_CLEAR = 3 # voxel removed
+OP_SPACE = 4 # grid spacing changed (payload is a float32)
+
+JOURNAL_MAGIC = b"VOXJ"
+JOURNAL_VERSION = 1
+# magic | version u16 | flags u16 | snapshot id u32
+JOURNAL_HEADER = struct.Struct("<4sHHI")
+# op u8 | padding | x y z i32 | payload 4 bytes (packed RGBA or float32)
+RECORD = struct.Struct("<B3x3i4s")
+RECORD_DTYPE = np.dtype([
+    ('op', 'u1'), ('pad', 'V3'), ('cell', '<i4', (3,)), ('payload', 'u1', (4,)),
+])
+
+# Header flag: the edits file continues the previous one, the state it applies to
+# is the previous snapshot plus the previous edits (set by compaction, not by reset)
+FLAG_CONTINUES = 1
+
+_FILE_NAME = re.compile(r"^(snapshot|edits)-(\d+)\.(vxp|vxc|vxj)$")
+
+
+class EditJournal:
+    def __init__(self, folder, flush_records=32, flush_interval=0.5, compact_bytes=1 << 20):
+        '''
+        folder         -> where snapshots and edit files are kept
+        flush_records  -> buffered records that trigger a write
+        flush_interval -> seconds after which buffered records are written anyway
+        compact_bytes  -> size of the edits file that triggers a new snapshot
+        '''
+        self.folder = folder
+        self.flush_records = flush_records
+        self.flush_interval = flush_interval
+        self.compact_bytes = compact_bytes
+
+        self.snapshot_id = 0
+        self.file = None
+        self.file_bytes = 0
+        self.pending = bytearray()
+        self.pending_since = 0.0
+        self.compactor = None # worker thread writing a snapshot
+
+        self.stats = {'journal_records': 0, 'journal_bytes': 0, 'compactions': 0}
+        os.makedirs(folder, exist_ok=True)
+
+    # ------------------- Files ------------------- #
+
+    def _path(self, kind, snapshot_id, extension="vxj"):
+        return os.path.join(self.folder, f"{kind}-{snapshot_id:06d}.{extension}")
+
+    def _files(self, kind):
+        ''' id -> path of the snapshot or edits files in the folder '''
+        files = {}
+        for name in os.listdir(self.folder):
+            match = _FILE_NAME.match(name)
+            if match and match.group(1) == kind:
+                files[int(match.group(2))] = os.path.join(self.folder, name)
+        return files
+
+    def _open(self, snapshot_id, flags):
+        self.file = open(self._path("edits", snapshot_id), "wb")
+        self.file.write(JOURNAL_HEADER.pack(JOURNAL_MAGIC, JOURNAL_VERSION, flags, snapshot_id))
+        self.file.flush()
+        self.file_bytes = 0
+
+    def _read_edits(self, snapshot_id):
+        ''' (flags, records) of an edits file; a partially written last record is ignored '''
+        with open(self._path("edits", snapshot_id), "rb") as f:
+            raw = f.read()
+        if len(raw) < JOURNAL_HEADER.size:
+            return 0, np.zeros(0, dtype=RECORD_DTYPE)
+        magic, version, flags, _ = JOURNAL_HEADER.unpack_from(raw)
+        if magic != JOURNAL_MAGIC or version != JOURNAL_VERSION:
+            raise scene_formats.SceneFormatError(f"{self.folder}: journal inválido")
+        count = (len(raw) - JOURNAL_HEADER.size) // RECORD.size
+        return flags, np.frombuffer(raw, dtype=RECORD_DTYPE, count=count, offset=JOURNAL_HEADER.size)
+
+    # ------------------- Recovery ------------------- #
+
+    def recover(self):
+        '''
+        Scene left by the previous session: (grid, space), or None when the folder
+        holds no snapshot. Edits files after the newest snapshot are replayed while
+        they continue it; one started by a scene reset whose snapshot was never
+        written is dropped (that scene was lost, the previous one is restored).
+        A .vxc snapshot comes back as a paged grid: only the chunks the edits
+        touch are read now, the rest is paged in as usual.
+        '''
+        snapshots = self._files("snapshot")
+        if not snapshots:
+            return None
+
+        self.snapshot_id = max(snapshots)
+        path = snapshots[self.snapshot_id]
+        if path.endswith(".vxc"):
+            grid, space = open_paged(path)
+        else:
+            grid, space = scene_formats.load_scene(path)
+
+        edits = set(self._files("edits"))
+        snapshot_id = self.snapshot_id
+        while snapshot_id in edits:
+            flags, records = self._read_edits(snapshot_id)
+            if snapshot_id != self.snapshot_id and not flags & FLAG_CONTINUES:
+                break
+            space = self._replay(grid, space, records)
+            snapshot_id += 1
+
+        # New files are numbered after everything found, stale ones included
+        self.snapshot_id = max([self.snapshot_id] + list(edits))
+        return grid, space
+
+    @staticmethod
+    def _replay(grid: VoxelStorage, space, records):
+        ''' Apply records to the grid in one scatter: only the last record of each cell counts '''
+        spacing = records[records['op'] == OP_SPACE]
+        if len(spacing):
+            space = float(spacing['payload'][-1].view('<f4')[0])
+
+        records = records[records['op'] != OP_SPACE]
+        cells = records['cell'].astype(np.int64)
+        inside = ((cells >= 0) & (cells < grid.size)).all(axis=1)
+        records, cells = records[inside], cells[inside]
+        if len(records) == 0:
+            return space
+
+        # First occurrence in the reversed list = last edit of the cell
+        _, first = np.unique(grid.flat_index(cells)[::-1], return_index=True)
+        last = len(records) - 1 - first
+        grid.write_voxels(cells[last], records['op'][last] != OP_CLEAR, records['payload'][last])
+        return space
+
+    # ------------------- Recording ------------------- #
+
+    def record(self, op, cell, payload=b"\0\0\0\0"):
+        ''' Buffer one edit; written with the next batch '''
+        x, y, z = (int(c) for c in cell)
+        if not self.pending:
+            self.pending_since = time.perf_counter()
+        self.pending += RECORD.pack(op, x, y, z, bytes(payload))
+        self.stats['journal_records'] += 1
+        if len(self.pending) >= self.flush_records * RECORD.size:
+            self.flush()
+
+    def record_voxel(self, op, cell, packed_color):
+        self.record(op, cell, np.asarray(packed_color, dtype=np.uint8).tobytes())
+
+    def record_cells(self, cells, visible, colors):
+        '''
+        Buffer the new state of many cells at once (bulk edits, undo/redo):
+        visible (N,) bool and packed colors (N, 4), built as one record array.
+        '''
+        records = np.zeros(len(cells), dtype=RECORD_DTYPE)
+        records['op'] = np.where(visible, OP_SET, OP_CLEAR)
+        records['cell'] = cells
+        records['payload'] = colors
+        if not self.pending:
+            self.pending_since = time.perf_counter()
+        self.pending += records.tobytes()
+        self.stats['journal_records'] += len(records)
+        if len(self.pending) >= self.flush_records * RECORD.size:
+            self.flush()
+
+    def record_space(self, space):
+        self.record(OP_SPACE, (0, 0, 0), struct.pack("<f", space))
+
+    def flush(self):
+        ''' Append the buffered records to the edits file '''
+        if not self.pending or self.file is None:
+            return
+        self.file.write(self.pending)
+        self.file.flush()
+        self.file_bytes += len(self.pending)
+        self.stats['journal_bytes'] += len(self.pending)
+        self.pending.clear()
+
+    def tick(self, grid: VoxelStorage, space):
+        '''
+        Called once per frame: writes buffered records that waited too long and
+        starts a compaction when the edits file is too large.
+        '''
+        if self.pending and time.perf_counter() - self.pending_since >= self.flush_interval:
+            self.flush()
+        if self.file_bytes >= self.compact_bytes and not self.compacting:
+            self.compact(grid, space)
+
+    # ------------------- Compaction ------------------- #
+
+    @property
+    def compacting(self) -> bool:
+        return self.compactor is not None and self.compactor.is_alive()
+
+    def compact(self, grid: VoxelStorage, space):
+        ''' New snapshot of the current scene, written in the background '''
+        self._next_snapshot(grid, space, FLAG_CONTINUES)
+
+    def reset(self, grid: VoxelStorage, space):
+        '''
+        Start over from a new scene (first attach, or a scene loaded from a file):
+        the edits made so far do not apply to it.
+        '''
+        self.pending.clear()
+        self._next_snapshot(grid, space, 0)
+
+    def _next_snapshot(self, grid, space, flags):
+        if self.compacting:
+            self.compactor.join()
+        self.flush()
+        if self.file is not None:
+            self.file.close()
+
+        # Edits go to a new file right away; the snapshot they apply to is written meanwhile
+        self.snapshot_id += 1
+        self._open(self.snapshot_id, flags)
+        self.stats['compactions'] += 1
+        self.compactor = threading.Thread(
+            target=self._write_snapshot, args=(self.snapshot_id, grid.copy(), space), daemon=True)
+        self.compactor.start()
+
+    def _write_snapshot(self, snapshot_id, grid, space):
+        path = self._path("snapshot", snapshot_id, "vxc" if grid.paged else "vxp")
+        temp = path + ".tmp"
+        if grid.paged:
+            scene_formats.write_chunked(temp, grid, space)
+        else:
+            scene_formats.write_palette(temp, grid, space)
+        os.replace(temp, path) # the snapshot appears complete or not at all
+
+        # Everything older is now redundant
+        for kind in ("snapshot", "edits"):
+            for old_id, old_path in self._files(kind).items():
+                if old_id < snapshot_id:
+                    try:
+                        os.remove(old_path)
+                    except OSError:
+                        # A recovered paged grid may still read an old .vxc snapshot, and
+                        # Windows refuses to delete open files: a later compaction retries
+                        pass
+
+    def close(self):
+        ''' Write what is buffered and wait for a running compaction '''
+        self.flush()
+        if self.compacting:
+            self.compactor.join()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
@@ -0,0 +1,133 @@
+'''
+    Distance-based level of detail: a mip pyramid of the voxels, kept per region
+    (see culling.REGION_SIZE), and the choice of a level per region from its
+    projected error on screen.
+
+    Level l has cells of 2^l x 2^l x 2^l voxels: a cell is occupied when any of its
+    voxels is, and its color is the average color of the occupied ones. Only opaque
+    voxels enter the pyramid: translucent ones are always drawn at full detail, in
+    the sorted translucent pass.
+'''
+
+import numpy as np
+
+# Coarsest level (2x, 4x, 8x downsampled)
+MAX_LEVEL = 3
+
+# Edits touching more regions than this rebuild the whole pyramid
+REBUILD_THRESHOLD = 256
+
+# Debug tint of the regions drawn at each level (F4)
+LEVEL_COLORS = (
+    (1.0, 1.0, 1.0),
+    (0.2, 1.0, 0.2),
+    (1.0, 1.0, 0.2),
+    (1.0, 0.3, 0.2),
+)
+
+
+def downsample(visible, colors, factor):
+    '''
+    (visible, colors) of an (n, n, n) block downsampled by factor (n divisible by it):
+    occupancy is "any voxel", color the rounded average of the occupied voxels.
+    '''
+    n = visible.shape[0] // factor
+    shape = (n, factor, n, factor, n, factor)
+    counts = visible.reshape(shape).sum(axis=(1, 3, 5))
+    sums = (colors.astype(np.uint32) * visible[..., None]).reshape(shape + (4,)).sum(axis=(1, 3, 5))
+    occupied = counts > 0
+    averaged = np.zeros((n, n, n, 4), dtype=np.uint8)
+    averaged[occupied] = np.rint(sums[occupied] / counts[occupied][:, None])
+    return occupied, averaged
+
+
+def level_positions(coords, level):
+    ''' World centers of level cells (N, 3): a cell spans voxels coords * 2^l .. + 2^l - 1 '''
+    factor = 1 << level
+    return (np.asarray(coords, dtype=np.float64) + 0.5) * factor - 0.5
+
+
+def select_levels(lo, hi, cam_pos, pixel_scale, max_error, max_level=MAX_LEVEL):
+    '''
+    (K,) level of each region box lo..hi (K, 3): the coarsest one whose geometric error
+    (2^l - 1 voxels) projects to at most max_error pixels at the distance of the box.
+
+    pixel_scale -> pixels covered by one world unit at distance 1 (height / (2 tan(fov / 2)))
+    '''
+    cam_pos = np.asarray(cam_pos, dtype=np.float64)
+    nearest = np.clip(cam_pos, lo, hi)
+    distance = np.maximum(np.linalg.norm(nearest - cam_pos, axis=1), 1e-6)
+    allowed = max_error * distance / pixel_scale + 1.0 # 2^l may reach this
+    levels = np.floor(np.log2(allowed)).astype(np.int64)
+    return np.clip(levels, 0, max_level)
+
+
+class VoxelMips:
+    '''
+    Levels 1..MAX_LEVEL of every non-empty region of a storage. Registered as a grid
+    listener: an edit recomputes the levels of the regions it touched only, from the
+    region's voxels. dirty (regions changed since the renderer last looked, or None
+    after a full rebuild) tells the renderer what to re-upload.
+    '''
+
+    def __init__(self, grid, region_size):
+        self.grid = grid
+        self.region_size = int(region_size)
+        # Levels stop where the region side can no longer be halved
+        self.max_level = 0
+        while self.max_level < MAX_LEVEL and self.region_size % (2 << self.max_level) == 0:
+            self.max_level += 1
+        self.levels = {} # region key -> [(visible, colors) of level 1, 2, ...]
+        self.dirty = None
+        self.rebuild()
+        grid.add_listener(self._update)
+
+    def detach(self):
+        self.grid.remove_listener(self._update)
+
+    def _compute(self, region):
+        origin = np.asarray(region, dtype=np.int64) * self.region_size
+        visible, colors = self.grid.region(origin, (self.region_size,) * 3)
+        visible &= colors[..., 3] == 255
+        if not visible.any():
+            self.levels.pop(region, None)
+            return
+        levels = []
+        for _ in range(self.max_level):
+            visible, colors = downsample(visible, colors, 2)
+            levels.append((visible, colors))
+        self.levels[region] = levels
+
+    def rebuild(self):
+        self.levels = {}
+        coords, _ = self.grid.visible_cells()
+        for region in map(tuple, np.unique(coords // self.region_size, axis=0).tolist()):
+            self._compute(region)
+        self.dirty = None
+
+    def _update(self, cells):
+        if cells is None:
+            self.rebuild()
+            return
+        regions = set(map(tuple, np.unique(np.asarray(cells) // self.region_size, axis=0).tolist()))
+        if len(regions) > REBUILD_THRESHOLD:
+            self.rebuild()
+            return
+        for region in regions:
+            self._compute(region)
+        if self.dirty is not None:
+            self.dirty |= regions
+
+    def take_dirty(self):
+        ''' Regions changed since the last call, or None when everything changed '''
+        dirty, self.dirty = self.dirty, set()
+        return dirty
+
+    def cells(self, region, level):
+        ''' Level coordinates (N, 3) and colors (N, 4) of the occupied cells of a region '''
+        levels = self.levels.get(region)
+        if levels is None:
+            return np.zeros((0, 3), dtype=np.int64), np.zeros((0, 4), dtype=np.uint8)
+        visible, colors = levels[level - 1]
+        origin = np.asarray(region, dtype=np.int64) * (self.region_size >> level)
+        return np.argwhere(visible) + origin, colors[visible]
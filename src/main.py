@@ -1,22 +1,56 @@
 '''
     Final project for the Graphics Computing Fundamentals course
     at the Universidade do Vale do Rio dos Sinos (UNISINOS).
-    
+
     Developed by: Abrahão Francis & Marcos Rocha
 '''
 
+import sys
+import threading
+from startup import StartupProfile
+
+# python main.py --startup-profile -> per-phase startup times after the first frame
+profile = StartupProfile(enabled="--startup-profile" in sys.argv)
 
-from cube import Cube
-from window import Window
+with profile.phase("import numpy"):
+    import numpy
+with profile.phase("import glfw + OpenGL"):
+    import glfw
+    import OpenGL.GL
+with profile.phase("import cube, window, journal"):
+    from cube import Cube
+    from window import Window
+    from journal import EditJournal
 
 
-win = Window()
-cube = Cube(10)
+def build_scene(scene):
+    ''' Grid, sounds and crash recovery: no GL calls, so it overlaps the window setup '''
+    with profile.phase("cena + journal (paralelo)"):
+        cube = Cube(10)
+        cube.attach_journal(EditJournal("saves/.journal")) # restores the last session after a crash
+        scene.append(cube)
 
-win.target_cube = cube
 
 if __name__ == "__main__":
-    win.openGLInit("Editor de Cenas Voxelizadas")
-    cube.draw()
-    win.shaderInit()
-    win.renderInit([cube])
\ No newline at end of file
+    scene = []
+    builder = threading.Thread(target=build_scene, args=(scene,))
+    builder.start()
+
+    with profile.phase("Window()"):
+        win = Window()
+    with profile.phase("janela GLFW + contexto"):
+        win.openGLInit("Editor de Cenas Voxelizadas")
+    with profile.phase("shaders"):
+        win.shaderInit()
+
+    with profile.phase("espera da cena"):
+        builder.join()
+    if not scene:
+        sys.exit("Falha ao criar a cena inicial.")
+    cube = scene[0]
+    win.target_cube = cube
+    with profile.phase("upload para a GPU"):
+        cube.draw()
+
+    win.startup_profile = profile
+    win.renderInit([cube])
@@ -0,0 +1,235 @@
+from OpenGL.GL import (
+    glGenVertexArrays, glGenBuffers, glBindBuffer, glBufferData,
+    glEnableVertexAttribArray, glVertexAttribPointer, glDrawArrays, glMultiDrawArrays,
+    GL_ARRAY_BUFFER, GL_DYNAMIC_DRAW, GL_FLOAT, GL_UNSIGNED_BYTE, GL_FALSE, GL_TRUE,
+    GL_TRIANGLES,
+)
+import numpy as np
+from gl_state import state
+
+# Vertex attribute location of the per-vertex color read by the main shader
+VERTEX_COLOR_LOCATION = 1
+
+# Triangles drawn per voxel without meshing (full 36-vertex cube)
+CUBE_TRIANGLES = 12
+
+
+def _face_keys(visible, colors, axis, direction):
+    '''
+    Key of every exposed face looking along +/- axis: packed RGBA + 1,
+    or 0 where the cell is empty or its neighbor on that side is solid.
+    Cells outside the grid count as empty.
+    '''
+    neighbor = np.zeros_like(visible)
+    src = [slice(None)] * 3
+    dst = [slice(None)] * 3
+    if direction > 0:
+        src[axis], dst[axis] = slice(1, None), slice(None, -1)
+    else:
+        src[axis], dst[axis] = slice(None, -1), slice(1, None)
+    neighbor[tuple(dst)] = visible[tuple(src)]
+
+    exposed = visible & ~neighbor
+    packed = np.ascontiguousarray(colors).view(np.uint32)[..., 0].astype(np.int64) + 1
+    return np.where(exposed, packed, 0)
+
+
+def _greedy_quads(keys):
+    '''
+    Merge faces of a (slices, rows, cols) key array into rectangles.
+
+    First every row is split into runs of equal keys (vectorized), then runs with the
+    same slice, column span and key on consecutive rows are merged into one quad.
+    Returns arrays (slice, row0, row1, col0, col1, key) with inclusive bounds.
+    '''
+    s_count, r_count, c_count = keys.shape
+    rows = keys.reshape(-1, c_count)
+
+    # --- Runs along the columns ---
+    starts = np.ones(rows.shape, dtype=bool)
+    starts[:, 1:] = rows[:, 1:] != rows[:, :-1]
+    row_idx, col0 = np.nonzero(starts)
+    run_key = rows[row_idx, col0]
+
+    ends = np.ones(rows.shape, dtype=bool)
+    ends[:, :-1] = rows[:, 1:] != rows[:, :-1]
+    col1 = np.nonzero(ends)[1]
+
+    keep = run_key != 0
+    row_idx, col0, col1, run_key = row_idx[keep], col0[keep], col1[keep], run_key[keep]
+    slc, row = np.divmod(row_idx, r_count)
+
+    if len(run_key) == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty, empty, empty, empty
+
+    # --- Merge identical runs on consecutive rows ---
+    order = np.lexsort((row, run_key, col1, col0, slc))
+    slc, row, col0, col1, run_key = slc[order], row[order], col0[order], col1[order], run_key[order]
+
+    continues = np.zeros(len(run_key), dtype=bool)
+    continues[1:] = (
+        (slc[1:] == slc[:-1]) & (col0[1:] == col0[:-1]) & (col1[1:] == col1[:-1]) &
+        (run_key[1:] == run_key[:-1]) & (row[1:] == row[:-1] + 1)
+    )
+    first = np.flatnonzero(~continues)
+    last = np.r_[first[1:] - 1, len(run_key) - 1]
+
+    return slc[first], row[first], row[last], col0[first], col1[first], run_key[first]
+
+
+def greedy_mesh(visible, colors, origin=(0, 0, 0), padded=False):
+    '''
+    Build a triangle mesh holding only the exposed faces of the grid, with coplanar
+    faces of the same color merged into larger quads.
+
+    visible -> (n, n, n) bool
+    colors  -> (n, n, n, 4) uint8
+    origin  -> world cell of visible[0, 0, 0] (of the first interior cell when padded)
+    padded  -> the arrays carry a 1-cell border of neighbor data that only hides faces
+
+    Returns (vertices (V, 3) float32, vertex colors (V, 4) uint8), 6 vertices per quad.
+    Voxel (x, y, z) is the unit cube centered at (x, y, z), like the instanced path.
+    '''
+    all_vertices, all_colors = [], []
+    interior = (slice(1, -1),) * 3 if padded else (slice(None),) * 3
+
+    for axis in range(3):
+        u, v = (axis + 1) % 3, (axis + 2) % 3
+        for direction in (-1, 1):
+            keys = _face_keys(visible, colors, axis, direction)[interior]
+            keys = np.transpose(keys, (axis, u, v))
+            slc, u0, u1, v0, v1, key = _greedy_quads(keys)
+            if len(key) == 0:
+                continue
+
+            # Quad corners (cells span +/- 0.5 around their center)
+            plane = slc + 0.5 * direction
+            lo_u, hi_u = u0 - 0.5, u1 + 0.5
+            lo_v, hi_v = v0 - 0.5, v1 + 0.5
+            corners = np.empty((len(key), 4, 3), dtype=np.float32)
+            corners[:, :, axis] = plane[:, None] + origin[axis]
+            corners[:, :, u] = np.stack([lo_u, hi_u, hi_u, lo_u], axis=1) + origin[u]
+            corners[:, :, v] = np.stack([lo_v, lo_v, hi_v, hi_v], axis=1) + origin[v]
+
+            all_vertices.append(corners[:, [0, 1, 2, 0, 2, 3]].reshape(-1, 3))
+
+            rgba = (key - 1).astype(np.uint32).view(np.uint8).reshape(-1, 4)
+            all_colors.append(np.repeat(rgba, 6, axis=0))
+
+    if not all_vertices:
+        return np.zeros((0, 3), dtype=np.float32), np.zeros((0, 4), dtype=np.uint8)
+    return np.concatenate(all_vertices), np.concatenate(all_colors)
+
+
+def occupied_regions(grid, region_size):
+    ''' (K, 3) keys of the region_size³ regions holding at least one voxel, sorted '''
+    rs = int(region_size)
+    if grid.sparse and grid.chunk_size == rs:
+        return np.array(sorted(grid.chunks), dtype=np.int64).reshape(-1, 3)
+    if not grid.sparse:
+        n = -(-grid.size // rs)
+        padded = np.zeros((n * rs,) * 3, dtype=bool)
+        padded[:grid.size, :grid.size, :grid.size] = grid.visible
+        return np.argwhere(padded.reshape(n, rs, n, rs, n, rs).any(axis=(1, 3, 5)))
+    coords, _ = grid.visible_cells()
+    return np.unique(coords // rs, axis=0)
+
+
+def mesh_storage(grid, region_size, translucent=False, regions=None):
+    '''
+    Greedy mesh of a whole voxel storage, region by region (chunk by chunk for chunked
+    grids), each with a 1-cell border read from its neighbors so faces between regions
+    are still culled. Quads are not merged across region borders.
+
+    Opaque (alpha 255) and translucent voxels are meshed apart (translucent selects
+    which): a face is only hidden by a neighbor of its own kind, so opaque faces behind
+    glass are kept and so are translucent faces against opaque voxels.
+
+    regions (K, 3) limits the mesh to those regions (default: every occupied one).
+    Returns (vertices, colors, regions (K, 3), firsts (K,), counts (K,)): the vertices
+    of region k are vertices[firsts[k]:firsts[k] + counts[k]].
+    '''
+    if regions is None:
+        regions = occupied_regions(grid, region_size)
+    parts = [(np.zeros((0, 3), dtype=np.float32), np.zeros((0, 4), dtype=np.uint8))]
+    for key in regions:
+        origin = key * region_size
+        visible, colors = grid.region(origin - 1, (region_size + 2,) * 3)
+        visible &= (colors[..., 3] == 255) != translucent
+        parts.append(greedy_mesh(visible, colors, origin, padded=True))
+
+    counts = np.array([len(p[0]) for p in parts[1:]], dtype=np.int64)
+    firsts = np.r_[0, np.cumsum(counts)[:-1]].astype(np.int64)
+    vertices = np.concatenate([p[0] for p in parts])
+    colors = np.concatenate([p[1] for p in parts])
+    return vertices, colors, regions, firsts, counts
+
+
+def mesh_mip_level(mips, regions, level):
+    '''
+    Greedy mesh of one level of the mip pyramid (see lod.VoxelMips) of every region
+    in regions (K, 3), in world units. Regions are meshed without a border, so faces
+    between two regions are kept. Returns (vertices, colors, firsts (K,), counts (K,)).
+    '''
+    factor = 1 << level
+    parts = [(np.zeros((0, 3), dtype=np.float32), np.zeros((0, 4), dtype=np.uint8))]
+    for key in regions:
+        levels = mips.levels.get(tuple(key.tolist()))
+        if levels is None:
+            parts.append(parts[0])
+            continue
+        visible, colors = levels[level - 1]
+        vertices, vertex_colors = greedy_mesh(visible, colors, key * (mips.region_size >> level))
+        # A level cell j spans the voxels j * factor .. j * factor + factor - 1
+        parts.append(((vertices + 0.5) * factor - 0.5, vertex_colors))
+
+    counts = np.array([len(p[0]) for p in parts[1:]], dtype=np.int64)
+    firsts = np.r_[0, np.cumsum(counts)[:-1]].astype(np.int64)
+    return np.concatenate([p[0] for p in parts]), np.concatenate([p[1] for p in parts]), firsts, counts
+
+
+class VoxelMesh:
+    '''
+    GPU side of a greedy mesh: positions (location 0) and normalized RGBA
+    vertex colors (location 1), rebuilt as a whole with upload().
+    '''
+
+    def __init__(self):
+        self.vertex_count = 0
+        self.vao = glGenVertexArrays(1)
+        state.bind_vertex_array(self.vao)
+
+        self.pvbo = glGenBuffers(1)
+        glBindBuffer(GL_ARRAY_BUFFER, self.pvbo)
+        glEnableVertexAttribArray(0)
+        glVertexAttribPointer(0, 3, GL_FLOAT, GL_FALSE, 0, None)
+
+        self.cvbo = glGenBuffers(1)
+        glBindBuffer(GL_ARRAY_BUFFER, self.cvbo)
+        glEnableVertexAttribArray(VERTEX_COLOR_LOCATION)
+        glVertexAttribPointer(VERTEX_COLOR_LOCATION, 4, GL_UNSIGNED_BYTE, GL_TRUE, 0, None)
+
+        state.bind_vertex_array(0)
+
+    def upload(self, vertices, colors):
+        glBindBuffer(GL_ARRAY_BUFFER, self.pvbo)
+        glBufferData(GL_ARRAY_BUFFER, vertices.nbytes, vertices if len(vertices) else None, GL_DYNAMIC_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, self.cvbo)
+        glBufferData(GL_ARRAY_BUFFER, colors.nbytes, colors if len(colors) else None, GL_DYNAMIC_DRAW)
+        self.vertex_count = len(vertices)
+
+    @property
+    def triangle_count(self):
+        return self.vertex_count // 3
+
+    def draw(self, firsts=None, counts=None):
+        ''' Draw the whole mesh, or only the vertex ranges firsts[i]:firsts[i] + counts[i] '''
+        if self.vertex_count == 0:
+            return
+        state.bind_vertex_array(self.vao)
+        if firsts is None:
+            glDrawArrays(GL_TRIANGLES, 0, self.vertex_count)
+        elif len(firsts):
+            glMultiDrawArrays(GL_TRIANGLES, np.asarray(firsts, dtype=np.int32),
+                              np.asarray(counts, dtype=np.int32), len(firsts))
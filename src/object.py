@@ -1,30 +1,26 @@
 from OpenGL.GL import (
-    glGenVertexArrays, glBindVertexArray,
+    glGenVertexArrays,
     glGenBuffers, glBindBuffer, glBufferData,
     glEnableVertexAttribArray, glVertexAttribPointer,
-    glGetUniformLocation, glUniform4f,
     GL_ARRAY_BUFFER, GL_STATIC_DRAW, GL_FLOAT, GL_FALSE
 )
+from gl_state import state
 import numpy as np
 from typing import Optional
 
 class Object:
     _mesh_cache = {}
-    _uniform_cache = {}
+    _transform_cache = [] # (inputs, (N, 4, 4) result) of recent transformations() calls, newest last
+    TRANSFORM_CACHE_SIZE = 8
+    
+    # Render modes understood by the main vertex shader ("renderMode" uniform)
+    MODE_UNIFORM = 0    # single mesh, "transform" matrix and "objColor"
+    MODE_INSTANCED = 1  # per-instance offset, scale and color attributes
+    MODE_VERTEX_COLOR = 2 # world-space vertices with per-vertex color (greedy mesh)
     
     def __init__(self):
         self.vertex_count = {}
-    
-    # ------------------- Uniform Location Cache ------------------- #
-    
-    def _get_uniform_location(self, shader_program, name: str):
-        """Cacheia glGetUniformLocation por (program, name)."""
-        key = (int(shader_program), name)
-        loc = Object._uniform_cache.get(key)
-        if loc is None:
-            loc = glGetUniformLocation(shader_program, name)
-            Object._uniform_cache[key] = loc
-        return loc
+        self.vertex_buffers = {} # vao -> position VBO (instanced drawing builds its own VAOs on it)
     
     # ------------------- Color Helpers ------------------- #
     
@@ -32,8 +28,12 @@ class Object:
         '''
         Define the object color in shader using float values (0.0 - 1.0)
         '''
-        glUniform4f(self._get_uniform_location(shader_program, "objColor"), 
-                    float(r), float(g), float(b), float(a))
+        shader_program.set("objColor", (r, g, b, a))
+        return shader_program
+    
+    def setRenderMode(self, shader_program, mode: int):
+        ''' Select how the main shader reads transform and color (see MODE_* constants) '''
+        shader_program.set("renderMode", mode)
         return shader_program
     
     def rgbToFloat(self, r, g, b):
@@ -56,7 +56,7 @@ class Object:
         '''
         assert isinstance(vertices, np.ndarray) and vertices.dtype == np.float32
         vao = glGenVertexArrays(1)
-        glBindVertexArray(vao)
+        state.bind_vertex_array(vao)
 
         pvbo = glGenBuffers(1)
         glBindBuffer(GL_ARRAY_BUFFER, pvbo)
@@ -72,8 +72,9 @@ class Object:
             glEnableVertexAttribArray(1)
             glVertexAttribPointer(1, 3, GL_FLOAT, GL_FALSE, 0, None)
         
-        glBindVertexArray(0)
+        state.bind_vertex_array(0)
         self.vertex_count[vao] = int(len(vertices) // 3)
+        self.vertex_buffers[vao] = pvbo
         return vao
         
     # ------------------- Builders 3D ------------------- #     
@@ -196,6 +197,72 @@ class Object:
         transform = translation @ rotation @ scale
 
         return transform.astype(np.float32)
+
+    def transformations(self, translations, rotations=None, scales=None):
+        '''
+        Batched transformation(): one (N, 4, 4) float32 matrix per row, same order
+        (translation @ rotation @ scale, rotation = Rz @ Ry @ Rx), in one vectorized pass.
+
+        translations -> (N, 3)
+        rotations    -> (N, 3) angles in degrees around x, y, z, or None for no rotation
+        scales       -> None (1), a number or (N,) for uniform scaling, or (N, 3)
+
+        Without rotation the matrices are written directly (translate + scale);
+        otherwise the rotation is expanded in closed form, without matrix products.
+        The last few results are cached with a copy of their inputs; a call reuses one
+        only when its inputs are equal element by element (results are read-only).
+        '''
+        translations = np.asarray(translations, dtype=np.float32).reshape(-1, 3)
+        n = len(translations)
+        if rotations is not None:
+            rotations = np.asarray(rotations, dtype=np.float32).reshape(n, 3)
+            if not rotations.any():
+                rotations = None
+        if scales is None:
+            scales = np.float32(1.0)
+        scales = np.asarray(scales, dtype=np.float32)
+
+        inputs = (translations, rotations, scales)
+        for i, (cached_inputs, cached) in enumerate(Object._transform_cache):
+            if all((a is None and b is None)
+                   or (a is not None and b is not None and a.shape == b.shape and np.array_equal(a, b))
+                   for a, b in zip(inputs, cached_inputs)):
+                Object._transform_cache.append(Object._transform_cache.pop(i))
+                return cached
+
+        result = np.zeros((n, 4, 4), dtype=np.float32)
+        result[:, 3, 3] = 1.0
+        result[:, :3, 3] = translations
+        if scales.ndim == 2:
+            per_axis = scales.reshape(n, 3)
+        else:
+            per_axis = np.broadcast_to(scales.reshape(-1, 1), (n, 3))
+
+        if rotations is None:
+            # Fast path: translate + (uniform or per-axis) scale
+            result[:, 0, 0], result[:, 1, 1], result[:, 2, 2] = per_axis.T
+        else:
+            angles = np.radians(rotations)
+            cx, cy, cz = np.cos(angles).T
+            sx, sy, sz = np.sin(angles).T
+            rotation = np.empty((n, 3, 3), dtype=np.float32)
+            rotation[:, 0, 0] = cy * cz
+            rotation[:, 0, 1] = cz * sy * sx - sz * cx
+            rotation[:, 0, 2] = cz * sy * cx + sz * sx
+            rotation[:, 1, 0] = cy * sz
+            rotation[:, 1, 1] = sz * sy * sx + cz * cx
+            rotation[:, 1, 2] = sz * sy * cx - cz * sx
+            rotation[:, 2, 0] = -sy
+            rotation[:, 2, 1] = cy * sx
+            rotation[:, 2, 2] = cy * cx
+            result[:, :3, :3] = rotation * per_axis[:, None, :] # scale the columns
+
+        result.flags.writeable = False
+        # Copies: the caller may modify its arrays after the call
+        Object._transform_cache.append((tuple(None if a is None else a.copy() for a in inputs), result))
+        if len(Object._transform_cache) > Object.TRANSFORM_CACHE_SIZE:
+            Object._transform_cache.pop(0)
+        return result
     
     # ------------------- Abstract Methods ------------------- #
     
@@ -215,14 +282,15 @@ class Object:
         '''
         ## Must be implemented in child classes -> @override
         
+        shader_program -> gl_state.ShaderProgram (uniforms are set by name)
+        
         ----- bind vao -----\n
-        glBindVertexArray(vao)
+        state.bind_vertex_array(vao)
         
         ----- set transformation -----\n
         transform = self.transformation(tx, ty, tz, rx, ry, rz, sx, sy, sz)
         
-        transformLoc = glGetUniformLocation(shader_programm, "transform")
-        glUniformMatrix4fv(transformLoc, 1, GL_TRUE, transform)
+        shader_program.set("transform", transform)
         
         ----- draw call -----\n
         glDrawArrays(GL_TRIANGLES, 0, self.vertex_count)
@@ -0,0 +1,148 @@
+'''
+    Interior-voxel occlusion: for every solid voxel, the number of its 6 face
+    neighbors that are solid too. A voxel with 6 solid neighbors is fully enclosed
+    and can be skipped by the renderer and the picker.
+
+    Only opaque voxels (alpha 255) count as solid: a translucent neighbor does not
+    hide anything.
+'''
+
+import numpy as np
+
+# The 6 face neighbors of a cell
+OFFSETS = np.array([
+    (1, 0, 0), (-1, 0, 0), (0, 1, 0), (0, -1, 0), (0, 0, 1), (0, 0, -1),
+], dtype=np.int64)
+
+
+class NeighborCounts:
+    '''
+    Kept per block of block_size³ cells (only blocks that held a solid voxel exist):
+    a mirror of the occupancy and, for the solid cells, their solid-neighbor count.
+
+    Registered as a grid listener. An edit compares the new occupancy of the touched
+    cells with the mirror; every cell that flipped adjusts the counts of its 6
+    neighbors (O(1) per single-cell edit, one vectorized pass for bulk edits).
+    A cell that becomes solid gets its count from the mirror, so counts of empty cells
+    are never needed. Loads and edits of more than rebuild_threshold cells rebuild
+    block by block with shifted sums.
+    '''
+
+    def __init__(self, grid, block_size=16, rebuild_threshold=1 << 16):
+        self.grid = grid
+        self.block_size = int(block_size)
+        self.rebuild_threshold = rebuild_threshold
+        self.blocks = {} # block key -> (solid (B, B, B) bool, counts (B, B, B) int8)
+        self.hidden_count = 0
+        self.rebuild()
+        grid.add_listener(self._update)
+
+    def detach(self):
+        self.grid.remove_listener(self._update)
+
+    # ------------------- Block Access ------------------- #
+
+    def _group(self, cells):
+        ''' Yields (key, rows, x, y, z) of the cells (N, 3) falling in each block '''
+        bs = self.block_size
+        keys = cells // bs
+        unique, inverse = np.unique(keys, axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        order = np.argsort(inverse, kind='stable')
+        bounds = np.searchsorted(inverse[order], np.arange(len(unique) + 1))
+        local = cells - keys * bs
+        for i, key in enumerate(map(tuple, unique.tolist())):
+            rows = order[bounds[i]:bounds[i + 1]]
+            x, y, z = local[rows].T
+            yield key, rows, x, y, z
+
+    def _block(self, key):
+        block = self.blocks.get(key)
+        if block is None:
+            shape = (self.block_size,) * 3
+            block = self.blocks[key] = (np.zeros(shape, dtype=bool), np.zeros(shape, dtype=np.int8))
+        return block
+
+    def solid(self, cells):
+        result = np.zeros(len(cells), dtype=bool)
+        for key, rows, x, y, z in self._group(cells):
+            block = self.blocks.get(key)
+            if block is not None:
+                result[rows] = block[0][x, y, z]
+        return result
+
+    def hidden(self, cells):
+        ''' (N,) bool: the cells (N, 3) are solid and enclosed by 6 solid neighbors '''
+        cells = np.asarray(cells, dtype=np.int64).reshape(-1, 3)
+        result = np.zeros(len(cells), dtype=bool)
+        for key, rows, x, y, z in self._group(cells):
+            block = self.blocks.get(key)
+            if block is not None:
+                result[rows] = block[0][x, y, z] & (block[1][x, y, z] == 6)
+        return result
+
+    def is_hidden(self, cell) -> bool:
+        bs = self.block_size
+        block = self.blocks.get((cell[0] // bs, cell[1] // bs, cell[2] // bs))
+        if block is None:
+            return False
+        local = (cell[0] % bs, cell[1] % bs, cell[2] % bs)
+        return bool(block[0][local]) and block[1][local] == 6
+
+    # ------------------- Maintenance ------------------- #
+
+    def rebuild(self):
+        ''' Recompute every block from the grid (used on load) '''
+        bs = self.block_size
+        self.blocks = {}
+        self.hidden_count = 0
+        coords, colors = self.grid.visible_cells()
+        for key in np.unique(coords[colors[:, 3] == 255] // bs, axis=0):
+            visible, colors = self.grid.region(key * bs - 1, (bs + 2,) * 3)
+            visible &= colors[..., 3] == 255
+            inner = visible[1:-1, 1:-1, 1:-1]
+            counts = (visible[2:, 1:-1, 1:-1].astype(np.int8) + visible[:-2, 1:-1, 1:-1]
+                      + visible[1:-1, 2:, 1:-1] + visible[1:-1, :-2, 1:-1]
+                      + visible[1:-1, 1:-1, 2:] + visible[1:-1, 1:-1, :-2])
+            counts[~inner] = 0
+            self.blocks[tuple(key.tolist())] = (inner.copy(), counts)
+            self.hidden_count += int(np.count_nonzero(counts == 6))
+
+    def _update(self, cells):
+        if cells is None or len(cells) > self.rebuild_threshold:
+            self.rebuild()
+            return
+
+        cells = np.unique(np.asarray(cells, dtype=np.int64).reshape(-1, 3), axis=0)
+        now = self.grid.occupied(cells) & (self.grid.colors_at(cells)[:, 3] == 255)
+        flipped = now != self.solid(cells)
+        if not flipped.any():
+            return
+        cells, now = cells[flipped], now[flipped]
+
+        # Cells whose hidden state may change: the flipped ones and their neighbors
+        neighbors = (cells[:, None, :] + OFFSETS[None]).reshape(-1, 3)
+        inside = ((neighbors >= 0) & (neighbors < self.grid.size)).all(axis=1)
+        delta = np.repeat(np.where(now, 1, -1), len(OFFSETS))[inside]
+        neighbors = neighbors[inside]
+        affected = np.unique(np.concatenate([cells, neighbors]), axis=0)
+        before = int(np.count_nonzero(self.hidden(affected)))
+
+        for key, rows, x, y, z in self._group(cells):
+            self._block(key)[0][x, y, z] = now[rows]
+
+        # Solid neighbors that were already solid shift by one; new solids are counted anew
+        added = cells[now]
+        keep = self.solid(neighbors) & ~np.isin(self.grid.flat_index(neighbors), self.grid.flat_index(added))
+        for key, rows, x, y, z in self._group(neighbors[keep]):
+            np.add.at(self._block(key)[1], (x, y, z), delta[keep][rows])
+        if len(added):
+            around = (added[:, None, :] + OFFSETS[None]).reshape(-1, 3)
+            solid = self.solid(around).reshape(len(added), len(OFFSETS)).sum(axis=1)
+            for key, rows, x, y, z in self._group(added):
+                self._block(key)[1][x, y, z] = solid[rows]
+
+        self.hidden_count += int(np.count_nonzero(self.hidden(affected))) - before
+
+    def stats(self):
+        return {'hidden_voxels': self.hidden_count}
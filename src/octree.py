@@ -0,0 +1,246 @@
+import sys
+import numpy as np
+from raycast import box_entry
+
+# Leaf values: EMPTY, or packed RGBA + 1 for a region filled with a single color
+EMPTY = 0
+_MIXED = -1 # only used while building
+
+# Child i covers the octant (dx, dy, dz) with i = dx * 4 + dy * 2 + dz
+CHILD_OFFSETS = [(dx, dy, dz) for dx in (0, 1) for dy in (0, 1) for dz in (0, 1)]
+
+
+def cell_key(visible, colors):
+    ''' Leaf value of cells: 0 when empty, packed RGBA + 1 when visible '''
+    packed = np.ascontiguousarray(colors).view(np.uint32)[..., 0].astype(np.int64) + 1
+    return np.where(visible, packed, EMPTY)
+
+
+class OctreeNode:
+    __slots__ = ('value', 'children')
+
+    def __init__(self, value=EMPTY, children=None):
+        self.value = value       # leaf value (ignored when there are children)
+        self.children = children # None for a leaf, else a list of 8 nodes
+
+
+# Approximate memory of one node, used for the stats
+LEAF_BYTES = sys.getsizeof(OctreeNode())
+INTERNAL_BYTES = LEAF_BYTES + sys.getsizeof([None] * 8)
+
+
+class SparseVoxelOctree:
+    '''
+    Sparse voxel octree over a voxel storage. Regions that are uniform (all empty,
+    or all solid with one color) collapse into a single leaf, so mostly-air and
+    mostly-solid scenes take few nodes. The tree covers a power-of-two cube
+    [0, span)³ that contains the size³ grid; cells past size are empty.
+
+    Kept in sync with the storage through its change listener (see VoxelStorage.build_octree).
+    '''
+
+    def __init__(self, size: int):
+        self.size = int(size)
+        self.span = 1
+        while self.span < self.size:
+            self.span *= 2
+        self.root = OctreeNode()
+        self.node_count = 1
+        self.internal_count = 0
+
+    # ------------------- Building ------------------- #
+
+    @classmethod
+    def from_storage(cls, storage):
+        tree = cls(storage.size)
+        if storage.sparse:
+            tree.span = max(tree.span, storage.chunk_size)
+
+        if not storage.sparse:
+            tree.root = tree._build_dense(cell_key(storage.visible, storage.colors), tree.span)
+        else:
+            # Chunk subtrees hung under a tree that is empty everywhere else
+            for key in sorted(storage.chunks):
+                chunk = storage.chunks[key]
+                subtree = tree._build_dense(cell_key(chunk.visible, chunk.colors), storage.chunk_size)
+                tree._graft(storage.chunk_origin(key), storage.chunk_size, subtree)
+        tree._recount()
+        return tree
+
+    def _build_dense(self, keys, span):
+        '''
+        Build the subtree of a (n, n, n) key array padded to span³, reducing 2x2x2
+        blocks level by level (vectorized) and creating nodes only where mixed.
+        '''
+        padded = np.full((span, span, span), EMPTY, dtype=np.int64)
+        n = keys.shape[0]
+        padded[:n, :n, :n] = keys
+
+        levels = [padded]
+        while levels[-1].shape[0] > 1:
+            k = levels[-1]
+            s = k.shape[0] // 2
+            blocks = k.reshape(s, 2, s, 2, s, 2).transpose(0, 2, 4, 1, 3, 5).reshape(s, s, s, 8)
+            first = blocks[..., 0]
+            uniform = (blocks == first[..., None]).all(axis=-1) & (first != _MIXED)
+            levels.append(np.where(uniform, first, _MIXED))
+
+        def make(level, x, y, z):
+            value = int(levels[level][x, y, z])
+            if value != _MIXED:
+                return OctreeNode(value)
+            return OctreeNode(children=[
+                make(level - 1, 2 * x + dx, 2 * y + dy, 2 * z + dz) for dx, dy, dz in CHILD_OFFSETS
+            ])
+
+        return make(len(levels) - 1, 0, 0, 0)
+
+    def _graft(self, origin, span, subtree):
+        ''' Replace the node covering [origin, origin + span)³ by subtree '''
+        if span == self.span:
+            self.root = subtree
+            return
+
+        node, lo, size = self.root, np.zeros(3, dtype=np.int64), self.span
+        while True:
+            if node.children is None:
+                node.children = [OctreeNode(node.value) for _ in range(8)]
+            size //= 2
+            octant = (np.asarray(origin) - lo) // size
+            lo = lo + octant * size
+            index = int(octant[0] * 4 + octant[1] * 2 + octant[2])
+            if size == span:
+                node.children[index] = subtree
+                return
+            node = node.children[index]
+
+    def _recount(self):
+        self.node_count, self.internal_count = 0, 0
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            self.node_count += 1
+            if node.children is not None:
+                self.internal_count += 1
+                stack.extend(node.children)
+
+    # ------------------- Queries ------------------- #
+
+    def _leaf(self, cell):
+        node, lo, size = self.root, [0, 0, 0], self.span
+        while node.children is not None:
+            size //= 2
+            index = 0
+            for i in range(3):
+                if cell[i] >= lo[i] + size:
+                    lo[i] += size
+                    index |= 4 >> i
+            node = node.children[index]
+        return node
+
+    def value(self, cell) -> int:
+        return self._leaf(cell).value
+
+    def occupied(self, cell) -> bool:
+        return self._leaf(cell).value != EMPTY
+
+    # ------------------- Incremental Updates ------------------- #
+
+    def update(self, cell, value):
+        '''
+        Set the leaf value of one cell: uniform leaves on the path are split down to
+        the cell, and parents whose 8 children became equal leaves collapse again.
+        '''
+        path = []
+        node, lo, size = self.root, [0, 0, 0], self.span
+        while size > 1:
+            if node.children is None:
+                if node.value == value:
+                    return # the whole region already holds that value
+                node.children = [OctreeNode(node.value) for _ in range(8)]
+                self.node_count += 8
+                self.internal_count += 1
+            path.append(node)
+            size //= 2
+            index = 0
+            for i in range(3):
+                if cell[i] >= lo[i] + size:
+                    lo[i] += size
+                    index |= 4 >> i
+            node = node.children[index]
+        node.value = value
+
+        for parent in reversed(path):
+            first = parent.children[0]
+            if first.children is not None or any(
+                    c.children is not None or c.value != first.value for c in parent.children):
+                break
+            parent.value, parent.children = first.value, None
+            self.node_count -= 8
+            self.internal_count -= 1
+
+    # ------------------- Ray Traversal ------------------- #
+
+    def raycast(self, origin, direction, max_distance=20.0):
+        '''
+        First solid cell along the ray: (cell, distance, entry normal) or None.
+        Empty and uniform regions are skipped whole; children are visited front to back.
+        direction must be normalized.
+        '''
+        o = [float(c) for c in origin]
+        d = [float(c) for c in direction]
+        return self._ray_node(self.root, (0, 0, 0), self.span, o, d, max_distance)
+
+    def _ray_node(self, node, lo, size, o, d, max_distance):
+        if node.children is None and node.value == EMPTY:
+            return None
+
+        entry = box_entry(o, d, [c - 0.5 for c in lo], [c + size - 0.5 for c in lo], max_distance)
+        if entry is None:
+            return None
+        t, _, axis = entry
+
+        if node.children is None:
+            # Solid leaf: the hit cell is the one where the ray enters the leaf box
+            cell = tuple(
+                min(max(int(np.floor(o[i] + d[i] * t + 0.5)), lo[i]), lo[i] + size - 1) for i in range(3)
+            )
+            normal = [0, 0, 0]
+            if axis >= 0:
+                normal[axis] = -1 if d[axis] > 0 else 1
+            return cell, t, tuple(normal)
+
+        half = size // 2
+        candidates = []
+        for index, (dx, dy, dz) in enumerate(CHILD_OFFSETS):
+            child = node.children[index]
+            if child.children is None and child.value == EMPTY:
+                continue
+            child_lo = (lo[0] + dx * half, lo[1] + dy * half, lo[2] + dz * half)
+            child_entry = box_entry(
+                o, d, [c - 0.5 for c in child_lo], [c + half - 0.5 for c in child_lo], max_distance)
+            if child_entry is not None:
+                candidates.append((child_entry[0], index, child_lo))
+
+        for _, index, child_lo in sorted(candidates):
+            hit = self._ray_node(node.children[index], child_lo, half, o, d, max_distance)
+            if hit is not None:
+                return hit
+        return None
+
+    # ------------------- Stats ------------------- #
+
+    def stats(self, storage=None):
+        '''
+        Node count and approximate memory, compared with a dense grid of the same size
+        (5 bytes per cell) and, if given, with the storage actually in use.
+        '''
+        leaves = self.node_count - self.internal_count
+        stats = {
+            'octree_nodes': self.node_count,
+            'octree_bytes': self.internal_count * INTERNAL_BYTES + leaves * LEAF_BYTES,
+            'dense_bytes': self.size ** 3 * 5,
+        }
+        if storage is not None:
+            stats['storage_bytes'] = storage.nbytes
+        return stats
@@ -0,0 +1,206 @@
+from collections import OrderedDict
+import weakref
+import numpy as np
+
+from chunked_grid import ChunkedGrid
+from voxel_grid import VoxelGrid
+from scene_formats import ChunkFile
+
+
+def open_paged(path, max_resident=1024):
+    ''' Returns (grid, space) for a .vxc file, reading only its chunk index '''
+    source = ChunkFile(path)
+    return PagedGrid(source, max_resident), source.space
+
+
+class PagedGrid(ChunkedGrid):
+    '''
+    Chunked storage backed by a .vxc file: only the chunk index is read up front,
+    chunks are paged in on demand, nearest to the camera first (update_residency),
+    and at most max_resident chunks are kept in memory. Past that, the least recently
+    wanted chunks far from the camera are evicted.
+
+    Edited chunks are pinned (never evicted) until the scene is saved as .vxc again
+    (mark_saved). A chunk that is not resident reads as empty for picking and
+    rendering; the copies made for saving (copy) read it from the file instead.
+    '''
+
+    paged = True
+
+    def __init__(self, source: ChunkFile, max_resident=1024):
+        super().__init__(source.size, source.chunk_size)
+        self._use_source(source)
+        self.max_resident = max_resident
+        self.lru = OrderedDict() # resident chunk keys, least recently wanted first
+        self.pinned = {}         # chunk key -> generation of its last edit (not saved yet)
+
+        self.paging = None       # chunk key while listeners hear about it being paged in or out
+        self.residency = 0       # incremented when a chunk is paged in or out
+        self._center = None      # camera chunk of the last residency update
+        self._wanted = []        # stored chunk keys nearest to the camera, nearest first
+        self.reads_through = False # visible_cells/region also decode chunks only on disk
+        self.stats = {'resident_chunks': 0, 'pinned_chunks': 0, 'paged_in': 0, 'evicted': 0}
+
+    def _use_source(self, source: ChunkFile):
+        ''' Read from source, holding a reference to it until this grid is collected '''
+        self.source = source.acquire()
+        self._release_source = weakref.finalize(self, source.release)
+
+    # ------------------- Stored Chunks ------------------- #
+
+    def _on_disk(self, key):
+        ''' The file copy of key is still the current one '''
+        return key in self.source.index and key not in self.pinned
+
+    def _stored(self, key):
+        chunk = self.chunks.get(key)
+        if chunk is None and self.reads_through and self._on_disk(key):
+            chunk = self._decode(key) # read without becoming resident
+        return chunk
+
+    def _stored_keys(self):
+        if not self.reads_through:
+            return sorted(self.chunks)
+        on_disk = (key for key in self.source.index if key not in self.pinned)
+        return sorted(set(self.chunks).union(on_disk))
+
+    def raw_blob(self, key):
+        ''' Compressed chunk as stored in the source file, if still unchanged '''
+        return self.source.read_blob(key) if self._on_disk(key) else None
+
+    def chunk_count(self, key) -> int:
+        if key in self.chunks:
+            return self.counts[key]
+        return self.source.index[key][2] if self._on_disk(key) else 0
+
+    @property
+    def count(self) -> int:
+        ''' Voxels of the whole scene, resident or not '''
+        on_disk = (key for key in self.source.index if key not in self.pinned)
+        return int(sum(self.chunk_count(key) for key in set(self.chunks).union(on_disk)))
+
+    def _decode(self, key):
+        chunk = VoxelGrid(self.chunk_size)
+        chunk.visible[...], chunk.colors[...] = self.source.read_chunk(key)
+        return chunk
+
+    # ------------------- Paging ------------------- #
+
+    def _page_in(self, key):
+        chunk = self._decode(key)
+        self.chunks[key] = chunk
+        self.counts[key] = chunk.count
+        self.lru[key] = None
+        self.stats['paged_in'] += 1
+        self._notify(key, chunk.visible_cells()[0] + self.chunk_origin(key))
+        return chunk
+
+    def _evict(self, key):
+        chunk = self.chunks.pop(key)
+        del self.counts[key]
+        self.lru.pop(key, None)
+        self.stats['evicted'] += 1
+        self._notify(key, chunk.visible_cells()[0] + self.chunk_origin(key))
+
+    def _notify(self, key, cells):
+        '''
+        Tell the listeners that the cells of chunk key appeared or vanished. Paging is
+        not an edit: nothing is pinned and the generation stays, and listeners that
+        can rebuild a whole region at once tell it from the edits by `paging`.
+        '''
+        self.paging = key
+        self.residency += 1
+        try:
+            for callback in self.listeners:
+                callback(cells)
+        finally:
+            self.paging = None
+
+    def update_residency(self, position, budget=4):
+        '''
+        Called once per frame with the camera position (in cells): pages in up to
+        budget missing chunks, nearest first, then evicts unpinned chunks that are no
+        longer among the max_resident nearest ones, least recently wanted first.
+        '''
+        center = tuple((np.asarray(position, dtype=float) // self.chunk_size).astype(int).tolist())
+        if center != self._center:
+            # Distances only change when the camera enters another chunk
+            self._center = center
+            keys = self.source.keys
+            if len(keys):
+                distance = ((keys - center) ** 2).sum(axis=1)
+                nearest = np.argsort(distance, kind='stable')[:self.max_resident]
+                self._wanted = [key for key in map(tuple, keys[nearest].tolist()) if self._on_disk(key)]
+            # Wanted chunks become the most recently used, the nearest last
+            for key in reversed(self._wanted):
+                if key in self.lru:
+                    self.lru.move_to_end(key)
+
+        for key in self._wanted:
+            if budget == 0:
+                break
+            if key not in self.chunks and self._on_disk(key):
+                self._page_in(key)
+                budget -= 1
+
+        wanted = set(self._wanted)
+        for key in list(self.lru):
+            if len(self.chunks) <= self.max_resident:
+                break
+            if key not in wanted and key not in self.pinned and key in self.chunks:
+                self._evict(key)
+
+        self.stats['resident_chunks'] = len(self.chunks)
+        self.stats['pinned_chunks'] = len(self.pinned)
+
+    # ------------------- Edits ------------------- #
+
+    def _chunk(self, key, create=False):
+        # An edit in a chunk that is only on disk pages it in first
+        if key not in self.chunks and self._on_disk(key):
+            self._page_in(key)
+        chunk = super()._chunk(key, create)
+        if chunk is not None and key not in self.lru:
+            self.lru[key] = None
+        return chunk
+
+    def _free_if_empty(self, key):
+        super()._free_if_empty(key)
+        if key not in self.chunks:
+            self.lru.pop(key, None)
+
+    def _changed(self, cells):
+        if cells is None:
+            keys = set(self.chunks)
+        else:
+            keys = map(tuple, np.unique(np.asarray(cells) // self.chunk_size, axis=0).tolist())
+        for key in keys:
+            self.pinned[key] = self.generation + 1
+        super()._changed(cells)
+
+    def mark_saved(self, pinned, path):
+        '''
+        The scene was saved as .vxc to path from a copy whose pins were `pinned`:
+        chunks not edited since then are unpinned and read from the new file.
+        '''
+        for key, generation in pinned.items():
+            if self.pinned.get(key) == generation:
+                del self.pinned[key]
+        # Copies still reading the old file (a compaction in progress) keep it open
+        self._release_source()
+        self._use_source(ChunkFile(path))
+        self._center = None # the new file may list other chunks
+        self.stats['pinned_chunks'] = len(self.pinned)
+
+    def copy(self):
+        '''
+        Snapshot for saving: resident chunks are copied, the rest is read from the
+        same file, so the copy sees the whole scene.
+        '''
+        grid = PagedGrid(self.source, self.max_resident)
+        grid.reads_through = True
+        grid.chunks = {key: chunk.copy() for key, chunk in self.chunks.items()}
+        grid.counts = dict(self.counts)
+        grid.lru = OrderedDict(self.lru)
+        grid.pinned = dict(self.pinned)
+        return grid
@@ -0,0 +1,205 @@
+from typing import NamedTuple, Optional, Tuple
+import math
+import numpy as np
+
+# Direction components smaller than this are treated as parallel to the axis
+PARALLEL_EPS = 1e-6
+
+
+class RayHit(NamedTuple):
+    cell: Tuple[int, int, int]
+    distance: float
+    normal: Tuple[int, int, int]               # entry face normal, (0, 0, 0) if the ray starts inside
+    adjacent: Optional[Tuple[int, int, int]]   # empty cell in front of the entry face, if any
+
+
+class BatchHits(NamedTuple):
+    cells: np.ndarray      # (M, 3) int, -1 where the ray missed
+    distances: np.ndarray  # (M,) float, inf where the ray missed
+    normals: np.ndarray    # (M, 3) int, entry face normal ((0, 0, 0) on a miss or inside start)
+
+    @property
+    def hit(self):
+        return self.cells[:, 0] >= 0
+
+
+def box_entry(origin, direction, lo, hi, max_distance):
+    '''
+    Slab test of a ray against the box [lo, hi].
+    Returns (t_enter, t_exit, entry_axis) clipped to [0, max_distance], or None on a miss.
+    entry_axis is -1 when the ray starts inside the box.
+    '''
+    t_enter, t_exit, entry_axis = 0.0, max_distance, -1
+    for i in range(3):
+        if abs(direction[i]) < PARALLEL_EPS:
+            # Ray is parallel to slab
+            if origin[i] < lo[i] or origin[i] > hi[i]:
+                return None
+            continue
+
+        t1 = (lo[i] - origin[i]) / direction[i]
+        t2 = (hi[i] - origin[i]) / direction[i]
+        if t1 > t2:
+            t1, t2 = t2, t1
+        if t1 > t_enter:
+            t_enter, entry_axis = t1, i
+        t_exit = min(t_exit, t2)
+
+    if t_enter > t_exit or t_exit < 0:
+        return None
+    return t_enter, t_exit, entry_axis
+
+
+def traverse(origin, direction, max_distance, size):
+    '''
+    Amanatides–Woo voxel traversal over the unit cells of a size³ grid
+    (cell (x, y, z) spans [x - 0.5, x + 0.5] on each axis).
+
+    Yields (cell, t_enter, normal) for every cell pierced by the ray, in order,
+    until the ray leaves the grid or goes past max_distance. direction must be normalized.
+    '''
+    o = [float(c) for c in origin]
+    d = [float(c) for c in direction]
+
+    clip = box_entry(o, d, (-0.5,) * 3, (size - 0.5,) * 3, max_distance)
+    if clip is None:
+        return
+    t, t_last, entry_axis = clip
+
+    # First cell: where the ray enters the grid (or the origin cell)
+    cell = [0, 0, 0]
+    step = [0, 0, 0]
+    t_max = [math.inf] * 3
+    t_delta = [math.inf] * 3
+    for i in range(3):
+        p = o[i] + d[i] * t
+        cell[i] = min(max(int(math.floor(p + 0.5)), 0), size - 1)
+        if abs(d[i]) < PARALLEL_EPS:
+            continue
+        step[i] = 1 if d[i] > 0 else -1
+        boundary = cell[i] + 0.5 * step[i]
+        t_max[i] = (boundary - o[i]) / d[i]
+        t_delta[i] = 1.0 / abs(d[i])
+
+    normal = [0, 0, 0]
+    if entry_axis >= 0:
+        normal[entry_axis] = -step[entry_axis]
+
+    while True:
+        yield (cell[0], cell[1], cell[2]), t, (normal[0], normal[1], normal[2])
+
+        # Step across the nearest cell boundary
+        axis = 0
+        if t_max[1] < t_max[axis]:
+            axis = 1
+        if t_max[2] < t_max[axis]:
+            axis = 2
+
+        t = t_max[axis]
+        if t > t_last:
+            return
+        cell[axis] += step[axis]
+        if not 0 <= cell[axis] < size:
+            return
+        t_max[axis] += t_delta[axis]
+        normal = [0, 0, 0]
+        normal[axis] = -step[axis]
+
+
+# ------------------- Batched Picking ------------------- #
+
+def box_entry_batch(origins, directions, lo, hi, max_distance):
+    '''
+    Vectorized box_entry for M rays against M boxes (lo/hi may broadcast).
+    Returns (t_enter, t_exit, entry_axis, hit) arrays.
+    '''
+    parallel = np.abs(directions) < PARALLEL_EPS
+    safe = np.where(parallel, 1.0, directions)
+    t1 = (lo - origins) / safe
+    t2 = (hi - origins) / safe
+    t_near = np.where(parallel, -np.inf, np.minimum(t1, t2))
+    t_far = np.where(parallel, np.inf, np.maximum(t1, t2))
+    outside = (parallel & ((origins < lo) | (origins > hi))).any(axis=1)
+
+    entry_axis = np.argmax(t_near, axis=1)
+    t_first = t_near.max(axis=1)
+    entry_axis = np.where(t_first > 0.0, entry_axis, -1)
+
+    t_enter = np.maximum(0.0, t_first)
+    t_exit = np.minimum(max_distance, t_far.min(axis=1))
+    hit = ~outside & (t_enter <= t_exit) & (t_exit >= 0)
+    return t_enter, t_exit, entry_axis, hit
+
+
+def raycast_batch(occupied, size, origins, directions, max_distance=20.0, half_size=0.5, solid_only=True):
+    '''
+    Cast M rays (origins and directions (M, 3)) through a size³ grid at once.
+    occupied(cells (K, 3)) -> bool (K,) answers the visibility of the cells being crossed.
+
+    Same traversal as traverse(), but every ray advances one cell per iteration as a
+    NumPy operation over all rays still in flight, so the Python loop runs at most
+    ~3 * min(size, max_distance) times regardless of M.
+    '''
+    origins = np.asarray(origins, dtype=float).reshape(-1, 3)
+    directions = np.asarray(directions, dtype=float).reshape(-1, 3)
+    directions = directions / np.linalg.norm(directions, axis=1, keepdims=True)
+    count = len(origins)
+    rows = np.arange(count)
+
+    cells = np.full((count, 3), -1, dtype=np.int64)
+    distances = np.full(count, np.inf)
+    normals = np.zeros((count, 3), dtype=np.int64)
+
+    # --- Clip every ray to the grid box ---
+    t, t_last, entry_axis, active = box_entry_batch(
+        origins, directions, -0.5, size - 0.5, max_distance)
+
+    parallel = np.abs(directions) < PARALLEL_EPS
+    step = np.where(parallel, 0, np.sign(directions)).astype(np.int64)
+    safe = np.where(parallel, 1.0, directions)
+
+    cell = np.floor(origins + directions * t[:, None] + 0.5).astype(np.int64)
+    np.clip(cell, 0, size - 1, out=cell)
+    t_max = np.where(parallel, np.inf, (cell + 0.5 * step - origins) / safe)
+    t_delta = np.where(parallel, np.inf, 1.0 / np.abs(safe))
+
+    normal = np.zeros((count, 3), dtype=np.int64)
+    entered = entry_axis >= 0
+    normal[rows[entered], entry_axis[entered]] = -step[rows[entered], entry_axis[entered]]
+
+    # --- Advance all rays in flight together ---
+    idx = rows[active]
+    reach = size if not np.isfinite(max_distance) else min(size, int(np.ceil(max_distance)) + 1)
+    max_steps = 3 * reach + 3
+    for _ in range(max_steps):
+        if len(idx) == 0:
+            break
+
+        c = cell[idx]
+        found = occupied(c) if solid_only else np.ones(len(idx), dtype=bool)
+        t_hit = t[idx]
+        if half_size < 0.5:
+            t_box, _, _, box_hit = box_entry_batch(
+                origins[idx], directions[idx], c - half_size, c + half_size, max_distance)
+            found &= box_hit
+            t_hit = np.where(box_hit, t_box, t_hit)
+
+        done = idx[found]
+        cells[done] = cell[done]
+        distances[done] = t_hit[found]
+        normals[done] = normal[done]
+
+        # Step the remaining rays across their nearest cell boundary
+        idx = idx[~found]
+        axis = np.argmin(t_max[idx], axis=1)
+        t_next = t_max[idx, axis]
+        cell[idx, axis] += step[idx, axis]
+        t_max[idx, axis] += t_delta[idx, axis]
+        t[idx] = t_next
+        normal[idx] = 0
+        normal[idx, axis] = -step[idx, axis]
+
+        inside = (t_next <= t_last[idx]) & (cell[idx, axis] >= 0) & (cell[idx, axis] < size)
+        idx = idx[inside]
+
+    return BatchHits(cells, distances, normals)
@@ -0,0 +1,625 @@
+'''
+    Scene file formats, selected by file extension.
+
+    .txt -> text, one "x y z r g b a" line per visible voxel
+    .vxb -> binary, fixed header + packed occupancy and RGBA arrays (memory-mappable)
+    .vxp -> color palette + run-length encoded palette indices, optionally compressed
+    .vxc -> compressed chunks + chunk index, readable one chunk at a time (see PagedGrid)
+'''
+
+import lzma
+import os
+import struct
+import threading
+import time
+import warnings
+import zlib
+import numpy as np
+
+from voxel_grid import VoxelStorage
+from chunked_grid import ChunkedGrid, create_storage
+
+
+class SceneFormatError(Exception):
+    ''' The file is not a valid scene in the expected format '''
+
+
+# ------------------------- TEXT (.txt) ------------------------- #
+
+def write_text(path, grid: VoxelStorage, space: float):
+    """
+    Format:
+
+    SIZE <grid_size>
+    SPACE <grid_space>
+    x y z r g b a
+    """
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"SIZE {grid.size}\n")
+        f.write(f"SPACE {space}\n")
+
+        coords, colors = grid.visible_cells()
+        for (x, y, z), color in zip(coords, VoxelStorage.unpack_color(colors)):
+            r, g, b, a = (round(float(c), 4) for c in color)
+            f.write(f"{x} {y} {z} {r} {g} {b} {a}\n")
+
+
+# Body is read and parsed in blocks of this many bytes (files may be larger than RAM)
+TEXT_BLOCK_BYTES = 8 << 20
+
+
+def _parse_rows(block: bytes):
+    '''
+    Parse a block of complete "x y z r g b [a]" lines into an (N, 7) float array.
+
+    Every line end is replaced by a "nan" token and the whole block is converted by
+    NumPy in one call; the nan markers give the length of each row, so 6- and 7-column
+    rows (old saves without alpha) can be mixed. Blank lines are skipped.
+    '''
+    text = block.replace(b"\r", b" ").replace(b"\n", b" nan ")
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", DeprecationWarning)
+        try:
+            values = np.fromstring(text, dtype=np.float64, sep=" ")
+        except (DeprecationWarning, ValueError) as e:
+            raise SceneFormatError(f"Linha de voxel inválida: {e}")
+
+    ends = np.flatnonzero(np.isnan(values))
+    starts = np.r_[0, ends[:-1] + 1]
+    lengths = ends - starts
+    if not np.isin(lengths, (0, 6, 7)).all():
+        raise SceneFormatError("Linha de voxel com número de colunas inválido")
+
+    rows = np.ones((int(np.count_nonzero(lengths)), 7), dtype=np.float64)
+    filled = lengths[lengths > 0]
+    row_starts = starts[lengths > 0]
+    for columns in (6, 7):
+        selected = filled == columns
+        index = row_starts[selected, None] + np.arange(columns)
+        rows[selected, :columns] = values[index]
+    return rows
+
+
+def read_text(path, stats=None, progress=None):
+    '''
+    Returns (grid, space).
+
+    The body is streamed in TEXT_BLOCK_BYTES blocks; each block is parsed in bulk and
+    scattered into the grid with one vectorized assignment. If a stats dict is given it
+    receives the number of rows, the elapsed time and the rows/second; progress, if
+    given, is called with the fraction of the file read after every block.
+    '''
+    start_time = time.perf_counter()
+    total_rows = 0
+    file_size = max(os.path.getsize(path), 1)
+
+    with open(path, "rb") as f:
+        size_line = f.readline().split()
+        space_line = f.readline().split()
+        try:
+            new_size = int(size_line[1])
+            new_space = float(space_line[1])
+        except (IndexError, ValueError):
+            raise SceneFormatError(f"{path}: cabeçalho SIZE/SPACE inválido")
+
+        # New grid with all voxels invisible (chunked for very large scenes)
+        grid = create_storage(new_size)
+
+        pending = b""
+        while True:
+            block = f.read(TEXT_BLOCK_BYTES)
+            if not block:
+                break
+            # Only complete lines are parsed; the tail waits for the next block
+            cut = block.rfind(b"\n")
+            if cut < 0:
+                pending += block
+                continue
+            data, pending = pending + block[:cut + 1], block[cut + 1:]
+            total_rows += _scatter_rows(grid, _parse_rows(data))
+            if progress is not None:
+                progress(f.tell() / file_size)
+
+        if pending.strip():
+            total_rows += _scatter_rows(grid, _parse_rows(pending + b"\n"))
+
+    if stats is not None:
+        elapsed = time.perf_counter() - start_time
+        stats.update(rows=total_rows, seconds=elapsed,
+                     rows_per_second=total_rows / elapsed if elapsed > 0 else float("inf"))
+    return grid, new_space
+
+
+def _scatter_rows(grid: VoxelStorage, rows):
+    if len(rows) == 0:
+        return 0
+    coords = rows[:, :3].astype(np.int64)
+    if (coords < 0).any() or (coords >= grid.size).any():
+        raise SceneFormatError("Voxel fora da grade (coordenada maior que SIZE)")
+    grid.set_voxels(coords, rows[:, 3:])
+    return len(rows)
+
+
+# ------------------------- BINARY (.vxb) ------------------------- #
+#
+# Little-endian, 64-byte header:
+#   magic "VOXB" | version u16 | flags u16 | size u32 | space f32
+#   origin 3 x i32 | shape 3 x u32 | zero padding
+# then, for the box [origin, origin + shape) holding every visible voxel:
+#   occupancy  shape[0] * shape[1] * shape[2] x u8 (0 / 1), C order
+#   colors     same cells x 4 u8 (RGBA)
+#
+
+BINARY_MAGIC = b"VOXB"
+BINARY_VERSION = 1
+BINARY_HEADER = struct.Struct("<4sHHIf3i3I")
+BINARY_HEADER_SIZE = 64
+
+# The box is stored densely (5 bytes per cell): above this, sparse worlds go to .vxc / .vxp
+BINARY_MAX_CELLS = 256 ** 3
+
+
+def _bounding_box(grid: VoxelStorage):
+    coords, _ = grid.visible_cells()
+    if len(coords) == 0:
+        return np.zeros(3, dtype=np.int64), np.zeros(3, dtype=np.int64)
+    lo = coords.min(axis=0)
+    return lo, coords.max(axis=0) + 1 - lo
+
+
+def write_binary(path, grid: VoxelStorage, space: float):
+    ''' Header and both arrays assembled in memory and written with a single write '''
+    origin, shape = _bounding_box(grid)
+    cells = int(np.prod(shape))
+    if cells > BINARY_MAX_CELLS:
+        raise SceneFormatError(
+            f"{path}: a caixa com os voxels tem {cells} células (máximo {BINARY_MAX_CELLS} em .vxb); "
+            "salve cenas grandes e esparsas como .vxc ou .vxp")
+    visible, colors = grid.region(origin, shape)
+
+    header = BINARY_HEADER.pack(
+        BINARY_MAGIC, BINARY_VERSION, 0, grid.size, space, *origin.tolist(), *shape.tolist())
+    header = header.ljust(BINARY_HEADER_SIZE, b"\0")
+
+    with open(path, "wb") as f:
+        f.write(b"".join((header, visible.astype(np.uint8).tobytes(), colors.tobytes())))
+
+
+def open_binary(path):
+    '''
+    Map a .vxb file without parsing its body.
+    Returns (header dict, occupancy memmap (sx, sy, sz) bool, colors memmap (sx, sy, sz, 4) uint8).
+    '''
+    with open(path, "rb") as f:
+        raw = f.read(BINARY_HEADER_SIZE)
+    if len(raw) < BINARY_HEADER_SIZE:
+        raise SceneFormatError(f"{path}: arquivo truncado")
+
+    magic, version, flags, size, space, ox, oy, oz, sx, sy, sz = BINARY_HEADER.unpack_from(raw)
+    if magic != BINARY_MAGIC:
+        raise SceneFormatError(f"{path}: não é uma cena .vxb")
+    if version != BINARY_VERSION:
+        raise SceneFormatError(f"{path}: versão {version} não suportada")
+
+    header = {'size': size, 'space': space, 'origin': (ox, oy, oz), 'shape': (sx, sy, sz)}
+    cells = sx * sy * sz
+    if os.path.getsize(path) < BINARY_HEADER_SIZE + cells * 5:
+        raise SceneFormatError(f"{path}: arquivo truncado")
+    if cells == 0:
+        return header, np.zeros((sx, sy, sz), dtype=bool), np.zeros((sx, sy, sz, 4), dtype=np.uint8)
+
+    occupancy = np.memmap(path, dtype=np.bool_, mode="r",
+                          offset=BINARY_HEADER_SIZE, shape=(sx, sy, sz))
+    colors = np.memmap(path, dtype=np.uint8, mode="r",
+                       offset=BINARY_HEADER_SIZE + cells, shape=(sx, sy, sz, 4))
+    return header, occupancy, colors
+
+
+def read_binary(path, stats=None, progress=None):
+    ''' Returns (grid, space); the mapped arrays are copied into the grid in bulk '''
+    start_time = time.perf_counter()
+    header, occupancy, colors = open_binary(path)
+    grid = create_storage(header['size'])
+    origin = np.asarray(header['origin'], dtype=np.int64)
+    shape = np.asarray(header['shape'], dtype=np.int64)
+
+    if occupancy.size and not grid.sparse:
+        box = tuple(slice(o, o + s) for o, s in zip(origin, shape))
+        grid.visible[box] = occupancy
+        grid.colors[box] = colors
+    elif occupancy.size:
+        occupancy = np.asarray(occupancy)
+        grid.set_voxels(np.argwhere(occupancy) + origin, colors[occupancy])
+
+    if stats is not None:
+        elapsed = time.perf_counter() - start_time
+        rows = grid.count
+        stats.update(rows=rows, seconds=elapsed,
+                     rows_per_second=rows / elapsed if elapsed > 0 else float("inf"))
+    return grid, header['space']
+
+
+# ------------------------- PALETTE + RLE (.vxp) ------------------------- #
+#
+# Little-endian, 64-byte header:
+#   magic "VOXP" | version u16 | compression u8 | index bytes u8 | size u32 | space f32
+#   origin 3 x i32 | shape 3 x u32 | palette count u32 | run count u32 | zero padding
+# then the body, compressed as a single stream (see COMPRESSIONS):
+#   palette  palette count x 4 u8 (RGBA)
+#   values   run count x index bytes (0 = empty, i = palette[i - 1])
+#   lengths  run count x u32
+# Runs cover the box [origin, origin + shape) in x/y/z (C) order.
+#
+
+PALETTE_MAGIC = b"VOXP"
+PALETTE_VERSION = 1
+PALETTE_HEADER = struct.Struct("<4sHBBIf3i3III")
+PALETTE_HEADER_SIZE = 64
+
+# compression name -> (code stored in the header, compress, decompress)
+COMPRESSIONS = {
+    "none": (0, bytes, bytes),
+    "zlib": (1, lambda data: zlib.compress(data, 6), zlib.decompress),
+    "lzma": (2, lzma.compress, lzma.decompress),
+}
+DEFAULT_COMPRESSION = "zlib"
+
+
+def _index_dtype(palette_count):
+    ''' Smallest unsigned type holding the values 0..palette_count '''
+    for dtype in (np.uint8, np.uint16):
+        if palette_count <= np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.uint32)
+
+
+def encode_runs(grid: VoxelStorage):
+    '''
+    Palette and runs of a grid, built from its visible voxels only (no dense copy
+    of empty space, so sparse worlds encode cheaply).
+    Returns (origin, shape, palette (P, 4) uint8, values (R,), lengths (R,) uint32).
+    '''
+    origin, shape = _bounding_box(grid)
+    coords, colors = grid.visible_cells()
+    if len(coords) == 0:
+        empty = np.zeros(0, dtype=np.uint32)
+        return origin, shape, np.zeros((0, 4), dtype=np.uint8), empty.astype(np.uint8), empty
+
+    packed = np.ascontiguousarray(colors).view(np.uint32)[:, 0]
+    palette, index = np.unique(packed, return_inverse=True)
+    local = coords - origin
+    flat = (local[:, 0] * shape[1] + local[:, 1]) * shape[2] + local[:, 2]
+    order = np.argsort(flat, kind='stable')
+    flat, index = flat[order], index.ravel()[order] + 1
+
+    # A run of voxels ends where the next voxel is not adjacent or has another color
+    breaks = np.flatnonzero((np.diff(flat) != 1) | (np.diff(index) != 0)) + 1
+    run_start = flat[np.r_[0, breaks]]
+    run_end = flat[np.r_[breaks - 1, len(flat) - 1]] + 1
+    run_value = index[np.r_[0, breaks]]
+
+    # Interleave the empty gaps before every run and after the last one
+    gap_start = np.r_[0, run_end[:-1]]
+    values = np.r_[np.stack([np.zeros_like(run_value), run_value], axis=1).ravel(), 0]
+    lengths = np.r_[np.stack([run_start - gap_start, run_end - run_start], axis=1).ravel(),
+                    np.prod(shape) - run_end[-1]]
+    keep = lengths > 0
+
+    values = values[keep].astype(_index_dtype(len(palette)))
+    lengths = lengths[keep].astype(np.uint32)
+    return origin, shape, palette.view(np.uint8).reshape(-1, 4), values, lengths
+
+
+def write_palette(path, grid: VoxelStorage, space: float, compression=None):
+    compression = compression or DEFAULT_COMPRESSION
+    if compression not in COMPRESSIONS:
+        raise SceneFormatError(f"Compressão desconhecida: '{compression}'")
+    code, compress, _ = COMPRESSIONS[compression]
+
+    origin, shape, palette, values, lengths = encode_runs(grid)
+    header = PALETTE_HEADER.pack(
+        PALETTE_MAGIC, PALETTE_VERSION, code, values.itemsize, grid.size, space,
+        *origin.tolist(), *shape.tolist(), len(palette), len(values))
+    body = compress(b"".join((palette.tobytes(), values.tobytes(), lengths.tobytes())))
+
+    with open(path, "wb") as f:
+        f.write(b"".join((header.ljust(PALETTE_HEADER_SIZE, b"\0"), body)))
+
+
+def read_palette(path, stats=None, progress=None):
+    '''
+    Returns (grid, space). The runs are expanded with np.repeat straight into the
+    grid arrays (dense grids) or into the voxel coordinates (chunked grids).
+    '''
+    start_time = time.perf_counter()
+    with open(path, "rb") as f:
+        raw = f.read()
+    if len(raw) < PALETTE_HEADER_SIZE:
+        raise SceneFormatError(f"{path}: arquivo truncado")
+
+    (magic, version, code, index_bytes, size, space, ox, oy, oz, sx, sy, sz,
+     palette_count, run_count) = PALETTE_HEADER.unpack_from(raw)
+    if magic != PALETTE_MAGIC:
+        raise SceneFormatError(f"{path}: não é uma cena .vxp")
+    if version != PALETTE_VERSION:
+        raise SceneFormatError(f"{path}: versão {version} não suportada")
+    decompress = {c: d for c, _, d in COMPRESSIONS.values()}.get(code)
+    if decompress is None or index_bytes not in (1, 2, 4):
+        raise SceneFormatError(f"{path}: cabeçalho inválido")
+
+    try:
+        body = decompress(raw[PALETTE_HEADER_SIZE:])
+    except (zlib.error, lzma.LZMAError) as e:
+        raise SceneFormatError(f"{path}: corpo corrompido ({e})")
+    value_dtype = np.dtype(f"<u{index_bytes}")
+    expected = palette_count * 4 + run_count * (index_bytes + 4)
+    if len(body) != expected:
+        raise SceneFormatError(f"{path}: arquivo truncado")
+
+    palette = np.frombuffer(body, dtype=np.uint8, count=palette_count * 4).reshape(-1, 4)
+    values = np.frombuffer(body, dtype=value_dtype, count=run_count, offset=palette_count * 4)
+    lengths = np.frombuffer(body, dtype="<u4", count=run_count,
+                            offset=palette_count * 4 + run_count * index_bytes)
+
+    shape = (sx, sy, sz)
+    if int(lengths.sum(dtype=np.int64)) != sx * sy * sz or (values > palette_count).any():
+        raise SceneFormatError(f"{path}: runs não cobrem a caixa da cena")
+
+    # Index 0 (empty) maps to a transparent black entry
+    lookup = np.concatenate([np.zeros((1, 4), dtype=np.uint8), palette])
+    grid = create_storage(size)
+    origin = np.asarray((ox, oy, oz), dtype=np.int64)
+
+    if run_count and not grid.sparse:
+        index = np.repeat(values, lengths).reshape(shape)
+        box = tuple(slice(o, o + s) for o, s in zip(origin, shape))
+        grid.visible[box] = index != 0
+        grid.colors[box] = lookup[index]
+    elif run_count:
+        # Only the cells of the solid runs are expanded
+        solid = values != 0
+        run_start = (np.cumsum(lengths, dtype=np.int64) - lengths)[solid]
+        run_length = lengths[solid].astype(np.int64)
+        offsets = np.arange(run_length.sum()) - np.repeat(np.cumsum(run_length) - run_length, run_length)
+        flat = np.repeat(run_start, run_length) + offsets
+        coords = np.stack(np.unravel_index(flat, shape), axis=1) + origin
+        grid.set_voxels(coords, lookup[np.repeat(values[solid], run_length)])
+
+    if stats is not None:
+        elapsed = time.perf_counter() - start_time
+        rows = grid.count
+        stats.update(rows=rows, seconds=elapsed,
+                     rows_per_second=rows / elapsed if elapsed > 0 else float("inf"))
+    return grid, space
+
+
+# ------------------------- CHUNKS (.vxc) ------------------------- #
+#
+# Little-endian, 64-byte header:
+#   magic "VOXC" | version u16 | flags u16 | size u32 | space f32
+#   chunk size u32 | chunk count u32 | index offset u64 | zero padding
+# then one zlib blob per non-empty chunk:
+#   occupancy bits (chunk size³, np.packbits, C order) | RGBA of the visible cells
+# and at index offset, one entry per chunk:
+#   chunk key 3 x i32 | blob offset u64 | blob length u32 | voxel count u32
+#
+# Only the header and the index have to be read to open the file.
+#
+
+CHUNKS_MAGIC = b"VOXC"
+CHUNKS_VERSION = 1
+CHUNKS_HEADER = struct.Struct("<4sHHIfIIQ")
+CHUNKS_HEADER_SIZE = 64
+CHUNK_ENTRY_DTYPE = np.dtype([
+    ('key', '<i4', (3,)), ('offset', '<u8'), ('length', '<u4'), ('count', '<u4'),
+])
+CHUNK_SIZE = 16
+
+
+def encode_chunk(visible, colors) -> bytes:
+    return zlib.compress(np.packbits(visible.ravel()).tobytes() + colors[visible].tobytes(), 6)
+
+
+def decode_chunk(blob, chunk_size):
+    ''' (visible, colors) arrays of one chunk '''
+    raw = zlib.decompress(blob)
+    cells = chunk_size ** 3
+    bits = (cells + 7) // 8
+    visible = np.unpackbits(np.frombuffer(raw, dtype=np.uint8, count=bits), count=cells).astype(bool)
+    visible = visible.reshape((chunk_size,) * 3)
+    colors = np.zeros((chunk_size,) * 3 + (4,), dtype=np.uint8)
+    colors[visible] = np.frombuffer(raw, dtype=np.uint8, offset=bits).reshape(-1, 4)
+    return visible, colors
+
+
+class ChunkFile:
+    '''
+    Open .vxc file: header and chunk index in memory, chunk blobs read on request.
+    Reads are serialized, so the file can be shared with a worker thread.
+
+    A paged grid and its copies (save and journal snapshots, possibly still being
+    written by a worker) share one ChunkFile: each holds a reference (acquire) and
+    drops it when done (release); the file is closed with the last one.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        self.lock = threading.Lock()
+        self.users = 0
+        self._users_lock = threading.Lock() # not self.lock: a release may run while a read holds it
+
+        raw = self.file.read(CHUNKS_HEADER_SIZE)
+        if len(raw) < CHUNKS_HEADER_SIZE:
+            raise SceneFormatError(f"{path}: arquivo truncado")
+        magic, version, _, size, space, chunk_size, count, index_offset = CHUNKS_HEADER.unpack_from(raw)
+        if magic != CHUNKS_MAGIC:
+            raise SceneFormatError(f"{path}: não é uma cena .vxc")
+        if version != CHUNKS_VERSION:
+            raise SceneFormatError(f"{path}: versão {version} não suportada")
+
+        self.size, self.space, self.chunk_size = size, space, chunk_size
+        self.file.seek(index_offset)
+        entries = np.frombuffer(self.file.read(count * CHUNK_ENTRY_DTYPE.itemsize), dtype=CHUNK_ENTRY_DTYPE)
+        if len(entries) != count:
+            raise SceneFormatError(f"{path}: índice de chunks truncado")
+        self.keys = entries['key'].astype(np.int64) # (K, 3), for distance queries
+        # chunk key -> (blob offset, blob length, voxel count)
+        self.index = {
+            tuple(key): (offset, length, voxels) for key, offset, length, voxels in zip(
+                self.keys.tolist(), entries['offset'].tolist(), entries['length'].tolist(), entries['count'].tolist())
+        }
+
+    def read_blob(self, key) -> bytes:
+        offset, length, _ = self.index[key]
+        with self.lock:
+            self.file.seek(offset)
+            return self.file.read(length)
+
+    def read_chunk(self, key):
+        ''' (visible, colors) of a chunk stored in the file '''
+        return decode_chunk(self.read_blob(key), self.chunk_size)
+
+    def acquire(self):
+        with self._users_lock:
+            self.users += 1
+        return self
+
+    def release(self):
+        with self._users_lock:
+            self.users -= 1
+            if self.users == 0:
+                self.file.close()
+
+    def close(self):
+        self.file.close()
+
+
+def _chunk_blobs(grid: VoxelStorage, chunk_size):
+    ''' (key, blob, voxel count) of every non-empty chunk of any storage '''
+    if grid.sparse and grid.chunk_size == chunk_size:
+        for key in grid._stored_keys():
+            blob = grid.raw_blob(key) if grid.paged else None # unchanged chunks are copied as is
+            chunk = None if blob is not None else grid._stored(key)
+            if chunk is not None:
+                blob = encode_chunk(chunk.visible, chunk.colors)
+            yield key, blob, grid.chunk_count(key) if grid.paged else grid.counts[key]
+        return
+
+    coords, _ = grid.visible_cells()
+    for key in map(tuple, np.unique(coords // chunk_size, axis=0).tolist()):
+        visible, colors = grid.region(np.asarray(key) * chunk_size, (chunk_size,) * 3)
+        yield key, encode_chunk(visible, colors), int(np.count_nonzero(visible))
+
+
+def write_chunked(path, grid: VoxelStorage, space: float):
+    '''
+    Blobs are streamed to a temporary file and the index appended at the end; the
+    file replaces path only when complete (path may be the file a PagedGrid reads).
+    '''
+    chunk_size = grid.chunk_size if grid.sparse else CHUNK_SIZE
+    temp = path + ".tmp"
+    entries = []
+    with open(temp, "wb") as f:
+        f.write(b"\0" * CHUNKS_HEADER_SIZE)
+        offset = CHUNKS_HEADER_SIZE
+        for key, blob, count in _chunk_blobs(grid, chunk_size):
+            f.write(blob)
+            entries.append((key, offset, len(blob), count))
+            offset += len(blob)
+
+        index = np.zeros(len(entries), dtype=CHUNK_ENTRY_DTYPE)
+        for i, entry in enumerate(entries):
+            index[i] = entry
+        f.write(index.tobytes())
+
+        f.seek(0)
+        f.write(CHUNKS_HEADER.pack(
+            CHUNKS_MAGIC, CHUNKS_VERSION, 0, grid.size, space, chunk_size, len(entries), offset))
+    os.replace(temp, path)
+
+
+def read_chunked(path, stats=None, progress=None):
+    ''' Returns (grid, space) with every chunk loaded (see PagedGrid for loading on demand) '''
+    start_time = time.perf_counter()
+    source = ChunkFile(path)
+    try:
+        grid = create_storage(source.size)
+        if grid.sparse:
+            grid = ChunkedGrid(source.size, source.chunk_size)
+        cs = source.chunk_size
+
+        for i, key in enumerate(source.index):
+            visible, colors = source.read_chunk(key)
+            if grid.sparse:
+                chunk = grid._chunk(key, create=True)
+                chunk.visible[...], chunk.colors[...] = visible, colors
+                grid.counts[key] = chunk.count
+                grid._free_if_empty(key)
+            else:
+                # Chunks on the border may extend past the grid
+                lo = np.asarray(key) * cs
+                hi = np.minimum(lo + cs, grid.size)
+                box = tuple(slice(a, b) for a, b in zip(lo, hi))
+                inner = tuple(slice(0, b - a) for a, b in zip(lo, hi))
+                grid.visible[box] = visible[inner]
+                grid.colors[box] = colors[inner]
+            if progress is not None and i % 256 == 255:
+                progress((i + 1) / len(source.index))
+        space = source.space
+    finally:
+        source.close()
+
+    if stats is not None:
+        elapsed = time.perf_counter() - start_time
+        rows = grid.count
+        stats.update(rows=rows, seconds=elapsed,
+                     rows_per_second=rows / elapsed if elapsed > 0 else float("inf"))
+    return grid, space
+
+
+# ------------------------- DISPATCH ------------------------- #
+
+# extension -> (reader, writer, description for the file dialogs)
+FORMATS = {
+    ".vxp": (read_palette, write_palette, "Voxel Palette"),
+    ".txt": (read_text, write_text, "Text Files"),
+    ".vxb": (read_binary, write_binary, "Voxel Binary"),
+    ".vxc": (read_chunked, write_chunked, "Voxel Chunks"),
+}
+
+# Format proposed by the save dialog
+DEFAULT_EXTENSION = ".vxp"
+
+# Binary formats are recognized by their first bytes, whatever the extension
+MAGICS = {PALETTE_MAGIC: ".vxp", BINARY_MAGIC: ".vxb", CHUNKS_MAGIC: ".vxc"}
+
+
+def _format(extension):
+    if extension not in FORMATS:
+        raise SceneFormatError(f"Formato de cena desconhecido: '{extension}'")
+    return FORMATS[extension]
+
+
+def detect_format(path):
+    ''' Extension of the format of an existing file: by magic bytes, else by its name '''
+    with open(path, "rb") as f:
+        magic = f.read(4)
+    return MAGICS.get(magic, os.path.splitext(path)[1].lower())
+
+
+def save_scene(path, grid: VoxelStorage, space: float):
+    _format(os.path.splitext(path)[1].lower())[1](path, grid, space)
+
+
+def load_scene(path, stats=None, progress=None):
+    '''
+    Returns (grid, space); stats (optional dict) receives rows, seconds and rows_per_second.
+    progress(fraction) is called while streaming formats are read (single-read formats skip it).
+    '''
+    return _format(detect_format(path))[0](path, stats, progress)
+
+
+def file_types():
+    ''' filetypes list for the Tk file dialogs, default format first '''
+    return [(description, f"*{ext}") for ext, (_, _, description) in FORMATS.items()]
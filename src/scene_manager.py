@@ -1,131 +1,167 @@
 
 from tkinter import Tk, filedialog
-from cube import *
-import numpy as np
+from cube import Cube
+from paged_grid import open_paged
+import scene_formats
 import os
+import queue
+import threading
 
 class SceneManager:
+    '''
+    File dialogs run on the GLFW thread (Tk needs it), but the file I/O and parsing
+    run on a worker thread. The worker reports through a queue that the frame loop
+    drains with poll(), which also swaps a loaded grid into the cube.
+    The hidden Tk root is only created when the first dialog opens.
+    '''
+
     def __init__(self, filename="save1.txt"):
         self.filename = filename
-        self.root = Tk()
-        self.root.withdraw()
+        self._root = None
+
+        self.messages = queue.Queue() # (kind, payload) posted by the worker
+        self.worker = None
         
     # ------------------------- FILE DIALOGS ------------------------- #
+
+    @property
+    def root(self):
+        if self._root is None:
+            self._root = Tk()
+            self._root.withdraw()
+        return self._root
     
-    def ask_save_file(self, initial_dir="saves"):
+    def ask_save_file(self, initial_dir="saves", extension=scene_formats.DEFAULT_EXTENSION):
         os.makedirs(initial_dir, exist_ok=True)
 
         filepath = filedialog.asksaveasfilename(
+            parent=self.root,
             initialdir=initial_dir,
             title="Salvar cena",
-            defaultextension=".txt",
-            filetypes=[("Text Files", "*.txt")]
+            defaultextension=extension,
+            filetypes=scene_formats.file_types()
         )
         
         return filepath
 
     def ask_open_file(self, initial_dir="saves"):
         filepath = filedialog.askopenfilename(
+            parent=self.root,
             initialdir=initial_dir,
             title="Carregar cena",
-            filetypes=[("Text Files", "*.txt")]
+            filetypes=[("Scenes", " ".join(f"*{ext}" for ext in scene_formats.FORMATS))]
+                      + scene_formats.file_types()
         )
 
         return filepath
 
+    # ------------------------- BACKGROUND JOBS ------------------------- #
+
+    @property
+    def busy(self) -> bool:
+        return self.worker is not None and self.worker.is_alive()
+
+    def _start(self, job, *args):
+        self.worker = threading.Thread(target=job, args=args, daemon=True)
+        self.worker.start()
+
+    def poll(self, cube_object: Cube):
+        '''
+        Called once per frame: handles everything the worker posted since the last
+        frame without blocking. A loaded grid replaces the cube's grid here, between
+        two frames, so rendering never sees a half-loaded scene.
+        '''
+        while True:
+            try:
+                kind, payload = self.messages.get_nowait()
+            except queue.Empty:
+                return
+
+            if kind == "progress":
+                print(f"Carregando... {payload:.0%}")
+            elif kind == "saved":
+                filename, snapshot = payload
+                # Chunks saved as .vxc no longer need to stay in memory
+                grid = cube_object.grid
+                if grid.paged and snapshot.paged and snapshot.source is grid.source \
+                        and scene_formats.detect_format(filename) == ".vxc":
+                    grid.mark_saved(snapshot.pinned, filename)
+                print(f"Cena salva com sucesso! ({filename})")
+            elif kind == "loaded":
+                grid, space, stats = payload
+                cube_object.set_grid(grid, space)
+                if 'chunks' in stats:
+                    print(f"Cena aberta! ({stats['rows']} voxels em {stats['chunks']} chunks, "
+                          f"carregados sob demanda)")
+                else:
+                    print(f"Cena carregada com sucesso! ({stats['rows']} voxels, "
+                          f"{stats['rows_per_second']:.0f} linhas/s)")
+            elif kind == "error":
+                print(payload)
+
     # ------------------------- SAVE ------------------------- #
     
     def save_scene(self, cube_object: Cube):
         """
-        Read the cube_object grid and save the scene to a text file.
+        Read the cube_object grid and save the scene.
+        The format is chosen by the file extension (see scene_formats):
         
-        Format:
-        
-        SIZE <grid_size>
-        SPACE <grid_space>
-        x y z r g b
+        .txt -> SIZE <grid_size> / SPACE <grid_space> / x y z r g b a
+        .vxb -> binary header + packed occupancy and colors
+        .vxp -> color palette + run-length encoded indices (default)
+        .vxc -> compressed chunks + index (default for scenes loaded from .vxc)
+
+        The grid is copied (a bulk array copy) and written by the worker thread,
+        so edits made while saving do not end up in the file.
         """
-        filename = self.ask_save_file()
+        if self.busy:
+            print("Aguarde: outra cena ainda está sendo salva ou carregada.")
+            return
+
+        grid = cube_object.grid
+        filename = self.ask_save_file(extension=".vxc" if grid.paged else scene_formats.DEFAULT_EXTENSION)
 
         if not filename:
             return
         
         self.filename = filename
+        self._start(self._save_job, filename, grid.copy(), cube_object.grid_space)
 
+    def _save_job(self, filename, grid, space):
         try:
-            with open(filename, "w", encoding="utf-8") as f:
-                f.write(f"SIZE {cube_object.size}\n")
-                f.write(f"SPACE {cube_object.grid_space}\n")
-                
-                it = np.nditer(np.zeros(cube_object.grid.shape), flags=['multi_index'])
-                for _ in it:
-                    x, y, z = it.multi_index
-                    voxel = cube_object.grid[x, y, z]
-
-                    if voxel and voxel.is_visible:
-                        r, g, b, a = voxel.color
-                        f.write(f"{x} {y} {z} {r} {g} {b} {a}\n")
-
-            print("Cena salva com sucesso!")
+            scene_formats.save_scene(filename, grid, space)
+            self.messages.put(("saved", (filename, grid)))
         except Exception as e:
-            print(f"Erro ao salvar: {e}")
+            self.messages.put(("error", f"Erro ao salvar: {e}"))
+
+    # ------------------------- LOAD ------------------------- #
 
     def load_scene(self, cube_object: Cube):
+        '''
+        Parse the chosen file on the worker thread; poll() swaps it in when ready.
+        .vxc scenes are opened lazily: only the chunk index is read, chunks are
+        paged in around the camera while editing (see PagedGrid).
+        '''
+        if self.busy:
+            print("Aguarde: outra cena ainda está sendo salva ou carregada.")
+            return
+
         filename = self.ask_open_file()
         if not filename:
             print("Carregamento cancelado.")
             return
 
-        with open(filename, "r") as f:
-            lines = f.readlines()
-
-        size_line = lines[0].split()
-        space_line = lines[1].split()
-
-        new_size = int(size_line[1])
-        new_space = float(space_line[1])
-
-        # Reinitialize cube grid
-        cube_object.size = new_size
-        cube_object.grid_space = new_space
-        cube_object.grid = np.empty((new_size, new_size, new_size), dtype=Voxel)
-        cube_object.selection_x, cube_object.selection_y, cube_object.selection_z = 0, 0, new_size - 1
-
-        # Initialize all voxels as invisible
-        for x in range(new_size):
-            for y in range(new_size):
-                for z in range(new_size):
-                    cube_object.grid[x, y, z] = Voxel(
-                        pos=np.array([x, y, z], dtype=float),
-                        scale=new_space,
-                        color=np.array([0, 0, 0, 1.0]),
-                        is_visible=False
-                    )
-
-        # Load voxel data
-        for line in lines[2:]:  # skip SIZE and SPACE lines
-            #
-            # Aqui que tava o erro da apresentação kkkk
-            # Ele tava tentando pegar o valor do "a" (transparencia) sendo q não existia em alguns saves mais antigos
-            # E também, quando ele pegava o "a", ele tava pegando como string e não float
-            #
-            a = 1.0
-            line_split = line.split()
-            print(len(line_split))
-            
-            if not line.strip():
-                continue
-            
-            if len(line_split) == 6:
-                x, y, z, r, g, b = line_split
-            else: 
-                x, y, z, r, g, b, a = line_split
-            
-            x = int(x); y = int(y); z = int(z)
-            r = float(r); g = float(g); b = float(b); a = float(a)
-
-            voxel = cube_object.grid[x, y, z]
-            voxel.is_visible = True
-            voxel.color = np.array([r, g, b, a], dtype=float)
-
-        print("Cena carregada com sucesso!")
\ No newline at end of file
+        self._start(self._load_job, filename)
+
+    def _load_job(self, filename):
+        stats = {}
+        try:
+            if scene_formats.detect_format(filename) == ".vxc":
+                grid, space = open_paged(filename)
+                stats.update(rows=grid.count, chunks=len(grid.source.index))
+            else:
+                grid, space = scene_formats.load_scene(
+                    filename, stats, progress=lambda done: self.messages.put(("progress", done)))
+            self.messages.put(("loaded", (grid, space, stats)))
+        except Exception as e:
+            self.messages.put(("error", f"Erro ao carregar: {e}"))
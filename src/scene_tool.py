@@ -0,0 +1,221 @@
+'''
+    Headless scene processing: only the voxel model and the save formats are
+    imported (no Tk, GLFW, OpenGL or pygame), so it runs on machines without a
+    display or audio device.
+
+    Usage (inside src/):
+        python scene_tool.py stats <files or folders> [--top 8]
+        python scene_tool.py validate <files or folders>
+        python scene_tool.py convert <files or folders> --to .vxp [-o <folder>]
+        python scene_tool.py merge <files> -o <file>
+        python scene_tool.py crop <file> --min X Y Z --max X Y Z -o <file> [--shift]
+
+    Folders are expanded to the scene files they contain, and several files are
+    processed in parallel, one process per core (--jobs to change it).
+'''
+
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from chunked_grid import create_storage
+import scene_formats
+
+
+def scene_files(paths):
+    ''' Files named in paths, with folders expanded to the scene files inside them '''
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if os.path.splitext(name)[1].lower() in scene_formats.FORMATS:
+                    files.append(os.path.join(path, name))
+        else:
+            files.append(path)
+    return files
+
+
+def _run_all(job, files, jobs, *args):
+    ''' (file, result) of job(file, *args) for every file, in parallel when there are several '''
+    if jobs == 1 or len(files) < 2:
+        return [(path, job(path, *args)) for path in files]
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        results = pool.map(job, files, *([arg] * len(files) for arg in args))
+        return list(zip(files, results))
+
+
+# ------------------- Stats ------------------- #
+
+def scene_stats(grid, space, top=8):
+    ''' Voxel count, bounding box and most used colors of a scene '''
+    coords, colors = grid.visible_cells()
+    stats = {'size': grid.size, 'space': float(space), 'voxels': len(coords), 'bbox': None, 'colors': []}
+    if len(coords):
+        stats['bbox'] = (coords.min(axis=0).tolist(), coords.max(axis=0).tolist())
+        palette, counts = np.unique(colors, axis=0, return_counts=True)
+        order = np.argsort(-counts, kind='stable')
+        stats['distinct_colors'] = len(palette)
+        stats['colors'] = [(bytes(palette[i]).hex(), int(counts[i])) for i in order[:top]]
+    return stats
+
+
+def _stats_job(path, top):
+    try:
+        return scene_stats(*scene_formats.load_scene(path), top=top)
+    except (OSError, ValueError, scene_formats.SceneFormatError) as e:
+        return f"Erro: {e}"
+
+
+def _print_stats(path, stats):
+    print(path)
+    if isinstance(stats, str):
+        print(f"  {stats}")
+        return
+    print(f"  tamanho    : {stats['size']}³ (espaçamento {stats['space']:g})")
+    print(f"  voxels     : {stats['voxels']}")
+    if stats['bbox'] is not None:
+        lo, hi = stats['bbox']
+        print(f"  caixa      : {tuple(lo)} .. {tuple(hi)}")
+        print(f"  cores      : {stats['distinct_colors']} distintas")
+        for rgba, count in stats['colors']:
+            print(f"    #{rgba}  {count:>10}  ({count / stats['voxels']:.1%})")
+
+
+# ------------------- Validate ------------------- #
+
+def _validate_job(path):
+    ''' None when the file loads, else the error message '''
+    try:
+        grid, _ = scene_formats.load_scene(path)
+        coords, _ = grid.visible_cells()
+        if len(coords) and (coords.min() < 0 or coords.max() >= grid.size):
+            return "voxels fora da grade"
+    except (OSError, ValueError, scene_formats.SceneFormatError) as e:
+        return str(e)
+    return None
+
+
+# ------------------- Convert ------------------- #
+
+def _convert_job(path, extension, folder):
+    ''' Writes path in another format; returns the new file, or the error message '''
+    name = os.path.splitext(os.path.basename(path))[0] + extension
+    target = os.path.join(folder if folder is not None else os.path.dirname(path), name)
+    if os.path.abspath(target) == os.path.abspath(path):
+        return "Erro: o arquivo já está nesse formato"
+    try:
+        scene_formats.save_scene(target, *scene_formats.load_scene(path))
+    except (OSError, ValueError, scene_formats.SceneFormatError) as e:
+        return f"Erro: {e}"
+    return target
+
+
+# ------------------- Merge / Crop ------------------- #
+
+def merge_scenes(scenes):
+    '''
+    One scene holding the voxels of every (grid, space) in scenes, in a grid large
+    enough for all of them. Where scenes overlap, the later one wins.
+    '''
+    grid = create_storage(max(g.size for g, _ in scenes))
+    for source, _ in scenes:
+        grid.set_voxels(*source.visible_cells())
+    return grid, scenes[0][1]
+
+
+def crop_scene(grid, space, lo, hi, shift=False):
+    '''
+    Keeps the voxels inside the box lo..hi (inclusive). With shift, lo becomes the
+    origin and the grid shrinks to the box.
+    '''
+    lo, hi = np.asarray(lo, dtype=np.int64), np.asarray(hi, dtype=np.int64)
+    coords, colors = grid.visible_cells()
+    inside = ((coords >= lo) & (coords <= hi)).all(axis=1)
+    coords, colors = coords[inside], colors[inside]
+    if shift:
+        coords = coords - lo
+        cropped = create_storage(int((hi - lo).max()) + 1)
+    else:
+        cropped = create_storage(grid.size)
+    cropped.set_voxels(coords, colors)
+    return cropped, space
+
+
+# ------------------- Entry Point ------------------- #
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Processamento de cenas sem janela")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                        help="processos em paralelo (padrão: um por núcleo)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("stats", help="voxels, caixa envolvente e histograma de cores")
+    p.add_argument("paths", nargs="+")
+    p.add_argument("--top", type=int, default=8, help="cores mais usadas a mostrar")
+
+    p = sub.add_parser("validate", help="verifica se as cenas podem ser carregadas")
+    p.add_argument("paths", nargs="+")
+
+    p = sub.add_parser("convert", help="converte cenas para outro formato")
+    p.add_argument("paths", nargs="+")
+    p.add_argument("--to", required=True, choices=sorted(scene_formats.FORMATS))
+    p.add_argument("-o", "--output", help="pasta de saída (padrão: a pasta de cada arquivo)")
+
+    p = sub.add_parser("merge", help="junta várias cenas numa só")
+    p.add_argument("paths", nargs="+")
+    p.add_argument("-o", "--output", required=True)
+
+    p = sub.add_parser("crop", help="recorta uma cena numa caixa")
+    p.add_argument("path")
+    p.add_argument("--min", type=int, nargs=3, required=True, metavar=("X", "Y", "Z"))
+    p.add_argument("--max", type=int, nargs=3, required=True, metavar=("X", "Y", "Z"))
+    p.add_argument("--shift", action="store_true", help="move o canto mínimo para a origem")
+    p.add_argument("-o", "--output", required=True)
+
+    args = parser.parse_args(argv)
+    jobs = max(1, args.jobs)
+
+    try:
+        if args.command == "stats":
+            for path, stats in _run_all(_stats_job, scene_files(args.paths), jobs, args.top):
+                _print_stats(path, stats)
+
+        elif args.command == "validate":
+            failed = 0
+            for path, error in _run_all(_validate_job, scene_files(args.paths), jobs):
+                print(f"{'ok  ' if error is None else 'ERRO'} {path}" + (f": {error}" if error else ""))
+                failed += error is not None
+            return 1 if failed else 0
+
+        elif args.command == "convert":
+            if args.output is not None:
+                os.makedirs(args.output, exist_ok=True)
+            failed = 0
+            for path, result in _run_all(_convert_job, scene_files(args.paths), jobs, args.to, args.output):
+                print(f"{path} -> {result}")
+                failed += result.startswith("Erro")
+            return 1 if failed else 0
+
+        elif args.command == "merge":
+            scenes = [scene_formats.load_scene(path) for path in scene_files(args.paths)]
+            if not scenes:
+                parser.error("nenhuma cena para juntar")
+            grid, space = merge_scenes(scenes)
+            scene_formats.save_scene(args.output, grid, space)
+            print(f"{args.output}: {grid.count} voxels")
+
+        elif args.command == "crop":
+            grid, space = crop_scene(*scene_formats.load_scene(args.path), args.min, args.max, args.shift)
+            scene_formats.save_scene(args.output, grid, space)
+            print(f"{args.output}: {grid.count} voxels")
+
+    except (OSError, ValueError, scene_formats.SceneFormatError) as e:
+        print(f"Erro: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,28 +1,68 @@
 import os
-import pygame
+import threading
 from typing import Any, cast
 
 CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_ROOT = os.path.dirname(CURRENT_DIR)
 SOUNDS_PATH = os.path.join(PROJECT_ROOT, "sounds")
 
-class SoundManager:#   audio quality, bits, stereo, buffer size
+class SoundManager:
+    '''
+    pygame is imported, the mixer initialized and the sounds decoded on a background
+    thread, so startup does not wait for the audio device. Sounds asked for before
+    that are loaded as soon as the mixer is ready; playing one earlier is a no-op.
+    '''
+    #                   audio quality, bits, stereo, buffer size
     def __init__(self, freq=44100, size=-16, channels=2, buffer=512):
-        pygame.mixer.init(frequency=freq, size=size, channels=channels, buffer=buffer)
         self.default_volume = 0.5
         self.music_volume = 1.0
         self.sounds = {}
 
+        self.ready = threading.Event() # set once the mixer is initialized (or failed to)
+        self.available = False         # the mixer could be initialized
+        self._pending = []             # (name, file_path) asked for before ready
+        self._lock = threading.Lock()
+        threading.Thread(target=self._init, args=(freq, size, channels, buffer), daemon=True).start()
+
+    def _init(self, freq, size, channels, buffer):
+        try:
+            import pygame
+            pygame.mixer.init(frequency=freq, size=size, channels=channels, buffer=buffer)
+            self.available = True
+        except Exception as e: # no audio device, or pygame missing
+            print(f"[SoundManager] Áudio indisponível: {e}")
+
+        # Sounds asked for meanwhile; ready is only set once none is left
+        while True:
+            with self._lock:
+                pending, self._pending = self._pending, []
+                if not pending:
+                    self.ready.set()
+                    return
+            if self.available:
+                for name, file_path in pending:
+                    self._load(name, file_path)
+
     def _full_path(self, file_path: str) -> str:
         return os.path.join(SOUNDS_PATH, file_path)
 
     # ------------------- Sound Effect Management ------------------- #
 
     def load_sound(self, name: str, file_path: str):
-        """Loads a sound effect and stores it by name."""
+        """Loads a sound effect and stores it by name (in the background while the mixer starts)."""
         if name in self.sounds:
             return self.sounds[name]
 
+        with self._lock:
+            if not self.ready.is_set():
+                self._pending.append((name, file_path))
+                return None
+        if not self.available:
+            return None
+        return self._load(name, file_path)
+
+    def _load(self, name: str, file_path: str):
+        import pygame
         path = self._full_path(file_path)
 
         if not os.path.exists(path):
@@ -37,6 +77,8 @@ class SoundManager:#   audio quality, bits, stereo, buffer size
             return None
 
     def play_sound(self, name: str, volume=None):
+        if not self.ready.is_set() or not self.available:
+            return # still starting, or no audio
         sound = self.sounds.get(name)
         if sound is None:
             print(f"[SoundManager] Som '{name}' não carregado!")
@@ -49,6 +91,10 @@ class SoundManager:#   audio quality, bits, stereo, buffer size
     # ------------------- Music Management ------------------- #
 
     def play_music(self, file_path: str, volume=1.0, loop=True):
+        self.ready.wait()
+        if not self.available:
+            return
+        import pygame
         path = self._full_path(file_path)
 
         if not os.path.exists(path):
@@ -60,7 +106,11 @@ class SoundManager:#   audio quality, bits, stereo, buffer size
         pygame.mixer.music.play(-1 if loop else 0)
         
     def stop_music(self):
-        pygame.mixer.music.stop()
+        if self.available:
+            import pygame
+            pygame.mixer.music.stop()
 
     def set_music_volume(self, vol: float):
-        pygame.mixer.music.set_volume(vol)
\ No newline at end of file
+        if self.available:
+            import pygame
+            pygame.mixer.music.set_volume(vol)
\ No newline at end of file
@@ -0,0 +1,44 @@
+'''
+    Startup timing: main.py wraps each import and initialization step in a phase,
+    and `python main.py --startup-profile` prints the breakdown once the first
+    frame is on screen.
+'''
+
+import threading
+import time
+from contextlib import contextmanager
+
+
+class StartupProfile:
+    '''
+    Records (name, start, seconds) of every phase, relative to the creation of the
+    profile. Phases may run on other threads (they are then shown as overlapping).
+    '''
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.start = time.perf_counter()
+        self.phases = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            with self._lock:
+                self.phases.append((name, start - self.start, end - start))
+
+    def first_frame(self):
+        ''' Called by the window after the first frame was presented '''
+        with self._lock:
+            self.phases.append(("primeiro frame", 0.0, time.perf_counter() - self.start))
+        if self.enabled:
+            self.report()
+
+    def report(self):
+        print("Tempo de inicialização:")
+        for name, start, seconds in self.phases:
+            print(f"  {name:<32} {start * 1e3:8.1f} ms  +{seconds * 1e3:8.1f} ms")
@@ -0,0 +1,53 @@
+'''
+    Translucent voxels (alpha < 255) are drawn after the opaque ones, back to front.
+    The order is the distance to the camera position, which does not depend on where
+    the camera looks, so it is only sorted again when the camera moved far enough
+    or the translucent voxels changed.
+'''
+
+import time
+import numpy as np
+
+# Camera movement (world units) after which translucent voxels are sorted again
+SORT_THRESHOLD = 0.25
+
+
+def is_opaque(colors):
+    ''' (N,) bool for packed uint8 colors (N, 4) '''
+    return np.asarray(colors)[..., 3] == 255
+
+
+def back_to_front(positions, cam_pos):
+    ''' Order (N,) of positions (N, 3), farthest from cam_pos first '''
+    offsets = np.asarray(positions, dtype=np.float64) - np.asarray(cam_pos, dtype=np.float64)
+    return np.argsort(-np.einsum('ij,ij->i', offsets, offsets), kind='stable')
+
+
+class DepthSorter:
+    '''
+    Decides when a back-to-front order is stale and times the sorts. The owner calls
+    invalidate() when the items changed and sort(...) every frame.
+    '''
+
+    def __init__(self, threshold=SORT_THRESHOLD):
+        self.threshold = threshold
+        self.sorted_at = None # camera position of the last sort
+        self.stats = {'sort_ms': 0.0, 'sorted': 0}
+
+    def invalidate(self):
+        self.sorted_at = None
+
+    def sort(self, positions, cam_pos):
+        ''' New order for positions, or None when the last one is still good '''
+        if cam_pos is None:
+            return None
+        cam_pos = np.asarray(cam_pos, dtype=np.float64)
+        if self.sorted_at is not None and np.linalg.norm(cam_pos - self.sorted_at) <= self.threshold:
+            self.stats['sort_ms'] = 0.0
+            return None
+
+        start = time.perf_counter()
+        order = back_to_front(positions, cam_pos)
+        self.stats = {'sort_ms': round((time.perf_counter() - start) * 1e3, 3), 'sorted': len(order)}
+        self.sorted_at = cam_pos.copy()
+        return order
@@ -0,0 +1,338 @@
+import numpy as np
+from numpy.typing import NDArray
+from raycast import RayHit, box_entry, traverse, raycast_batch
+from octree import SparseVoxelOctree, cell_key
+from occlusion import NeighborCounts
+
+
+class VoxelStorage:
+    '''
+    Common interface of the voxel storages (dense VoxelGrid, sparse ChunkedGrid).
+
+    Cells are integer (x, y, z) coordinates inside [0, size)³, a cell lives at world
+    position (x, y, z). Colors are exchanged as floats (0.0 - 1.0) and stored packed
+    as uint8 RGBA. Subclasses implement the cell queries and edits; picking, keys and
+    change notification are shared.
+    '''
+
+    sparse = False # True when memory is only allocated where there are voxels
+    paged = False  # True when chunks are read from disk on demand (see PagedGrid)
+
+    def __init__(self, size: int):
+        self.size = int(size)
+        self.generation = 0 # incremented on every edit
+        self.listeners = []  # callbacks notified with the changed cells
+        self.octree = None   # optional SparseVoxelOctree index (see build_octree)
+        self.occlusion = None # optional NeighborCounts of enclosed voxels (see build_occlusion)
+
+    # ------------------- Color Packing ------------------- #
+
+    @staticmethod
+    def pack_color(rgba) -> NDArray[np.uint8]:
+        ''' Convert float RGBA values (0.0 - 1.0) to uint8 (0 - 255) '''
+        rgba = np.clip(np.asarray(rgba, dtype=np.float32), 0.0, 1.0)
+        return np.rint(rgba * 255.0).astype(np.uint8)
+
+    @staticmethod
+    def unpack_color(rgba) -> NDArray[np.float32]:
+        ''' Convert uint8 RGBA values (0 - 255) to float (0.0 - 1.0) '''
+        return np.asarray(rgba, dtype=np.float32) / 255.0
+
+    # ------------------- Cell Queries ------------------- #
+
+    def in_bounds(self, cell) -> bool:
+        x, y, z = cell
+        return 0 <= x < self.size and 0 <= y < self.size and 0 <= z < self.size
+
+    def get_color(self, cell) -> NDArray[np.float32]:
+        return self.unpack_color(self.packed_color(cell))
+
+    def position(self, cell) -> NDArray[np.float32]:
+        ''' World position of a cell, derived from its index '''
+        return np.asarray(cell, dtype=np.float32)
+
+    def flat_index(self, cells):
+        ''' Flat (C order) index of cells (N, 3), used as a stable key per cell '''
+        cells = np.asarray(cells, dtype=np.int64).reshape(-1, 3)
+        return (cells[:, 0] * self.size + cells[:, 1]) * self.size + cells[:, 2]
+
+    def is_visible(self, cell) -> bool:
+        raise NotImplementedError
+
+    def packed_color(self, cell) -> NDArray[np.uint8]:
+        raise NotImplementedError
+
+    def occupied(self, cells) -> NDArray[np.bool_]:
+        ''' Vectorized is_visible for cells (N, 3) inside the grid '''
+        raise NotImplementedError
+
+    def colors_at(self, cells) -> NDArray[np.uint8]:
+        ''' Vectorized packed_color for cells (N, 3) inside the grid '''
+        raise NotImplementedError
+
+    def visible_cells(self):
+        '''
+        Returns the coordinates (N, 3) and packed colors (N, 4) of every visible voxel.
+        '''
+        raise NotImplementedError
+
+    def region(self, lo, shape):
+        '''
+        Dense copy (visible, colors) of the box starting at cell lo with the given shape.
+        Cells outside the grid read as empty.
+        '''
+        raise NotImplementedError
+
+    # ------------------- Picking ------------------- #
+
+    def raycast(self, origin, direction, max_distance=20.0, half_size=0.5, solid_only=True):
+        '''
+        Walk the cells along the ray (voxel traversal, O(N) in the cells crossed)
+        and return a RayHit for the first one that is hit, or None.
+
+        half_size  -> half extent of the voxel boxes; below 0.5 (spaced voxels) each
+                      crossed cell is also slab-tested against its smaller box
+        solid_only -> skip empty cells; with False any cell of the grid can be hit
+        '''
+        direction = np.asarray(direction, dtype=float)
+        direction = direction / np.linalg.norm(direction)
+        origin = np.asarray(origin, dtype=float)
+
+        # The octree skips whole empty regions instead of stepping cell by cell
+        if solid_only and half_size >= 0.5 and self.octree is not None:
+            found = self.octree.raycast(origin, direction, max_distance)
+            if found is None:
+                return None
+            cell, t, normal = found
+            return RayHit(cell, t, normal, self._adjacent(cell, normal))
+
+        for cell, t, normal in traverse(origin, direction, max_distance, self.size):
+            if solid_only and (not self.is_visible(cell) or self.is_enclosed(cell)):
+                continue
+
+            if half_size < 0.5:
+                center = np.asarray(cell, dtype=float)
+                hit = box_entry(origin, direction, center - half_size, center + half_size, max_distance)
+                if hit is None:
+                    continue
+                t = hit[0]
+
+            return RayHit(cell, t, normal, self._adjacent(cell, normal))
+
+        return None
+
+    def _adjacent(self, cell, normal):
+        ''' Empty cell in front of the face with the given normal, if any '''
+        if not any(normal):
+            return None
+        front = (cell[0] + normal[0], cell[1] + normal[1], cell[2] + normal[2])
+        if self.in_bounds(front) and not self.is_visible(front):
+            return front
+        return None
+
+    def raycast_batch(self, origins, directions, max_distance=20.0, half_size=0.5, solid_only=True):
+        '''
+        Vectorized raycast for many rays: origins and directions are (M, 3).
+        Returns BatchHits(cells, distances, normals) with one row per ray.
+        Always the vectorized traversal: the octree is walked one ray at a time, which
+        would give up the batching.
+        '''
+        return raycast_batch(self._pickable, self.size, origins, directions,
+                             max_distance, half_size, solid_only)
+
+    def _pickable(self, cells):
+        ''' Occupied cells, minus the fully enclosed ones when occlusion is tracked '''
+        found = self.occupied(cells)
+        if self.occlusion is not None:
+            found &= ~self.occlusion.hidden(cells)
+        return found
+
+    def is_enclosed(self, cell) -> bool:
+        return self.occlusion is not None and self.occlusion.is_hidden(cell)
+
+    # ------------------- Octree Index ------------------- #
+
+    # Edits touching more cells than this rebuild the octree instead of updating it
+    OCTREE_REBUILD_THRESHOLD = 4096
+
+    def build_octree(self):
+        '''
+        Build a sparse voxel octree of the current voxels and keep it updated on every
+        edit. While it exists, solid-only raycasts traverse the octree.
+        '''
+        self.drop_octree()
+        self.octree = SparseVoxelOctree.from_storage(self)
+        self.add_listener(self._update_octree)
+        return self.octree
+
+    def drop_octree(self):
+        if self.octree is not None:
+            self.remove_listener(self._update_octree)
+            self.octree = None
+
+    def _update_octree(self, cells):
+        if cells is None or len(cells) > self.OCTREE_REBUILD_THRESHOLD:
+            self.octree = SparseVoxelOctree.from_storage(self)
+            return
+        for cell in cells.tolist():
+            key = cell_key(self.is_visible(cell), self.packed_color(cell))
+            self.octree.update(cell, int(key))
+
+    # ------------------- Occlusion ------------------- #
+
+    def build_occlusion(self):
+        '''
+        Count the solid neighbors of every voxel and keep the counts updated on every
+        edit. While they exist, fully enclosed voxels are skipped by picking.
+        '''
+        self.drop_occlusion()
+        block_size = self.chunk_size if self.sparse else 16
+        self.occlusion = NeighborCounts(self, block_size)
+        return self.occlusion
+
+    def drop_occlusion(self):
+        if self.occlusion is not None:
+            self.occlusion.detach()
+            self.occlusion = None
+
+    # ------------------- Change Notification ------------------- #
+
+    def add_listener(self, callback):
+        '''
+        Register callback(cells) to be called after every edit.
+        cells is an (N, 3) int array with the touched cells, or None when the
+        whole grid must be considered changed.
+        '''
+        self.listeners.append(callback)
+
+    def remove_listener(self, callback):
+        if callback in self.listeners:
+            self.listeners.remove(callback)
+
+    def _changed(self, cells):
+        self.generation += 1
+        for callback in self.listeners:
+            callback(cells)
+
+
+class VoxelGrid(VoxelStorage):
+    '''
+    Packed struct-of-arrays storage for a dense size³ voxel grid.
+
+    Instead of one Python object per cell, the grid keeps two flat arrays:
+
+    visible -> (n, n, n) bool, occupancy mask
+    colors  -> (n, n, n, 4) uint8, RGBA color of each cell
+
+    Positions are not stored, so each voxel costs 5 bytes.
+    '''
+
+    def __init__(self, size: int):
+        super().__init__(size)
+        self.visible = np.zeros((self.size, self.size, self.size), dtype=bool)
+        self.colors = np.zeros((self.size, self.size, self.size, 4), dtype=np.uint8)
+
+    @classmethod
+    def random(cls, size: int, rng=None):
+        ''' Build a fully visible grid with random colors (vectorized) '''
+        rng = rng if rng is not None else np.random.default_rng()
+        grid = cls(size)
+        grid.visible[...] = True
+        grid.colors[...] = rng.integers(0, 256, size=grid.colors.shape, dtype=np.uint8)
+        return grid
+
+    # ------------------- Cell Queries ------------------- #
+
+    def is_visible(self, cell) -> bool:
+        return bool(self.visible[tuple(cell)])
+
+    def packed_color(self, cell) -> NDArray[np.uint8]:
+        return self.colors[tuple(cell)]
+
+    def occupied(self, cells) -> NDArray[np.bool_]:
+        cells = np.asarray(cells).reshape(-1, 3)
+        return self.visible[cells[:, 0], cells[:, 1], cells[:, 2]]
+
+    def colors_at(self, cells) -> NDArray[np.uint8]:
+        cells = np.asarray(cells).reshape(-1, 3)
+        return self.colors[cells[:, 0], cells[:, 1], cells[:, 2]]
+
+    def visible_cells(self):
+        ''' Coordinates (N, 3) and packed colors (N, 4) of every visible voxel, in x/y/z order '''
+        coords = np.argwhere(self.visible)
+        return coords, self.colors[self.visible]
+
+    def region(self, lo, shape):
+        lo = np.asarray(lo, dtype=np.int64)
+        hi = lo + np.asarray(shape, dtype=np.int64)
+        visible = np.zeros(tuple(shape), dtype=bool)
+        colors = np.zeros(tuple(shape) + (4,), dtype=np.uint8)
+
+        src_lo, src_hi = np.maximum(lo, 0), np.minimum(hi, self.size)
+        if (src_hi <= src_lo).any():
+            return visible, colors
+        src = tuple(slice(a, b) for a, b in zip(src_lo, src_hi))
+        dst = tuple(slice(a, b) for a, b in zip(src_lo - lo, src_hi - lo))
+        visible[dst] = self.visible[src]
+        colors[dst] = self.colors[src]
+        return visible, colors
+
+    @property
+    def count(self) -> int:
+        return int(np.count_nonzero(self.visible))
+
+    @property
+    def nbytes(self) -> int:
+        return self.visible.nbytes + self.colors.nbytes
+
+    # ------------------- Cell Edits ------------------- #
+
+    def set_voxel(self, cell, rgba):
+        ''' Make a cell visible with the given float RGBA color '''
+        cell = tuple(cell)
+        self.visible[cell] = True
+        self.colors[cell] = self.pack_color(rgba)
+        self._changed(np.array([cell]))
+
+    def paint_voxel(self, cell, rgba):
+        ''' Change the color of a cell without touching its visibility '''
+        cell = tuple(cell)
+        self.colors[cell] = self.pack_color(rgba)
+        self._changed(np.array([cell]))
+
+    def clear_voxel(self, cell):
+        cell = tuple(cell)
+        self.visible[cell] = False
+        self._changed(np.array([cell]))
+
+    def set_voxels(self, coords, colors):
+        '''
+        Bulk write: make every cell in coords (N, 3) visible with colors (N, 4).
+        Colors may be uint8 (already packed) or floats (0.0 - 1.0).
+        '''
+        coords = np.asarray(coords, dtype=np.intp).reshape(-1, 3)
+        colors = np.asarray(colors)
+        if colors.dtype != np.uint8:
+            colors = self.pack_color(colors)
+
+        x, y, z = coords.T
+        self.visible[x, y, z] = True
+        self.colors[x, y, z] = colors.reshape(-1, 4)
+        self._changed(coords)
+
+    def write_voxels(self, coords, visible, colors):
+        '''
+        Bulk write of visibility (N,) and packed colors (N, 4) uint8 of cells (N, 3),
+        in one scatter. Cells should be unique.
+        '''
+        coords = np.asarray(coords, dtype=np.intp).reshape(-1, 3)
+        x, y, z = coords.T
+        self.visible[x, y, z] = visible
+        self.colors[x, y, z] = np.asarray(colors, dtype=np.uint8).reshape(-1, 4)
+        self._changed(coords)
+
+    def copy(self):
+        grid = VoxelGrid(self.size)
+        grid.visible[...] = self.visible
+        grid.colors[...] = self.colors
+        return grid
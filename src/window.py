@@ -4,6 +4,8 @@ from OpenGL.GL import *
 from OpenGL.GL.shaders import compileShader, compileProgram
 
 from cube import Cube
+from gl_state import ShaderProgram, state
+from camera import Camera, CameraBuffer, CAMERA_BLOCK, CAMERA_BINDING, CAMERA_BLOCK_GLSL
 from scene_manager import SceneManager
 from typing import Optional, List, Any
 import numpy as np
@@ -19,15 +21,23 @@ class Window:
         
         self.delta_time = 0.0
         
+        # Frame statistics (F3 shows them in the window title)
+        self.title = ""
+        self.show_stats = False
+        self.frame_stats = {}
+        self.stats_time = 0.0
+        
+        # Startup timing, reported after the first frame (see startup.py)
+        self.startup_profile = None
+        
         # Objects
         self.target_cube: Optional[Cube] = None
         self.scene_manager = SceneManager()
         
-        # Camera
-        self.cam_front = np.array([0., 0., -1.])
+        # Camera (matrices cached until it moves, shared with the shaders through a uniform buffer)
+        self.camera = Camera(position=(0., 0., 2.), yaw=-90., pitch=0., fov=67.0, width=width, height=height)
+        self.camera_buffer = None
         self.cam_speed, self.cam_yaw_speed = 10., 30.
-        self.cam_pos = np.array([0., 0., 2.])
-        self.cam_yaw, self.cam_pitch = -90., 0.
         self.last_x, self.last_y = self.WIDTH / 2, self.HEIGHT / 2
         
         # Mouse
@@ -46,6 +56,7 @@ class Window:
     def redimensionCallback(self, window, w, h):
         self.WIDTH = w
         self.HEIGHT = h
+        self.camera.resize(w, h)
     
     def mouseCallback(self, window, xpos, ypos):
         if self.first_mouse:
@@ -60,8 +71,7 @@ class Window:
         xoffset *= sensitivity
         yoffset *= sensitivity
         
-        self.cam_yaw += xoffset
-        self.cam_pitch += yoffset
+        self.camera.rotate(xoffset, yoffset)
     
     def mouseButtonCallback(self, window, button, action, mods):
         if action == glfw.PRESS:
@@ -97,6 +107,40 @@ class Window:
             elif key == glfw.KEY_5: # White
                 if self.target_cube: self.target_cube.paint_selected_voxel(1.0, 1.0, 1.0)
 
+            # --- Render mode: instanced cubes / greedy mesh (G) ---
+            elif key == glfw.KEY_G:
+                if self.target_cube: self.target_cube.toggle_render_mode()
+
+            # --- Sparse voxel octree index (O) ---
+            elif key == glfw.KEY_O:
+                if self.target_cube: self.target_cube.toggle_octree()
+
+            # --- Skip voxels enclosed by solid neighbors (I) ---
+            elif key == glfw.KEY_I:
+                if self.target_cube: self.target_cube.toggle_occlusion()
+
+            # --- Level of detail on/off (V) and its debug colors (F4) ---
+            elif key == glfw.KEY_V:
+                if self.target_cube: self.target_cube.toggle_lod()
+
+            elif key == glfw.KEY_F4:
+                if self.target_cube: self.target_cube.toggle_lod_debug()
+
+            # --- Frame statistics (F3) ---
+            elif key == glfw.KEY_F3:
+                self.show_stats = not self.show_stats
+                if not self.show_stats:
+                    glfw.set_window_title(self.window, self.title)
+
+            # --- Undo (Ctrl+Z) / Redo (Ctrl+Y or Ctrl+Shift+Z) ---
+            elif key == glfw.KEY_Z and mods & glfw.MOD_CONTROL:
+                if self.target_cube:
+                    if mods & glfw.MOD_SHIFT: self.target_cube.redo()
+                    else: self.target_cube.undo()
+
+            elif key == glfw.KEY_Y and mods & glfw.MOD_CONTROL:
+                if self.target_cube: self.target_cube.redo()
+
             # --- SAVE (K) ---
             elif key == glfw.KEY_K:
                 if self.target_cube:
@@ -115,28 +159,22 @@ class Window:
         Maybe this can be moved to the keyCallback method
         '''
         speed = self.cam_speed * self.delta_time
-        
-        foward = np.array([
-            np.cos(np.radians(self.cam_yaw)) * np.cos(np.radians(self.cam_pitch)),
-            np.sin(np.radians(self.cam_pitch)),
-            np.sin(np.radians(self.cam_yaw)) * np.cos(np.radians(self.cam_pitch))
-        ])
-        foward /= np.linalg.norm(foward)
-        
-        right = np.cross(foward, np.array([0.0, 1.0, 0.0]))
-        right /= np.linalg.norm(right)
+        foward, right = self.camera.front, self.camera.right # cached until the camera turns
+        offset = np.zeros(3)
         
         # W/S
         if glfw.get_key(self.window, glfw.KEY_W) == glfw.PRESS:
-            self.cam_pos += foward * speed
+            offset += foward * speed
         if glfw.get_key(self.window, glfw.KEY_S) == glfw.PRESS:
-            self.cam_pos -= foward * speed
+            offset -= foward * speed
             
         # A/D
         if glfw.get_key(self.window, glfw.KEY_A) == glfw.PRESS:
-            self.cam_pos -= right * speed
+            offset -= right * speed
         if glfw.get_key(self.window, glfw.KEY_D) == glfw.PRESS:
-            self.cam_pos += right * speed
+            offset += right * speed
+        
+        self.camera.move(offset) # no-op (matrices kept) when no key is held
             
         if glfw.get_key(self.window, glfw.KEY_ESCAPE) == glfw.PRESS:
             glfw.set_window_should_close(self.window, True)
@@ -151,6 +189,7 @@ class Window:
         '''
         glfw.init()
         
+        self.title = name
         self.window = glfw.create_window(self.WIDTH, self.HEIGHT, name, None, None)
         if not self.window:
             glfw.terminate()
@@ -177,10 +216,35 @@ class Window:
         '''
         vertex_shader = """
             #version 400
+        """ + CAMERA_BLOCK_GLSL + """
             layout(location = 0) in vec3 vertex_posicao;
-            uniform mat4 transform, view, proj;
+            layout(location = 1) in vec4 vertex_cor;
+            // Per-instance attributes (Cube instanced rendering)
+            layout(location = 2) in vec3 instance_offset;
+            layout(location = 3) in float instance_scale;
+            layout(location = 4) in vec4 instance_color;
+            uniform mat4 transform;
+            uniform vec4 objColor;
+            uniform vec3 selectedCell;
+            uniform vec4 lodTint; // LOD debug: rgb mixed into the voxel colors by alpha
+            uniform int renderMode; // 0 = uniform transform/color, 1 = instanced, 2 = vertex color
+            out vec4 vertex_color;
             void main () {
-                gl_Position = proj*view*transform*vec4 (vertex_posicao, 1.0);
+                if (renderMode == 1) {
+                    vec3 world = instance_offset + vertex_posicao * instance_scale;
+                    gl_Position = view_proj*vec4 (world, 1.0);
+                    vertex_color = instance_color;
+                    if (instance_offset == selectedCell)
+                        vertex_color.rgb = min(vertex_color.rgb + 0.5, 1.0);
+                    vertex_color.rgb = mix(vertex_color.rgb, lodTint.rgb, lodTint.a);
+                } else if (renderMode == 2) {
+                    gl_Position = view_proj*vec4 (vertex_posicao, 1.0);
+                    vertex_color = vertex_cor;
+                    vertex_color.rgb = mix(vertex_color.rgb, lodTint.rgb, lodTint.a);
+                } else {
+                    gl_Position = view_proj*transform*vec4 (vertex_posicao, 1.0);
+                    vertex_color = objColor;
+                }
             }
         """
         
@@ -191,10 +255,10 @@ class Window:
             
         fragment_shader = """
             #version 400
+            in vec4 vertex_color;
             out vec4 frag_colour;
-            uniform vec4 objColor;
             void main () {
-                frag_colour = objColor;
+                frag_colour = vertex_color;
             }
         """
         
@@ -203,79 +267,25 @@ class Window:
             infoLog = glGetShaderInfoLog(fs, 512, None)
             print("Erro no fragment shader:\n", infoLog)
             
-        self.shader_program = compileProgram(vs, fs)
-        if not glGetProgramiv(self.shader_program, GL_LINK_STATUS):
-            infoLog = glGetProgramInfoLog(self.shader_program)
+        program = compileProgram(vs, fs)
+        if not glGetProgramiv(program, GL_LINK_STATUS):
+            infoLog = glGetProgramInfoLog(program)
             print("Erro no shader program:\n", infoLog)
+        # Uniform locations resolved once here; the Camera block reads the shared buffer
+        self.shader_program = ShaderProgram(program, blocks={CAMERA_BLOCK: CAMERA_BINDING})
+        self.camera_buffer = CameraBuffer()
         
         glDeleteShader(vs)
         glDeleteShader(fs)
         
         self.crosshairShaderInit()
     
-    def visualizationMatrixEsp(self):
-        '''
-        Define the view matrix (camera)
-        '''
-        front = np.array([
-            np.cos(np.radians(self.cam_yaw)) * np.cos(np.radians(self.cam_pitch)),
-            np.sin(np.radians(self.cam_pitch)),
-            np.sin(np.radians(self.cam_yaw)) * np.cos(np.radians(self.cam_pitch))
-        ])
-        front = front / np.linalg.norm(front + 1e-8)
-
-        center = self.cam_pos + front
-        up = np.array([0.0, 1.0, 0.0])
-
-        self.cam_front = front.copy()
-        
-        f = (center - self.cam_pos)
-        f = f / np.linalg.norm(f)
-        s = np.cross(f, up)
-        s = s / np.linalg.norm(s)
-        u = np.cross(s, f)
-
-        view = np.identity(4, dtype=np.float32)
-        view[0, :3] = s
-        view[1, :3] = u
-        view[2, :3] = -f
-        view[0, 3] = -np.dot(s, self.cam_pos)
-        view[1, 3] = -np.dot(u, self.cam_pos)
-        view[2, 3] = np.dot(f, self.cam_pos)
-
-        transformLoc = glGetUniformLocation(self.shader_program, "view")
-        glUniformMatrix4fv(transformLoc, 1, GL_TRUE, view)
-        
-        return view
-    
-    def projectionMatrixEsp(self):
+    def camInit(self):
         '''
-        Define the projection matrix (perspective)
+        Send view, projection and view-projection to the camera uniform buffer,
+        only when the camera moved or the window was resized since the last frame
         '''
-        znear = 0.1 #recorte z-near
-        zfar = 100.0 #recorte z-far
-        fov = np.radians(67.0) #campo de visão
-        aspecto = self.WIDTH/self.HEIGHT #aspecto
-
-        a = 1/(np.tan(fov/2)*aspecto)
-        b = 1/(np.tan(fov/2))
-        c = (zfar + znear) / (znear - zfar)
-        d = (2*znear*zfar) / (znear - zfar)
-        proj = np.array([
-            [a,   0.0, 0.0,  0.0],
-            [0.0, b,   0.0,  0.0],
-            [0.0, 0.0, c,    d],
-            [0.0, 0.0, -1.0, 1.0]
-        ])
-
-        transformLoc = glGetUniformLocation(self.shader_program, "proj")
-        glUniformMatrix4fv(transformLoc, 1, GL_TRUE, proj)
-    
-        return proj
-    
-    def camInit(self):
-        self.visualizationMatrixEsp()
-        self.projectionMatrixEsp()
+        self.camera_buffer.update(self.camera)
     
     # --------------------------------------------
     
@@ -307,7 +317,7 @@ class Window:
         ], dtype=np.float32)
         
         vao = glGenVertexArrays(1)
-        glBindVertexArray(vao)
+        state.bind_vertex_array(vao)
 
         vbo = glGenBuffers(1)
         glBindBuffer(GL_ARRAY_BUFFER, vbo)
@@ -316,7 +326,7 @@ class Window:
         glEnableVertexAttribArray(0)
         glVertexAttribPointer(0, 3, GL_FLOAT, GL_FALSE, 0, None)
         
-        glBindVertexArray(0)
+        state.bind_vertex_array(0)
         
         self.crosshair_vao = vao
         self.crosshair_vertex_count = len(vertices) // 3
@@ -346,7 +356,7 @@ class Window:
         vs = compileShader(vertex_shader, GL_VERTEX_SHADER)
         fs = compileShader(fragment_shader, GL_FRAGMENT_SHADER)
             
-        self.crosshair_shader_program = compileProgram(vs, fs)
+        self.crosshair_shader_program = ShaderProgram(compileProgram(vs, fs))
         
         glDeleteShader(vs)
         glDeleteShader(fs)
@@ -357,15 +367,31 @@ class Window:
         '''
         Draw the crosshair in the center of the screen.
         '''
-        glUseProgram(self.crosshair_shader_program)
+        self.crosshair_shader_program.use()
+        self.crosshair_shader_program.set("crosshairColor", (1.0, 0.0, 0.0, 1.0))
         
-        color = np.array([1.0, 0.0, 0.0, 1.0], dtype=np.float32)
-        colorLoc = glGetUniformLocation(self.crosshair_shader_program, "crosshairColor")
-        glUniform4fv(colorLoc, 1, color)
-        
-        glBindVertexArray(self.crosshair_vao)
+        state.bind_vertex_array(self.crosshair_vao)
+        state.set_polygon_mode(GL_FILL)
         glDrawArrays(GL_TRIANGLES, 0, self.crosshair_vertex_count)
-        glBindVertexArray(0)
+    
+    # --------------------------------------------
+    
+    # Statistics Methods -----------------------------
+    def updateFrameStats(self, current_time):
+        '''
+        Collect the counters of the frame just rendered and, when enabled (F3),
+        show them in the window title twice per second.
+        '''
+        stats = {'fps': round(1.0 / self.delta_time) if self.delta_time > 0 else 0}
+        if self.target_cube is not None:
+            stats.update(self.target_cube.frame_stats())
+        stats.update(state.stats) # state changes and uniform uploads sent vs. skipped
+        self.frame_stats = stats
+        
+        if self.show_stats and current_time - self.stats_time >= 0.5:
+            self.stats_time = current_time
+            text = "  ".join(f"{k}: {v}" for k, v in stats.items())
+            glfw.set_window_title(self.window, f"{self.title} | {text}")
     
     # --------------------------------------------
     
@@ -388,14 +414,18 @@ class Window:
             glClear(GL_DEPTH_BUFFER_BIT)
             
             glViewport(0, 0, self.WIDTH, self.HEIGHT)
-            glUseProgram(self.shader_program)
+            state.begin_frame()
+            self.shader_program.use()
             
             self.camInit()
             
             if self.target_cube is not None:
+                camera = self.camera
+                self.target_cube.set_view_projection(camera.view_proj, camera.position, camera.pixel_scale)
+                self.target_cube.update_streaming(camera.position)
                 self.target_cube.raycast_selection(
-                    cam_pos=self.cam_pos,
-                    cam_front=self.cam_front,
+                    cam_pos=camera.position,
+                    cam_front=camera.front,
                     max_distance=50.0
                 )
             
@@ -404,11 +434,26 @@ class Window:
                     self.shader_program = obj.render(self.shader_program)
             
             self.drawCrosshair()
+            self.updateFrameStats(current_time)
+            
+            # Results of background saves/loads (a loaded grid is swapped in here)
+            if self.target_cube is not None:
+                self.scene_manager.poll(self.target_cube)
+            
+            # Edit journal: batched writes and background compaction
+            if self.target_cube is not None and self.target_cube.journal is not None:
+                self.target_cube.journal.tick(self.target_cube.grid, self.target_cube.grid_space)
             
             glfw.swap_buffers(self.window)
             glfw.poll_events()
             
-            self.camMovement()
+            if self.startup_profile is not None:
+                self.startup_profile.first_frame()
+                self.startup_profile = None
             
+            self.camMovement()
+        
+        if self.target_cube is not None and self.target_cube.journal is not None:
+            self.target_cube.journal.close()
         glfw.terminate()
 
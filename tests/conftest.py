@@ -0,0 +1,29 @@
+'''
+    The modules live flat in src/ and import each other by name, as when the
+    program runs from that folder.
+'''
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+
+def fill_random(grid, fill=0.3, seed=0, translucent=0.0):
+    ''' Make a random fraction of the cells visible with random colors; returns the grid '''
+    rng = np.random.default_rng(seed)
+    size = grid.size
+    cells = np.argwhere(rng.random((size, size, size)) < fill)
+    colors = rng.integers(0, 256, (len(cells), 4), dtype=np.uint8)
+    colors[:, 3] = np.where(rng.random(len(cells)) < translucent, 128, 255)
+    grid.set_voxels(cells, colors)
+    return grid
+
+
+@pytest.fixture
+def random_grid():
+    from voxel_grid import VoxelGrid
+    return lambda size=16, **kwargs: fill_random(VoxelGrid(size), **kwargs)
@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+
+import camera
+from camera import Camera, CameraBuffer
+from gl_state import state
+
+
+def assert_fresh(cam):
+    ''' Cached values equal the ones of a camera built from scratch with the same pose '''
+    fresh = Camera(cam.position, cam.yaw, cam.pitch, cam.fov, cam.width, cam.height, cam.znear, cam.zfar)
+    for name in ("front", "right", "up", "view", "proj", "view_proj"):
+        assert np.allclose(getattr(cam, name), getattr(fresh, name), atol=1e-6), name
+    assert cam.pixel_scale == pytest.approx(fresh.pixel_scale)
+
+
+def test_version_changes_only_with_the_pose_or_projection():
+    cam = Camera()
+    version = cam.version
+    cam.move(np.zeros(3))
+    cam.rotate(0, 0)
+    cam.resize(cam.width, cam.height)
+    _ = cam.view_proj, cam.front, cam.pixel_scale # reading never changes it
+    assert cam.version == version
+
+    for change in (lambda: cam.move(np.array([0.0, 0.5, 0.0])),
+                   lambda: cam.rotate(10, 0),
+                   lambda: cam.rotate(0, -5),
+                   lambda: cam.resize(1024, 600)):
+        change()
+        assert cam.version > version
+        version = cam.version
+
+
+def test_cached_values_follow_changes():
+    cam = Camera(position=(1.0, 2.0, 3.0), yaw=-60.0, pitch=10.0)
+    assert_fresh(cam)
+    cam.move(np.array([0.5, -1.0, 2.0]))
+    assert_fresh(cam)
+    cam.rotate(35.0, -20.0)
+    assert_fresh(cam)
+    cam.resize(1280, 720)
+    assert_fresh(cam)
+
+
+def test_basis_is_orthonormal():
+    cam = Camera(yaw=123.0, pitch=-40.0)
+    basis = np.array([cam.front, cam.right, cam.up])
+    assert np.allclose(basis @ basis.T, np.identity(3), atol=1e-6)
+    assert cam.right[1] == pytest.approx(0.0) # no roll
+
+
+def test_view_moves_the_camera_to_the_origin():
+    cam = Camera(position=(4.0, -2.0, 7.0), yaw=30.0, pitch=15.0)
+    eye = cam.view @ np.append(cam.position, 1.0)
+    assert np.allclose(eye, (0, 0, 0, 1), atol=1e-5)
+    ahead = cam.view @ np.append(cam.position + cam.front, 1.0)
+    assert np.allclose(ahead, (0, 0, -1, 1), atol=1e-5) # the camera looks down -z
+
+
+def test_moved_position_is_a_new_array():
+    cam = Camera()
+    before = cam.position
+    cam.move(np.array([1.0, 0.0, 0.0]))
+    assert before.tolist() == [0.0, 0.0, 2.0]
+
+
+def test_minimized_window_keeps_a_finite_projection():
+    cam = Camera()
+    cam.resize(800, 0)
+    assert np.isfinite(cam.proj).all()
+
+
+@pytest.fixture
+def uploads(monkeypatch):
+    ''' CameraBuffer without a GL context: records the bytes written to the buffer '''
+    written = []
+    monkeypatch.setattr(camera, "glGenBuffers", lambda n: 1)
+    for name in ("glBindBuffer", "glBufferData", "glBindBufferBase"):
+        monkeypatch.setattr(camera, name, lambda *args: None)
+    monkeypatch.setattr(camera, "glBufferSubData", lambda target, offset, size, data: written.append(data.copy()))
+    return written
+
+
+def test_buffer_uploads_only_after_a_change(uploads):
+    cam = Camera()
+    buffer = CameraBuffer()
+    state.begin_frame()
+
+    buffer.update(cam)
+    assert len(uploads) == 1 and buffer.bytes_uploaded == 3 * 64
+    assert np.array_equal(uploads[0], np.concatenate([cam.view, cam.proj, cam.view_proj]))
+
+    # Nothing changed: the upload is skipped and counted as elided
+    buffer.update(cam)
+    buffer.update(cam)
+    assert len(uploads) == 1 and buffer.bytes_uploaded == 0
+    assert state.stats == {'gl_calls': 1, 'gl_elided': 2}
+
+    cam.rotate(5.0, 0.0)
+    buffer.update(cam)
+    assert len(uploads) == 2 and buffer.bytes_uploaded == 3 * 64
+    assert np.array_equal(uploads[1][8:], cam.view_proj) # rows of view, proj, view_proj
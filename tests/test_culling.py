@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+
+from culling import frustum_planes, boxes_in_frustum, region_bounds
+
+
+def perspective(fov=90.0, aspect=1.0, znear=0.1, zfar=100.0):
+    ''' Row-major projection, as the window builds it '''
+    b = 1 / np.tan(np.radians(fov) / 2)
+    return np.array([
+        [b / aspect, 0.0, 0.0, 0.0],
+        [0.0, b, 0.0, 0.0],
+        [0.0, 0.0, (zfar + znear) / (znear - zfar), 2 * znear * zfar / (znear - zfar)],
+        [0.0, 0.0, -1.0, 0.0],
+    ])
+
+
+def view_at(eye):
+    ''' Camera at eye looking down -z '''
+    view = np.identity(4)
+    view[:3, 3] = -np.asarray(eye, dtype=np.float64)
+    return view
+
+
+def in_clip_volume(view_proj, points):
+    ''' (N,) bool: points (N, 3) inside the frustum, tested in clip space '''
+    clip = np.c_[points, np.ones(len(points))] @ np.asarray(view_proj).T
+    w = clip[:, 3:]
+    return (np.abs(clip[:, :3]) <= w).all(axis=1) & (w[:, 0] > 0)
+
+
+# Camera at the origin looking down -z, 90° field of view: the frustum at depth d
+# spans -d..d in x and y
+VIEW_PROJ = perspective() @ view_at((0, 0, 0))
+
+
+@pytest.mark.parametrize("lo, hi, expected", [
+    ((-1, -1, -6), (1, 1, -4), True),       # inside
+    ((-1, -1, 2), (1, 1, 4), False),         # behind the camera
+    ((-1, -1, -200), (1, 1, -150), False),   # past the far plane
+    ((8, -1, -6), (10, 1, -4), False),       # right of the frustum
+    ((-1, 9, -6), (1, 11, -4), False),       # above it
+    ((4, -1, -6), (8, 1, -4), True),         # straddling the right plane
+    ((-1, -1, -1), (1, 1, 1), True),         # around the camera, crossing the near plane
+    ((-1, -1, -120), (1, 1, -90), True),     # straddling the far plane
+])
+def test_known_boxes(lo, hi, expected):
+    planes = frustum_planes(VIEW_PROJ)
+    assert boxes_in_frustum(planes, np.array([lo]), np.array([hi])).tolist() == [expected]
+
+
+def test_planes_are_normalized_and_face_inwards():
+    planes = frustum_planes(VIEW_PROJ)
+    assert np.allclose(np.linalg.norm(planes[:, :3], axis=1), 1.0)
+    # A point on the view axis is in front of every plane
+    assert (planes[:, :3] @ [0.0, 0.0, -5.0] + planes[:, 3] > 0).all()
+
+
+def test_never_culls_a_visible_box():
+    ''' Boxes with a sample point inside the frustum are always kept '''
+    rng = np.random.default_rng(0)
+    view_proj = perspective(fov=70.0, aspect=1.6, zfar=60.0) @ view_at((3.0, -2.0, 5.0))
+    lo = rng.uniform(-80, 80, (500, 3))
+    hi = lo + rng.uniform(0.5, 12, (500, 3))
+    kept = boxes_in_frustum(frustum_planes(view_proj), lo, hi)
+
+    t = rng.random((500, 200, 3))
+    samples = lo[:, None] + t * (hi - lo)[:, None]
+    visible = in_clip_volume(view_proj, samples.reshape(-1, 3)).reshape(500, 200).any(axis=1)
+    assert visible.any() and (~kept).any()
+    assert not (visible & ~kept).any()
+
+
+def test_region_bounds():
+    lo, hi = region_bounds([(0, 0, 0), (1, -1, 2)], 16)
+    assert lo.tolist() == [[-0.5, -0.5, -0.5], [15.5, -16.5, 31.5]]
+    assert (hi - lo == 16).all()
+
+
+def test_cube_culls_regions_the_same_way():
+    ''' The regions Cube.render keeps are the ones boxes_in_frustum keeps '''
+    Cube = pytest.importorskip("cube", exc_type=ImportError).Cube # typing.override: Python 3.12+
+    cube = Cube.__new__(Cube) # the culling needs no GL context, only the matrix
+    regions = np.array([(x, y, z) for x in range(-3, 3) for y in range(-3, 3) for z in range(-3, 3)])
+
+    cube.view_proj = None
+    assert cube._visible_regions(regions, 8).all()
+
+    cube.set_view_projection(VIEW_PROJ)
+    inside = cube._visible_regions(regions, 8)
+    lo, hi = region_bounds(regions, 8)
+    assert np.array_equal(inside, boxes_in_frustum(frustum_planes(VIEW_PROJ), lo, hi))
+    assert 0 < inside.sum() < len(regions)
+    assert cube.cull_stats == {
+        'regions_tested': len(regions),
+        'regions_culled': int((~inside).sum()),
+        'regions_drawn': int(inside.sum()),
+    }
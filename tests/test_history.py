@@ -0,0 +1,97 @@
+import numpy as np
+
+from chunked_grid import ChunkedGrid
+from history import EditDelta, EditHistory
+from voxel_grid import VoxelGrid
+from conftest import fill_random
+from test_scene_formats import assert_same_scene
+
+
+def edit(grid, history, cells, colors):
+    ''' A bulk edit recorded the way Cube does it: capture, write, complete, push '''
+    delta = EditDelta.capture(grid, cells)
+    grid.set_voxels(cells, colors)
+    history.push(delta.complete(grid))
+
+
+def random_edit(grid, history, rng, count=20):
+    cells = rng.integers(0, grid.size, (count, 3))
+    edit(grid, history, cells, rng.integers(0, 256, (count, 4), dtype=np.uint8))
+
+
+def test_undo_then_redo_restores_every_step():
+    rng = np.random.default_rng(0)
+    grid = fill_random(VoxelGrid(16), fill=0.2)
+    history = EditHistory()
+    states = [grid.copy()]
+    for _ in range(10):
+        random_edit(grid, history, rng)
+        states.append(grid.copy())
+
+    for expected in reversed(states[:-1]):
+        assert history.undo(grid) is not None
+        assert_same_scene(expected, grid)
+    assert history.undo(grid) is None
+
+    for expected in states[1:]:
+        assert history.redo(grid) is not None
+        assert_same_scene(expected, grid)
+    assert history.redo(grid) is None
+
+
+def test_duplicated_cells_are_restored_to_their_first_state():
+    grid = fill_random(VoxelGrid(8), fill=0.5)
+    before = grid.copy()
+    history = EditHistory()
+    cells = np.array([(1, 1, 1), (1, 1, 1), (2, 3, 4)])
+    edit(grid, history, cells, np.full((3, 4), 7, dtype=np.uint8))
+    history.undo(grid)
+    assert_same_scene(before, grid)
+
+
+def test_new_edit_discards_redo_steps():
+    rng = np.random.default_rng(1)
+    grid = VoxelGrid(8)
+    history = EditHistory()
+    random_edit(grid, history, rng)
+    random_edit(grid, history, rng)
+    history.undo(grid)
+    random_edit(grid, history, rng)
+    assert history.redo(grid) is None
+    assert history.stats['undo_steps'] == 2
+
+
+def test_edit_that_changes_nothing_is_not_recorded():
+    grid = VoxelGrid(8)
+    grid.set_voxel((1, 2, 3), (1.0, 0.0, 0.0, 1.0))
+    history = EditHistory()
+    edit(grid, history, np.array([(1, 2, 3)]), grid.colors_at([(1, 2, 3)]))
+    assert history.stats['undo_steps'] == 0
+
+
+def test_memory_limit_drops_oldest_steps_first():
+    rng = np.random.default_rng(2)
+    grid = VoxelGrid(16)
+    history = EditHistory(max_bytes=5 * 20 * 18) # about five 20-cell deltas
+    states = [grid.copy()]
+    for _ in range(20):
+        random_edit(grid, history, rng)
+        states.append(grid.copy())
+
+    assert history.nbytes <= history.max_bytes
+    steps = history.stats['undo_steps']
+    assert 0 < steps < 20
+    while history.undo(grid) is not None:
+        pass
+    assert_same_scene(states[-1 - steps], grid) # the oldest steps can no longer be undone
+
+
+def test_chunked_grid_undo_frees_the_chunks_it_created():
+    grid = ChunkedGrid(1024, chunk_size=16)
+    history = EditHistory()
+    edit(grid, history, np.array([(900, 900, 900), (5, 5, 5)]), np.full((2, 4), 255, dtype=np.uint8))
+    history.undo(grid)
+    assert grid.count == 0
+    assert not grid.chunks
+    history.redo(grid)
+    assert grid.count == 2
@@ -0,0 +1,142 @@
+import os
+
+import numpy as np
+import pytest
+
+import scene_formats
+from chunked_grid import ChunkedGrid
+from journal import EditJournal, OP_SET, OP_PAINT, OP_CLEAR, RECORD
+from paged_grid import open_paged
+from voxel_grid import VoxelGrid
+from conftest import fill_random
+from test_scene_formats import assert_same_scene
+
+
+def random_edits(grid, journal, count, seed=0):
+    ''' Edit the grid the way Cube does, recording every edit '''
+    rng = np.random.default_rng(seed)
+    for cell in rng.integers(0, grid.size, (count, 3)).tolist():
+        color = tuple(rng.random(4).round(2))
+        if grid.is_visible(cell):
+            if rng.random() < 0.5:
+                grid.clear_voxel(cell)
+                journal.record_voxel(OP_CLEAR, cell, (0, 0, 0, 0))
+            else:
+                grid.paint_voxel(cell, color)
+                journal.record_voxel(OP_PAINT, cell, grid.packed_color(cell))
+        else:
+            grid.set_voxel(cell, color)
+            journal.record_voxel(OP_SET, cell, grid.packed_color(cell))
+
+
+def start(folder, grid, space=1.0, **kwargs):
+    journal = EditJournal(str(folder), **kwargs)
+    assert journal.recover() is None
+    journal.reset(grid, space)
+    return journal
+
+
+def test_empty_folder_recovers_nothing(tmp_path):
+    assert EditJournal(str(tmp_path)).recover() is None
+
+
+def test_recovers_snapshot_plus_edits(tmp_path):
+    grid = fill_random(VoxelGrid(16), fill=0.1)
+    journal = start(tmp_path, grid)
+    random_edits(grid, journal, 200)
+    journal.record_space(1.3)
+    journal.close()
+
+    recovered, space = EditJournal(str(tmp_path)).recover()
+    assert space == pytest.approx(1.3)
+    assert_same_scene(grid, recovered)
+
+
+def test_bulk_records(tmp_path):
+    grid = fill_random(VoxelGrid(16), fill=0.1)
+    journal = start(tmp_path, grid)
+    cells = np.argwhere(np.ones((4, 4, 4), dtype=bool)) + 2
+    visible = np.arange(len(cells)) % 3 != 0
+    colors = np.full((len(cells), 4), (10, 20, 30, 255), dtype=np.uint8)
+    grid.write_voxels(cells, visible, colors)
+    journal.record_cells(cells, visible, colors)
+    journal.close()
+
+    assert_same_scene(grid, EditJournal(str(tmp_path)).recover()[0])
+
+
+def test_recovers_across_compactions(tmp_path):
+    grid = fill_random(VoxelGrid(16), fill=0.1)
+    journal = start(tmp_path, grid, flush_records=1, compact_bytes=20 * RECORD.size)
+    for round_ in range(5):
+        random_edits(grid, journal, 50, seed=round_)
+        journal.tick(grid, 1.0) # starts a compaction once the edits file is large enough
+    journal.close()
+    assert journal.stats['compactions'] > 1
+
+    assert_same_scene(grid, EditJournal(str(tmp_path)).recover()[0])
+
+
+def test_save_during_compaction_of_a_paged_scene(tmp_path):
+    path = str(tmp_path / "mundo.vxc")
+    scene_formats.save_scene(path, fill_random(ChunkedGrid(64, chunk_size=16), fill=0.05), 1.0)
+    grid, space = open_paged(path, max_resident=2)
+    journal = start(tmp_path / "journal", grid, space)
+    random_edits(grid, journal, 100)
+
+    # The compaction reads unchanged chunks from the file the save replaces
+    journal.compact(grid, space)
+    snapshot = grid.copy()
+    scene_formats.save_scene(path, snapshot, space)
+    grid.mark_saved(snapshot.pinned, path)
+    random_edits(grid, journal, 50, seed=1)
+    journal.close()
+
+    recovered, _ = EditJournal(str(tmp_path / "journal")).recover()
+    assert_same_scene(grid.copy(), recovered.copy())
+
+
+def test_paged_scene_recovers_paged(tmp_path):
+    path = str(tmp_path / "mundo.vxc")
+    scene_formats.save_scene(path, fill_random(ChunkedGrid(64, chunk_size=16), fill=0.05), 1.0)
+    grid, space = open_paged(path, max_resident=2)
+    journal = start(tmp_path / "journal", grid, space, flush_records=1, compact_bytes=20 * RECORD.size)
+    for round_ in range(3):
+        random_edits(grid, journal, 30, seed=round_)
+        journal.tick(grid, space)
+    journal.close()
+
+    recovered, _ = EditJournal(str(tmp_path / "journal")).recover()
+    assert recovered.paged
+    # Only the chunks holding replayed edits were read
+    assert set(recovered.chunks) <= set(recovered.pinned)
+    assert_same_scene(grid.copy(), recovered.copy())
+
+
+def test_partial_last_record_is_ignored(tmp_path):
+    grid = fill_random(VoxelGrid(16), fill=0.1)
+    journal = start(tmp_path, grid)
+    random_edits(grid, journal, 30)
+    journal.close()
+
+    # A crash in the middle of a write leaves part of a record behind
+    edits = sorted(name for name in os.listdir(tmp_path) if name.startswith("edits-"))
+    with open(tmp_path / edits[-1], "ab") as f:
+        f.write(RECORD.pack(OP_CLEAR, 0, 0, 0, b"\0\0\0\0")[:7])
+
+    assert_same_scene(grid, EditJournal(str(tmp_path)).recover()[0])
+
+
+def test_reset_discards_edits_of_the_previous_scene(tmp_path):
+    grid = fill_random(VoxelGrid(16), fill=0.1)
+    journal = start(tmp_path, grid)
+    random_edits(grid, journal, 30)
+
+    loaded = fill_random(VoxelGrid(16), fill=0.2, seed=9) # a scene loaded from a file
+    journal.reset(loaded, 2.0)
+    random_edits(loaded, journal, 30, seed=10)
+    journal.close()
+
+    recovered, space = EditJournal(str(tmp_path)).recover()
+    assert space == pytest.approx(2.0)
+    assert_same_scene(loaded, recovered)
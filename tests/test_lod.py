@@ -0,0 +1,149 @@
+import numpy as np
+import pytest
+
+from chunked_grid import ChunkedGrid
+from lod import VoxelMips, REBUILD_THRESHOLD, downsample, select_levels, level_positions
+from voxel_grid import VoxelGrid
+from conftest import fill_random
+
+
+@pytest.fixture(params=["dense", "chunked"])
+def grid(request):
+    if request.param == "dense":
+        return fill_random(VoxelGrid(32), fill=0.4, seed=3, translucent=0.1)
+    return fill_random(ChunkedGrid(32, chunk_size=8), fill=0.4, seed=3, translucent=0.1)
+
+
+def assert_same_mips(mips, fresh):
+    assert mips.levels.keys() == fresh.levels.keys()
+    for region, levels in fresh.levels.items():
+        for (visible, colors), (expected_visible, expected_colors) in zip(mips.levels[region], levels):
+            assert np.array_equal(visible, expected_visible), region
+            assert np.array_equal(colors[visible], expected_colors[expected_visible]), region
+
+
+def test_downsample_averages_occupied_voxels():
+    visible = np.zeros((2, 2, 2), dtype=bool)
+    colors = np.zeros((2, 2, 2, 4), dtype=np.uint8)
+    visible[0, 0, 0] = visible[1, 1, 1] = True
+    colors[0, 0, 0] = (10, 20, 30, 255)
+    colors[1, 1, 1] = (20, 40, 61, 255)
+    colors[0, 1, 0] = (200, 200, 200, 255) # not visible: ignored
+
+    occupied, averaged = downsample(visible, colors, 2)
+    assert occupied.shape == (1, 1, 1) and occupied[0, 0, 0]
+    assert averaged[0, 0, 0].tolist() == [15, 30, 46, 255]
+
+
+def test_level_positions_are_cell_centers():
+    # Level 1 cell (1, 0, 0) covers voxels 2..3 in x: its center is at 2.5
+    assert level_positions([(1, 0, 0)], 1).tolist() == [[2.5, 0.5, 0.5]]
+
+
+def test_single_edits_match_rebuild(grid):
+    mips = VoxelMips(grid, 16)
+    rng = np.random.default_rng(5)
+    for _ in range(60):
+        cell = tuple(int(v) for v in rng.integers(0, grid.size, 3))
+        action = rng.integers(3)
+        if action == 0:
+            grid.set_voxel(cell, (*rng.random(3), 1.0))
+        elif action == 1:
+            grid.clear_voxel(cell)
+        else:
+            # Repainting translucent takes the voxel out of the pyramid
+            grid.paint_voxel(cell, (*rng.random(3), rng.choice([0.5, 1.0])))
+
+    assert mips.take_dirty() is None # built in the constructor
+    assert_same_mips(mips, VoxelMips(grid.copy(), 16))
+
+
+def test_edits_mark_regions_dirty(grid):
+    mips = VoxelMips(grid, 16)
+    mips.take_dirty()
+    grid.set_voxel((1, 1, 1), (0.1, 0.2, 0.3, 1.0))
+    grid.clear_voxel((20, 1, 1))
+    assert mips.take_dirty() == {(0, 0, 0), (1, 0, 0)}
+    assert mips.take_dirty() == set()
+
+
+def test_bulk_edits_match_rebuild(grid):
+    mips = VoxelMips(grid, 16)
+    mips.take_dirty()
+    rng = np.random.default_rng(6)
+    cells = rng.integers(0, grid.size, (300, 3))
+    colors = rng.integers(0, 256, (300, 4), dtype=np.uint8)
+    colors[:, 3] = 255
+    grid.set_voxels(cells, colors)
+    assert_same_mips(mips, VoxelMips(grid.copy(), 16))
+
+
+def test_emptied_region_is_dropped():
+    grid = VoxelGrid(32)
+    grid.set_voxel((20, 20, 20), (0.2, 0.4, 0.6, 1.0))
+    mips = VoxelMips(grid, 16)
+    assert list(mips.levels) == [(1, 1, 1)]
+    grid.clear_voxel((20, 20, 20))
+    assert mips.levels == {}
+    coords, colors = mips.cells((1, 1, 1), 1)
+    assert coords.shape == (0, 3) and colors.shape == (0, 4)
+
+
+def test_cells_are_in_level_coordinates():
+    grid = VoxelGrid(32)
+    grid.set_voxel((20, 21, 22), (0.2, 0.4, 0.6, 1.0))
+    mips = VoxelMips(grid, 16)
+    for level in range(1, mips.max_level + 1):
+        coords, colors = mips.cells((1, 1, 1), level)
+        assert coords.tolist() == [[20 >> level, 21 >> level, 22 >> level]]
+        assert colors.tolist() == [[51, 102, 153, 255]]
+
+
+def test_levels_stop_where_the_region_cannot_be_halved():
+    assert VoxelMips(VoxelGrid(8), 16).max_level == 3
+    assert VoxelMips(VoxelGrid(8), 4).max_level == 2
+    assert VoxelMips(VoxelGrid(8), 6).max_level == 1
+
+
+def test_detach_stops_updates():
+    grid = VoxelGrid(16)
+    mips = VoxelMips(grid, 16)
+    mips.detach()
+    grid.set_voxel((1, 1, 1), (0.2, 0.4, 0.6, 1.0))
+    assert mips.levels == {}
+
+
+def test_selected_level_error_within_threshold():
+    rng = np.random.default_rng(7)
+    lo = rng.uniform(-200, 200, (400, 3))
+    hi = lo + 16
+    cam_pos = np.array([1.0, 2.0, 3.0])
+    pixel_scale, max_error = 600.0, 8.0
+    levels = select_levels(lo, hi, cam_pos, pixel_scale, max_error)
+
+    distance = np.linalg.norm(np.clip(cam_pos, lo, hi) - cam_pos, axis=1)
+    def error(level):
+        ''' Pixels covered by the geometric error of a level (2^l - 1 voxels) '''
+        return ((1 << level) - 1) * pixel_scale / np.maximum(distance, 1e-6)
+
+    assert set(levels.tolist()) > {0} # far regions got coarser
+    # The chosen level stays within the threshold, the next one would not (unless capped)
+    assert (error(levels) <= max_error + 1e-9).all()
+    assert (error(levels + 1)[levels < 3] > max_error).all()
+
+
+def test_camera_inside_a_region_draws_it_at_full_detail():
+    levels = select_levels(np.array([[0.0, 0.0, 0.0]]), np.array([[16.0, 16.0, 16.0]]),
+                           (8.0, 8.0, 8.0), 600.0, 8.0)
+    assert levels.tolist() == [0]
+
+
+def test_many_regions_rebuild(grid):
+    mips = VoxelMips(grid, 4)
+    mips.take_dirty()
+    # One voxel in more regions than the threshold: rebuilt, everything dirty
+    cells = np.argwhere(np.ones((grid.size // 4,) * 3, dtype=bool)) * 4
+    assert len(cells) > REBUILD_THRESHOLD
+    grid.set_voxels(cells, np.full((len(cells), 4), 255, dtype=np.uint8))
+    assert mips.take_dirty() is None
+    assert_same_mips(mips, VoxelMips(grid.copy(), 4))
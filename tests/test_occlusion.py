@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+
+from chunked_grid import ChunkedGrid
+from occlusion import NeighborCounts
+from voxel_grid import VoxelGrid
+from conftest import fill_random
+
+
+def expected_hidden(grid):
+    ''' (size, size, size) bool: opaque cells with 6 opaque neighbors, from a dense copy '''
+    visible, colors = grid.region((-1, -1, -1), (grid.size + 2,) * 3)
+    solid = visible & (colors[..., 3] == 255)
+    inner = solid[1:-1, 1:-1, 1:-1]
+    return (inner & solid[2:, 1:-1, 1:-1] & solid[:-2, 1:-1, 1:-1] & solid[1:-1, 2:, 1:-1]
+            & solid[1:-1, :-2, 1:-1] & solid[1:-1, 1:-1, 2:] & solid[1:-1, 1:-1, :-2])
+
+
+def assert_counts_match(grid):
+    expected = expected_hidden(grid)
+    cells = np.argwhere(np.ones(expected.shape, dtype=bool))
+    assert np.array_equal(grid.occlusion.hidden(cells), expected.ravel())
+    assert grid.occlusion.stats()['hidden_voxels'] == int(np.count_nonzero(expected))
+
+
+def dense_grid(size=16, seed=0):
+    return fill_random(VoxelGrid(size), fill=0.8, seed=seed, translucent=0.05)
+
+
+def chunked_grid(size=32, seed=0):
+    return fill_random(ChunkedGrid(size, chunk_size=8), fill=0.8, seed=seed, translucent=0.05)
+
+
+@pytest.fixture(params=[dense_grid, chunked_grid], ids=["dense", "chunked"])
+def grid(request):
+    grid = request.param()
+    grid.build_occlusion()
+    return grid
+
+
+def test_counts_after_build(grid):
+    assert_counts_match(grid)
+
+
+def test_single_edits(grid):
+    rng = np.random.default_rng(1)
+    for i, cell in enumerate(rng.integers(0, grid.size, (300, 3)).tolist()):
+        choice = i % 3
+        if choice == 0:
+            grid.set_voxel(cell, (1.0, 1.0, 1.0, 1.0))
+        elif choice == 1:
+            grid.clear_voxel(cell)
+        elif grid.is_visible(cell): # opaque <-> translucent flips solidity
+            grid.paint_voxel(cell, (0.5, 0.5, 0.5, 0.5 if rng.random() < 0.5 else 1.0))
+    assert_counts_match(grid)
+
+
+def write_unique(grid, cells, visible, colors):
+    ''' write_voxels wants unique cells: keep the first row of each '''
+    _, first = np.unique(grid.flat_index(cells), return_index=True)
+    grid.write_voxels(cells[first], visible[first], colors[first])
+
+
+def test_bulk_edits(grid):
+    rng = np.random.default_rng(2)
+    for _ in range(5):
+        cells = rng.integers(0, grid.size, (500, 3))
+        colors = rng.integers(0, 256, (500, 4), dtype=np.uint8)
+        colors[:, 3] = np.where(rng.random(500) < 0.1, 128, 255)
+        write_unique(grid, cells, rng.random(500) < 0.6, colors)
+    assert_counts_match(grid)
+
+
+def test_edits_past_the_rebuild_threshold(grid):
+    grid.occlusion.rebuild_threshold = 100
+    cells = np.argwhere(np.ones((grid.size,) * 3, dtype=bool))[::3]
+    grid.write_voxels(cells, np.zeros(len(cells), dtype=bool), np.zeros((len(cells), 4), dtype=np.uint8))
+    assert_counts_match(grid)
+
+
+def test_solid_block_hides_only_its_interior():
+    grid = VoxelGrid(8)
+    grid.build_occlusion()
+    grid.set_voxels(np.argwhere(np.ones((5, 5, 5), dtype=bool)) + 1, np.full((125, 4), 255, dtype=np.uint8))
+    assert grid.occlusion.stats()['hidden_voxels'] == 27
+    assert grid.is_enclosed((3, 3, 3))
+    assert not grid.is_enclosed((1, 3, 3))
+
+    grid.clear_voxel((1, 3, 3)) # opens the face of one interior voxel
+    assert not grid.is_enclosed((2, 3, 3))
+    assert grid.occlusion.stats()['hidden_voxels'] == 26
+
+
+def test_dropping_the_index_stops_updates(grid):
+    occlusion = grid.occlusion
+    grid.drop_occlusion()
+    before = occlusion.hidden_count
+    grid.write_voxels(np.argwhere(np.ones((4, 4, 4), dtype=bool)), True, np.full((64, 4), 255, dtype=np.uint8))
+    assert occlusion.hidden_count == before
+    assert grid.occlusion is None and isinstance(occlusion, NeighborCounts)
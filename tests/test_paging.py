@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+
+import scene_formats
+from chunked_grid import ChunkedGrid
+from paged_grid import open_paged
+from conftest import fill_random
+
+# Camera path across a 64³ world of 16³ chunks: chunks are paged in and evicted
+CAMERA_PATH = [(8, 8, 8), (24, 8, 8), (40, 8, 8), (40, 24, 8), (40, 40, 24), (56, 56, 56), (8, 8, 8)]
+
+
+@pytest.fixture
+def paged(tmp_path):
+    path = str(tmp_path / "mundo.vxc")
+    scene_formats.save_scene(path, fill_random(ChunkedGrid(64, chunk_size=16), fill=0.4, translucent=0.1), 1.0)
+    return open_paged(path, max_resident=4)[0]
+
+
+def test_paging_is_not_an_edit(paged):
+    heard = []
+    paged.add_listener(lambda cells: heard.append((paged.paging, len(cells))))
+
+    for position in CAMERA_PATH:
+        paged.update_residency(position)
+    assert paged.stats['paged_in'] and paged.stats['evicted']
+    assert paged.generation == 0 and not paged.pinned
+    assert paged.residency == paged.stats['paged_in'] + paged.stats['evicted'] == len(heard)
+    # Each notification names its chunk and carries that chunk's cells only
+    assert all(key is not None and count <= 16 ** 3 for key, count in heard)
+    assert paged.paging is None
+
+    paged.set_voxel((1, 1, 1), (1.0, 0.0, 0.0, 1.0))
+    assert heard[-1][0] is None and paged.generation == 1
+    assert list(paged.pinned) == [(0, 0, 0)]
+
+
+@pytest.fixture
+def headless_gl(monkeypatch):
+    ''' Every GL call of the renderer becomes a no-op, so Cube can build its buffers '''
+    import gl_state, instance_buffer, mesher, object
+    for module in (gl_state, instance_buffer, mesher, object):
+        for name in dir(module):
+            if name.startswith("gl") and callable(getattr(module, name)):
+                monkeypatch.setattr(module, name, lambda *args, **kwargs: 1)
+
+
+def instance_records(cube):
+    ''' {region: {key: record bytes}} of the opaque buffers, and {key: record bytes} of the translucent one '''
+    def records(buffer):
+        return {int(k): buffer.data[i].tobytes() for i, k in enumerate(buffer.keys[:buffer.count].tolist())}
+    opaque = {region: records(buffer) for region, buffer in cube.instances.buffers.items() if buffer.count}
+    return opaque, records(cube.translucent)
+
+
+def test_cube_rebuilds_paged_regions_only(paged, headless_gl, monkeypatch):
+    Cube = pytest.importorskip("cube", exc_type=ImportError).Cube # typing.override: Python 3.12+
+    import cube as cube_module
+    cube = Cube(3)
+    cube.draw()
+    cube.set_grid(paged)
+    uploaded = {}
+    cube.mesh.upload = lambda vertices, colors: uploaded.update(vertices=vertices, colors=colors)
+    cube._update_instances()
+    cube._update_mesh()
+
+    meshed = []
+    def counting_mesh_storage(grid, region_size, translucent=False, regions=None):
+        meshed.append(len(regions))
+        return mesh_storage(grid, region_size, translucent, regions)
+    mesh_storage = cube_module.mesh_storage
+    monkeypatch.setattr(cube_module, "mesh_storage", counting_mesh_storage)
+
+    remeshed = 0
+    for position in CAMERA_PATH:
+        paged.update_residency(position)
+        assert not cube._dirty_all and not cube._dirty_cells
+        paged_regions = len(cube._mesh_dirty_regions)
+        cube._update_instances()
+        cube._update_mesh()
+        assert all(count <= paged_regions for count in meshed) # never the whole world
+        remeshed += sum(meshed)
+        meshed.clear()
+
+        # Same buffers and mesh as a rebuild from scratch
+        incremental, mesh, quads = instance_records(cube), dict(uploaded), cube._translucent_quads
+        cube._dirty_all = True
+        cube._update_instances()
+        assert instance_records(cube) == incremental
+        cube._mesh_key = None
+        cube._update_mesh()
+        assert np.array_equal(uploaded['vertices'], mesh['vertices'])
+        assert np.array_equal(uploaded['colors'], mesh['colors'])
+        assert all(np.array_equal(a, b) for a, b in zip(cube._translucent_quads, quads))
+        meshed.clear()
+    assert remeshed
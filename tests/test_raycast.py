@@ -0,0 +1,142 @@
+import numpy as np
+import pytest
+
+from chunked_grid import ChunkedGrid
+from raycast import box_entry
+from voxel_grid import VoxelGrid
+from conftest import fill_random
+
+
+def brute_force_pick(grid, origin, direction, max_distance):
+    ''' Slab test against every visible voxel: (cell, distance) of the nearest hit, or None '''
+    best = None
+    for cell in map(tuple, grid.visible_cells()[0].tolist()):
+        center = np.asarray(cell, dtype=float)
+        hit = box_entry(origin, direction, center - 0.5, center + 0.5, max_distance)
+        if hit is not None and (best is None or hit[0] < best[1]):
+            best = cell, hit[0]
+    return best
+
+
+def random_rays(size, count, seed=1):
+    ''' Rays from around the grid towards random points inside it '''
+    rng = np.random.default_rng(seed)
+    origins = rng.uniform(-4, size + 4, (count, 3))
+    directions = rng.uniform(0, size - 1, (count, 3)) - origins
+    directions /= np.linalg.norm(directions, axis=1, keepdims=True)
+    return origins, directions
+
+
+def assert_same_hit(found, expected, distance=None):
+    if expected is None:
+        assert found is None
+    else:
+        assert found is not None
+        assert tuple(found) == expected[0]
+        assert distance == pytest.approx(expected[1], abs=1e-6)
+
+
+def test_traversal_matches_brute_force(random_grid):
+    grid = random_grid(12, fill=0.05)
+    for origin, direction in zip(*random_rays(grid.size, 300)):
+        hit = grid.raycast(origin, direction, max_distance=30.0)
+        expected = brute_force_pick(grid, origin, direction, 30.0)
+        assert_same_hit(hit and hit.cell, expected, hit and hit.distance)
+
+
+def test_traversal_respects_max_distance(random_grid):
+    grid = random_grid(12, fill=0.02)
+    for origin, direction in zip(*random_rays(grid.size, 200, seed=2)):
+        hit = grid.raycast(origin, direction, max_distance=5.0)
+        expected = brute_force_pick(grid, origin, direction, 5.0)
+        assert_same_hit(hit and hit.cell, expected, hit and hit.distance)
+
+
+def test_adjacent_cell_is_empty_and_in_front_of_the_face(random_grid):
+    grid = random_grid(12, fill=0.1)
+    for origin, direction in zip(*random_rays(grid.size, 200, seed=3)):
+        hit = grid.raycast(origin, direction, max_distance=30.0)
+        if hit is None or hit.adjacent is None:
+            continue
+        assert not grid.is_visible(hit.adjacent)
+        assert np.array_equal(np.subtract(hit.adjacent, hit.cell), hit.normal)
+
+
+def test_batch_matches_single_rays(random_grid):
+    grid = random_grid(16, fill=0.05)
+    origins, directions = random_rays(grid.size, 500, seed=4)
+    hits = grid.raycast_batch(origins, directions, max_distance=30.0)
+    for i, (origin, direction) in enumerate(zip(origins, directions)):
+        single = grid.raycast(origin, direction, max_distance=30.0)
+        if single is None:
+            assert not hits.hit[i]
+        else:
+            assert tuple(hits.cells[i]) == single.cell
+            assert hits.distances[i] == pytest.approx(single.distance, abs=1e-6)
+            assert tuple(hits.normals[i]) == single.normal
+
+
+def test_octree_matches_traversal(random_grid):
+    grid = random_grid(16, fill=0.05)
+    rays = list(zip(*random_rays(grid.size, 300, seed=5)))
+    expected = [grid.raycast(o, d, max_distance=30.0) for o, d in rays]
+
+    grid.build_octree()
+    for (origin, direction), plain in zip(rays, expected):
+        hit = grid.raycast(origin, direction, max_distance=30.0)
+        assert (hit is None) == (plain is None)
+        if hit is not None:
+            assert hit.cell == plain.cell
+            assert hit.distance == pytest.approx(plain.distance, abs=1e-6)
+
+
+def test_octree_follows_edits(random_grid):
+    grid = random_grid(16, fill=0.05)
+    grid.build_octree()
+    rng = np.random.default_rng(6)
+    for cell in rng.integers(0, grid.size, (50, 3)).tolist():
+        if grid.is_visible(cell):
+            grid.clear_voxel(cell)
+        else:
+            grid.set_voxel(cell, (1.0, 0.0, 0.0, 1.0))
+
+    for origin, direction in zip(*random_rays(grid.size, 200, seed=7)):
+        hit = grid.raycast(origin, direction, max_distance=30.0)
+        expected = brute_force_pick(grid, origin, direction, 30.0)
+        assert_same_hit(hit and hit.cell, expected, hit and hit.distance)
+
+
+def test_chunked_grid_picks_like_dense(random_grid):
+    dense = random_grid(32, fill=0.02)
+    chunked = fill_random(ChunkedGrid(32, chunk_size=8), fill=0.02)
+    for origin, direction in zip(*random_rays(32, 200, seed=8)):
+        a = dense.raycast(origin, direction, max_distance=60.0)
+        b = chunked.raycast(origin, direction, max_distance=60.0)
+        assert (a is None) == (b is None)
+        if a is not None:
+            assert a.cell == b.cell
+
+
+@pytest.mark.parametrize("sparse", [False, True])
+def test_cube_picks_the_same_cells_with_the_octree(sparse):
+    Cube = pytest.importorskip("cube", exc_type=ImportError).Cube # typing.override: Python 3.12+
+    cube = Cube(3)
+    grid = fill_random(ChunkedGrid(16, chunk_size=8) if sparse else VoxelGrid(16), fill=0.05, seed=9)
+    cube.set_grid(grid)
+
+    def picks():
+        found = []
+        for origin, direction in zip(*random_rays(grid.size, 200, seed=10)):
+            cube.raycast_selection(origin, direction, max_distance=30.0)
+            found.append((cube.selection_x, cube.selection_y, cube.selection_z,
+                          cube.selection_normal, cube.selection_adjacent))
+        return found
+
+    expected = picks()
+    cube.toggle_octree()
+    walked = []
+    octree_raycast = grid.octree.raycast
+    grid.octree.raycast = lambda *args: walked.append(args) or octree_raycast(*args)
+    assert picks() == expected
+    # Sparse worlds pick through the octree; in a dense grid every cell is selectable
+    assert bool(walked) == sparse
@@ -0,0 +1,132 @@
+import os
+
+import numpy as np
+import pytest
+
+import scene_formats
+from chunked_grid import ChunkedGrid
+from paged_grid import open_paged
+from voxel_grid import VoxelGrid
+from conftest import fill_random
+
+
+def scene(grid):
+    ''' (coords, colors) of the visible voxels, in a canonical order '''
+    coords, colors = grid.visible_cells()
+    order = np.lexsort(coords.T[::-1])
+    return coords[order], colors[order]
+
+
+def assert_same_scene(a, b):
+    assert a.size == b.size
+    coords_a, colors_a = scene(a)
+    coords_b, colors_b = scene(b)
+    assert np.array_equal(coords_a, coords_b)
+    assert np.array_equal(colors_a, colors_b)
+
+
+@pytest.mark.parametrize("extension", sorted(scene_formats.FORMATS))
+def test_round_trip(tmp_path, extension):
+    grid = fill_random(VoxelGrid(16), fill=0.2, translucent=0.3)
+    path = str(tmp_path / f"cena{extension}")
+    scene_formats.save_scene(path, grid, 1.5)
+
+    loaded, space = scene_formats.load_scene(path)
+    assert space == pytest.approx(1.5)
+    assert_same_scene(grid, loaded)
+
+
+@pytest.mark.parametrize("compression", sorted(scene_formats.COMPRESSIONS))
+def test_palette_compressions(tmp_path, compression):
+    grid = fill_random(VoxelGrid(16), fill=0.5, seed=3)
+    path = str(tmp_path / "cena.vxp")
+    scene_formats.write_palette(path, grid, 1.0, compression=compression)
+    assert_same_scene(grid, scene_formats.load_scene(path)[0])
+
+
+@pytest.mark.parametrize("extension", sorted(scene_formats.FORMATS))
+def test_empty_scene(tmp_path, extension):
+    path = str(tmp_path / f"vazia{extension}")
+    scene_formats.save_scene(path, VoxelGrid(8), 1.0)
+    loaded, _ = scene_formats.load_scene(path)
+    assert loaded.count == 0
+
+
+@pytest.mark.parametrize("extension", [".vxp", ".vxc"])
+def test_sparse_world_round_trip(tmp_path, extension):
+    grid = ChunkedGrid(1024, chunk_size=16)
+    cells = np.array([(0, 0, 0), (1023, 1023, 1023), (500, 12, 900)])
+    grid.set_voxels(cells, np.array([(255, 0, 0, 255), (0, 255, 0, 128), (0, 0, 255, 255)], dtype=np.uint8))
+    path = str(tmp_path / f"mundo{extension}")
+    scene_formats.save_scene(path, grid, 1.0)
+    assert_same_scene(grid, scene_formats.load_scene(path)[0])
+
+
+def test_binary_refuses_huge_bounding_box(tmp_path):
+    grid = ChunkedGrid(1024, chunk_size=16)
+    grid.set_voxel((0, 0, 0), (1.0, 0.0, 0.0, 1.0))
+    grid.set_voxel((1000, 1000, 1000), (1.0, 0.0, 0.0, 1.0))
+    with pytest.raises(scene_formats.SceneFormatError):
+        scene_formats.save_scene(str(tmp_path / "mundo.vxb"), grid, 1.0)
+
+
+def test_binary_formats_detected_by_magic(tmp_path):
+    grid = fill_random(VoxelGrid(8), fill=0.3)
+    for extension in (".vxp", ".vxb", ".vxc"):
+        path = str(tmp_path / f"cena{extension}")
+        scene_formats.save_scene(path, grid, 1.0)
+        renamed = str(tmp_path / f"sem_extensao{extension}.dat")
+        os.replace(path, renamed)
+        assert scene_formats.detect_format(renamed) == extension
+        assert_same_scene(grid, scene_formats.load_scene(renamed)[0])
+
+
+def test_text_rows_without_alpha(tmp_path):
+    path = tmp_path / "antiga.txt"
+    path.write_text("SIZE 4\nSPACE 1.0\n0 1 2 1.0 0.0 0.0\n3 3 3 0.0 1.0 0.0 0.5\n")
+    grid, _ = scene_formats.load_scene(str(path))
+    assert grid.count == 2
+    assert tuple(grid.packed_color((0, 1, 2))) == (255, 0, 0, 255)
+    assert grid.packed_color((3, 3, 3))[3] == 128
+
+
+def test_paged_grid_sees_and_saves_the_whole_scene(tmp_path):
+    grid = fill_random(ChunkedGrid(64, chunk_size=16), fill=0.05, seed=5)
+    path = str(tmp_path / "mundo.vxc")
+    scene_formats.save_scene(path, grid, 1.0)
+
+    paged, _ = open_paged(path, max_resident=2)
+    assert paged.count == grid.count
+    assert_same_scene(grid, paged.copy()) # copies read non-resident chunks from the file
+
+    # Edit, save over the file it reads from, and reopen
+    paged.set_voxel((1, 2, 3), (0.0, 0.0, 1.0, 1.0))
+    grid.set_voxel((1, 2, 3), (0.0, 0.0, 1.0, 1.0))
+    snapshot = paged.copy()
+    old_source = paged.source
+    scene_formats.save_scene(path, snapshot, 1.0)
+    paged.mark_saved(snapshot.pinned, path)
+    assert not paged.pinned
+    assert not old_source.file.closed # the snapshot still reads from it
+    del snapshot
+    assert old_source.file.closed
+
+    reopened, _ = open_paged(path)
+    assert_same_scene(grid, reopened.copy())
+
+
+def test_paged_copies_outlive_a_save(tmp_path):
+    ''' A save replacing the file must not break a copy still reading it (journal compaction) '''
+    grid = fill_random(ChunkedGrid(64, chunk_size=16), fill=0.05, seed=6)
+    path = str(tmp_path / "mundo.vxc")
+    scene_formats.save_scene(path, grid, 1.0)
+
+    paged, _ = open_paged(path, max_resident=2)
+    compaction, save = paged.copy(), paged.copy()
+    scene_formats.save_scene(path, save, 1.0)
+    paged.mark_saved(save.pinned, path)
+    del save
+
+    scene_formats.save_scene(str(tmp_path / "snapshot.vxc"), compaction, 1.0)
+    assert_same_scene(grid, scene_formats.load_scene(str(tmp_path / "snapshot.vxc"))[0])
+    assert_same_scene(grid, paged.copy())
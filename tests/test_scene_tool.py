@@ -0,0 +1,112 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+import scene_formats
+import scene_tool
+from voxel_grid import VoxelGrid
+from conftest import fill_random
+from test_scene_formats import assert_same_scene, scene
+
+SRC = os.path.join(os.path.dirname(__file__), "..", "src")
+
+
+def save(folder, name, grid, space=1.0):
+    path = str(folder / name)
+    scene_formats.save_scene(path, grid, space)
+    return path
+
+
+def test_imports_nothing_that_needs_a_display():
+    # A fresh interpreter: the other tests may have imported OpenGL already
+    code = "import sys, scene_tool; print(' '.join(sys.modules))"
+    modules = subprocess.run([sys.executable, "-c", code], cwd=SRC, capture_output=True,
+                             text=True, check=True).stdout.split()
+    for banned in ("OpenGL", "glfw", "pygame", "tkinter"):
+        assert not any(m == banned or m.startswith(banned + ".") for m in modules), banned
+
+
+def test_stats(tmp_path, capsys):
+    grid = fill_random(VoxelGrid(8), fill=0.5, seed=1)
+    path = save(tmp_path, "cena.vxb", grid, 2.0)
+
+    assert scene_tool.main(["--jobs", "1", "stats", path, "--top", "3"]) == 0
+    out = capsys.readouterr().out
+    assert f"voxels     : {grid.count}" in out
+    assert "espaçamento 2" in out
+
+    stats = scene_tool.scene_stats(grid, 2.0, top=3)
+    coords, colors = grid.visible_cells()
+    assert stats['voxels'] == len(coords)
+    assert stats['bbox'] == (coords.min(axis=0).tolist(), coords.max(axis=0).tolist())
+    assert stats['distinct_colors'] == len(np.unique(colors, axis=0))
+    assert len(stats['colors']) == 3
+
+
+def test_validate(tmp_path, capsys):
+    save(tmp_path, "boa.vxb", fill_random(VoxelGrid(8), seed=2))
+    (tmp_path / "ruim.vxb").write_bytes(b"VOXB lixo")
+
+    # A folder expands to its scene files, validated in parallel
+    assert scene_tool.main(["--jobs", "2", "validate", str(tmp_path)]) == 1
+    lines = capsys.readouterr().out.splitlines()
+    assert any(line.startswith("ok") and line.endswith("boa.vxb") for line in lines)
+    assert any(line.startswith("ERRO") and "ruim.vxb" in line for line in lines)
+
+
+def test_convert(tmp_path):
+    grid = fill_random(VoxelGrid(8), fill=0.4, seed=3, translucent=0.2)
+    path = save(tmp_path, "cena.txt", grid, 1.5)
+    output = tmp_path / "convertidas"
+
+    assert scene_tool.main(["--jobs", "1", "convert", path, "--to", ".vxp", "-o", str(output)]) == 0
+    loaded, space = scene_formats.load_scene(str(output / "cena.vxp"))
+    assert space == 1.5
+    assert_same_scene(grid, loaded)
+
+    # Converting to the format the file already has is an error
+    assert scene_tool.main(["--jobs", "1", "convert", path, "--to", ".txt"]) == 1
+
+
+def test_merge_later_scene_wins(tmp_path):
+    first = VoxelGrid(4)
+    first.set_voxel((0, 0, 0), (1.0, 0.0, 0.0, 1.0))
+    first.set_voxel((1, 0, 0), (1.0, 0.0, 0.0, 1.0))
+    second = VoxelGrid(8)
+    second.set_voxel((1, 0, 0), (0.0, 1.0, 0.0, 1.0))
+    second.set_voxel((7, 7, 7), (0.0, 0.0, 1.0, 1.0))
+    paths = [save(tmp_path, "a.vxb", first), save(tmp_path, "b.vxb", second)]
+    output = str(tmp_path / "juntas.vxb")
+
+    assert scene_tool.main(["--jobs", "1", "merge", *paths, "-o", output]) == 0
+    merged, _ = scene_formats.load_scene(output)
+    assert merged.size == 8
+    coords, colors = scene(merged)
+    assert coords.tolist() == [[0, 0, 0], [1, 0, 0], [7, 7, 7]]
+    assert colors[:, :3].tolist() == [[255, 0, 0], [0, 255, 0], [0, 0, 255]]
+
+
+def test_crop(tmp_path):
+    grid = fill_random(VoxelGrid(16), fill=0.3, seed=4)
+    path = save(tmp_path, "cena.vxb", grid)
+    lo, hi = np.array([2, 3, 4]), np.array([9, 8, 7])
+    coords, colors = grid.visible_cells()
+    inside = ((coords >= lo) & (coords <= hi)).all(axis=1)
+
+    kept = str(tmp_path / "recorte.vxb")
+    argv = ["--jobs", "1", "crop", path, "--min", *map(str, lo), "--max", *map(str, hi), "-o", kept]
+    assert scene_tool.main(argv) == 0
+    cropped, _ = scene_formats.load_scene(kept)
+    expected = VoxelGrid(16)
+    expected.set_voxels(coords[inside], colors[inside])
+    assert_same_scene(expected, cropped)
+
+    shifted = str(tmp_path / "deslocado.vxb")
+    assert scene_tool.main(argv[:-1] + [shifted, "--shift"]) == 0
+    cropped, _ = scene_formats.load_scene(shifted)
+    assert cropped.size == int((hi - lo).max()) + 1
+    expected = VoxelGrid(cropped.size)
+    expected.set_voxels(coords[inside] - lo, colors[inside])
+    assert_same_scene(expected, cropped)
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from object import Object
+
+
+@pytest.fixture
+def obj():
+    Object._transform_cache.clear()
+    return Object()
+
+
+def one_by_one(obj, translations, rotations, scales):
+    ''' transformation() for every row, the reference for the batched version '''
+    n = len(translations)
+    scales = np.asarray(scales, dtype=np.float64)
+    scales = np.broadcast_to(scales.reshape(n, -1) if scales.ndim else scales, (n, 3))
+    return np.array([
+        obj.transformation(*t, *r, *s) for t, r, s in zip(translations, rotations, scales)
+    ])
+
+
+@pytest.mark.parametrize("scales", ["none", "uniform", "per_axis"])
+@pytest.mark.parametrize("rotate", [False, True])
+def test_matches_transformation(obj, scales, rotate):
+    rng = np.random.default_rng(8)
+    n = 200
+    translations = rng.uniform(-50, 50, (n, 3))
+    rotations = rng.uniform(-360, 360, (n, 3)) if rotate else np.zeros((n, 3))
+    batch_scales = {"none": None, "uniform": rng.uniform(0.1, 3, n),
+                    "per_axis": rng.uniform(0.1, 3, (n, 3))}[scales]
+
+    result = obj.transformations(translations, rotations if rotate else None, batch_scales)
+    expected = one_by_one(obj, translations, rotations, 1.0 if batch_scales is None else batch_scales)
+    assert result.shape == (n, 4, 4) and result.dtype == np.float32
+    # float32 rounding only
+    assert np.abs(result - expected).max() < 1e-5
+
+
+def test_single_scale_applies_to_every_instance(obj):
+    result = obj.transformations([(1, 2, 3), (4, 5, 6)], scales=2.5)
+    assert np.allclose(result[:, [0, 1, 2], [0, 1, 2]], 2.5)
+    assert np.allclose(result[:, :3, 3], [(1, 2, 3), (4, 5, 6)])
+
+
+def test_equal_inputs_reuse_the_result(obj):
+    translations = np.arange(12, dtype=np.float32).reshape(4, 3)
+    first = obj.transformations(translations, scales=2.0)
+    assert obj.transformations(translations.copy(), scales=2.0) is first
+    assert not first.flags.writeable
+
+
+def test_cache_follows_changed_inputs(obj):
+    translations = np.arange(12, dtype=np.float32).reshape(4, 3)
+    rotations = np.zeros((4, 3), dtype=np.float32)
+    first = obj.transformations(translations, rotations, 1.0)
+
+    # The caller modifies its arrays in place after the call
+    translations[2] = (7, 7, 7)
+    rotations[1] = (0, 90, 0)
+    second = obj.transformations(translations, rotations, 1.0)
+    assert second is not first
+    assert np.allclose(second, one_by_one(obj, translations, rotations, 1.0), atol=1e-5)
+    assert np.allclose(first[2, :3, 3], (6, 7, 8)) # the earlier result did not change
+
+    # A different scale is a different result too
+    third = obj.transformations(translations, rotations, 2.0)
+    assert third is not second
+    assert np.allclose(third[0, [0, 1, 2], [0, 1, 2]], 2.0)
+
+
+def test_cache_keeps_the_most_recent_results(obj):
+    results = [obj.transformations([(i, 0, 0)]) for i in range(Object.TRANSFORM_CACHE_SIZE + 1)]
+    assert len(Object._transform_cache) == Object.TRANSFORM_CACHE_SIZE
+    assert obj.transformations([(Object.TRANSFORM_CACHE_SIZE, 0, 0)]) is results[-1]
+    assert obj.transformations([(0, 0, 0)]) is not results[0] # the oldest was dropped